@@ -0,0 +1,270 @@
+# distributed.py
+# Coordinator/worker mode: the orchestrator hands out (model, prompt) shards over TCP
+# (multiprocessing.connection, authenticated with a shared key) and `python distributed.py worker ...`
+# processes on any number of hosts lease them, analyze the page locally and send back the report plus
+# its artifacts. Leases are kept alive by heartbeats; a lease that goes quiet is requeued.
+import os
+import sys
+import io
+import argparse
+import tarfile
+import threading
+import queue
+import collections
+import secrets
+import shutil
+import time
+import json
+from pathlib import Path
+from multiprocessing.connection import Listener, Client
+from concurrent.futures import ProcessPoolExecutor
+
+from ui_benchmark_analyzer import (
+    resolve_chrome_environment, StaticSiteServer, LighthouseResultCache, start_lighthouse_service, stop_lighthouse_service,
+    init_prompt_worker, process_single_prompt_wrapper, failed_prompt_result, local_asset_paths, BROWSER_RECYCLE_AFTER_PROMPTS
+)
+
+SHARD_LEASE_S = float(os.environ.get("SHARD_LEASE_S", 120)) # A lease without a heartbeat for this long is requeued
+SHARD_MAX_ATTEMPTS = int(os.environ.get("SHARD_MAX_ATTEMPTS", 3))
+WORKER_IDLE_POLL_S = 2.0
+WORKER_COORDINATOR_GONE_S = 60.0 # Workers exit after the coordinator has been unreachable this long
+AUTHKEY_ENV = "UIGENEVAL_AUTHKEY"
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return (host or "localhost", int(port))
+
+def request(address, authkey, message):
+    # One request/reply per connection keeps both sides stateless across worker restarts
+    with Client(address, authkey=authkey) as conn:
+        conn.send(message)
+        return conn.recv()
+
+def pack_directory(dir_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar: tar.add(dir_path, arcname=Path(dir_path).name)
+    return buffer.getvalue()
+
+def unpack_directory(archive_bytes, target_dir):
+    with tarfile.open(fileobj=io.BytesIO(archive_bytes), mode="r:gz") as tar:
+        for member in tar.getmembers():
+            if member.name.startswith(("/", "\\")) or ".." in Path(member.name).parts or not (member.isfile() or member.isdir()):
+                raise ValueError(f"Refusing unsafe artifact entry: {member.name}")
+        tar.extractall(target_dir, **({"filter": "data"} if hasattr(tarfile, "data_filter") else {}))
+
+
+class ShardCoordinator:
+    # Drop-in for PromptScheduler (submit / as_completed / shutdown) that serves jobs to remote workers instead of a
+    # local process pool. Every claim creates a lease; heartbeats extend it, and leases that expire are requeued
+    # until SHARD_MAX_ATTEMPTS, after which the prompt is recorded as LEASE_LOST. The first result for a job wins,
+    # so a slow worker whose lease was already handed to someone else cannot double count.
+    def __init__(self, address, authkey, lease_s=SHARD_LEASE_S, max_attempts=SHARD_MAX_ATTEMPTS, on_event=None):
+        self.address, self.authkey = address, authkey
+        self.lease_s, self.max_attempts = lease_s, max_attempts
+        self.on_event = on_event or (lambda event_type, **fields: None)
+        self.admission_waits = [] # Admission happens on the workers; kept for interface parity with PromptScheduler
+        self.reports_events = True # prompt_started/finished are emitted here, workers have no event queue
+        self._pending = collections.deque()
+        self._leases = {} # lease_id -> {"job": job, "deadline": monotonic, "worker": str}
+        self._done_keys = set()
+        self._lock = threading.Lock()
+        self._completed = queue.Queue()
+        self._closed = False
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address # Resolves port 0
+        threading.Thread(target=self._accept_loop, daemon=True, name="shard-coordinator").start()
+        threading.Thread(target=self._reap_loop, daemon=True, name="shard-lease-reaper").start()
+
+    def submit(self, job_key, task_args):
+        with self._lock: self._pending.append({"job_key": job_key, "task": task_args, "attempts": 0, "submitted": time.monotonic()})
+
+    def as_completed(self, count):
+        for _ in range(count): yield self._completed.get()
+
+    def shutdown(self):
+        self._closed = True
+        try: Client(self.address, authkey=self.authkey).close() # Unblocks accept()
+        except OSError: pass
+        self._listener.close()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try: conn = self._listener.accept()
+            except (OSError, EOFError): continue # Includes failed authentication
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            message = conn.recv()
+            handler = {"claim": self._claim, "heartbeat": self._heartbeat, "result": self._result}.get(message.get("op"))
+            conn.send(handler(message) if handler else {"op": "error", "error": f"unknown op {message.get('op')}"})
+        except (OSError, EOFError): pass
+        finally: conn.close()
+
+    def _claim(self, message):
+        if self._closed: return {"op": "done"}
+        with self._lock:
+            if not self._pending: return {"op": "wait", "retry_s": WORKER_IDLE_POLL_S}
+            job = self._pending.popleft(); job["attempts"] += 1
+            job.setdefault("queue_wait_s", round(time.monotonic() - job["submitted"], 3)) # Until the first worker picked it up
+            lease_id = secrets.token_hex(8)
+            self._leases[lease_id] = {"job": job, "deadline": time.monotonic() + self.lease_s, "worker": message.get("worker")}
+        prompt_config_obj, html_dir_path_str, _, run_timestamp_str = job["task"]
+        model_name, prompt_id = job["job_key"]
+        self.on_event("prompt_started", model=model_name, prompt_id=prompt_id, worker=message.get("worker"), attempt=job["attempts"])
+        return {"op": "shard", "lease_id": lease_id, "lease_s": self.lease_s, "model": model_name, "prompt_config": prompt_config_obj,
+                "run_timestamp": run_timestamp_str, "files": self._page_files(Path(html_dir_path_str), prompt_id)}
+
+    def _page_files(self, html_dir, prompt_id):
+        # The page plus the local assets it references, keyed by path relative to the model's HTML directory
+        html_file = html_dir / f"{prompt_id}.html"
+        if not html_file.is_file(): return {} # Worker reports FILE_NOT_FOUND like a local run would
+        files = {html_file.name: html_file.read_bytes()}
+        for asset in local_asset_paths(html_file):
+            rel_path = Path(os.path.relpath(asset, html_dir))
+            if ".." not in rel_path.parts: files[rel_path.as_posix()] = asset.read_bytes()
+        return files
+
+    def _heartbeat(self, message):
+        with self._lock:
+            lease = self._leases.get(message.get("lease_id"))
+            if not lease: return {"op": "lost"}
+            lease["deadline"] = time.monotonic() + self.lease_s
+        return {"op": "ok"}
+
+    def _result(self, message):
+        with self._lock:
+            lease = self._leases.pop(message.get("lease_id"), None)
+            job_key = lease["job"]["job_key"] if lease else tuple(message.get("job_key") or ())
+            if job_key in self._done_keys: return {"op": "ok"} # Duplicate of a job already finished
+            job = lease["job"] if lease else None
+            # Late result for an expired lease still counts: drop the job's retry, whether queued or re-leased
+            for pending_job in [j for j in self._pending if j["job_key"] == job_key]: self._pending.remove(pending_job); job = pending_job
+            for other_lease_id in [lid for lid, other in self._leases.items() if other["job"]["job_key"] == job_key]:
+                job = self._leases.pop(other_lease_id)["job"]
+            if not job: return {"op": "ok"}
+            self._done_keys.add(job_key)
+        result = message["result"]
+        out_dir = Path(job["task"][2])
+        if message.get("artifacts"):
+            try:
+                unpack_directory(message["artifacts"], out_dir)
+                report_dir = out_dir / Path(result.get("output_directory_for_this_prompt") or "").name
+                result["output_directory_for_this_prompt"] = str(report_dir)
+                report_path = report_dir / f"{job_key[1]}_detailed_report.json"
+                if report_path.is_file(): # Point the on-disk report at its new home too
+                    with open(report_path, 'r', encoding='utf-8') as f: report = json.load(f)
+                    report["output_directory_for_this_prompt"] = str(report_dir)
+                    with open(report_path, "w", encoding='utf-8') as f: json.dump(report, f, indent=2)
+            except (tarfile.TarError, ValueError, OSError) as e_art: print(f"[Coordinator] Could not unpack artifacts for {job_key}: {e_art}")
+        result["worker"], result["lease_attempts"], result["queue_wait_s"] = message.get("worker"), job["attempts"], job.get("queue_wait_s")
+        self.on_event("prompt_finished", model=job_key[0], prompt_id=job_key[1], status=result.get("status"), worker=message.get("worker"),
+                      duration_s=result.get("duration_s"), score=result.get("scores", {}).get("overall", {}).get("percentage_weighted"), error=result.get("error"))
+        self._completed.put((job_key, result))
+        return {"op": "ok"}
+
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(1.0)
+            now, lost = time.monotonic(), []
+            with self._lock:
+                for lease_id in [lid for lid, lease in self._leases.items() if lease["deadline"] < now]:
+                    lost.append(self._leases.pop(lease_id))
+                for lease in lost:
+                    if lease["job"]["attempts"] < self.max_attempts: self._pending.appendleft(lease["job"]) # Retry ahead of fresh work
+                    else: self._done_keys.add(lease["job"]["job_key"])
+            for lease in lost:
+                model_name, prompt_id = lease["job"]["job_key"]
+                print(f"[Coordinator] Lease for {model_name}/{prompt_id} on {lease['worker']} lost (attempt {lease['job']['attempts']}/{self.max_attempts}).")
+                if lease["job"]["job_key"] in self._done_keys:
+                    result = failed_prompt_result(prompt_id, "LEASE_LOST", f"No heartbeat after {self.max_attempts} attempt(s).")
+                    self.on_event("prompt_finished", model=model_name, prompt_id=prompt_id, status="LEASE_LOST", error=result["error"])
+                    self._completed.put((lease["job"]["job_key"], result))
+
+
+def _worker_slot(address, authkey, worker_id, workdir, pool):
+    unreachable_since = None
+    while True:
+        try: reply = request(address, authkey, {"op": "claim", "worker": worker_id}); unreachable_since = None
+        except (OSError, EOFError):
+            unreachable_since = unreachable_since or time.monotonic()
+            if time.monotonic() - unreachable_since > WORKER_COORDINATOR_GONE_S: return
+            time.sleep(WORKER_IDLE_POLL_S); continue
+        if reply["op"] == "done": return
+        if reply["op"] != "shard": time.sleep(reply.get("retry_s", WORKER_IDLE_POLL_S)); continue
+
+        lease_id, prompt_config_obj = reply["lease_id"], reply["prompt_config"]
+        shard_dir = Path(workdir) / lease_id
+        html_dir, out_dir = shard_dir / reply["model"], shard_dir / "out" # Model-named dir keeps event/model labels intact
+        for rel_path, content in reply["files"].items():
+            (html_dir / rel_path).parent.mkdir(parents=True, exist_ok=True); (html_dir / rel_path).write_bytes(content)
+        html_dir.mkdir(parents=True, exist_ok=True); out_dir.mkdir(parents=True, exist_ok=True)
+
+        lease_lost, stop_heartbeat = threading.Event(), threading.Event()
+        def heartbeat():
+            while not stop_heartbeat.wait(reply["lease_s"] / 3):
+                try:
+                    if request(address, authkey, {"op": "heartbeat", "lease_id": lease_id})["op"] == "lost": lease_lost.set(); return
+                except (OSError, EOFError): pass # Transient; the lease only expires after lease_s
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True); heartbeat_thread.start()
+        try:
+            task = (prompt_config_obj, str(html_dir), str(out_dir), reply["run_timestamp"])
+            try: result = pool.submit(process_single_prompt_wrapper, task).result()
+            except Exception as e_exec: result = failed_prompt_result(prompt_config_obj.get("prompt_id"), "EXECUTOR_ERROR", str(e_exec))
+            stop_heartbeat.set(); heartbeat_thread.join()
+            if lease_lost.is_set(): print(f"[Worker {worker_id}] Lease {lease_id} was reassigned; sending result anyway.")
+            report_dir = Path(result.get("output_directory_for_this_prompt") or out_dir / "missing")
+            artifacts = pack_directory(report_dir) if report_dir.is_dir() else None
+            message = {"op": "result", "lease_id": lease_id, "job_key": (reply["model"], prompt_config_obj.get("prompt_id")),
+                       "worker": worker_id, "result": result, "artifacts": artifacts}
+            for attempt in range(5): # The coordinator may be briefly busy; losing a finished result wastes a whole analysis
+                try: request(address, authkey, message); break
+                except (OSError, EOFError): time.sleep(2 ** attempt)
+        finally:
+            stop_heartbeat.set()
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+
+def run_worker(address, authkey, slots, workdir, use_lh_cache=True):
+    workdir = Path(workdir).resolve(); workdir.mkdir(parents=True, exist_ok=True)
+    chrome_env = resolve_chrome_environment()
+    static_server = StaticSiteServer(workdir); static_server.start()
+    lh_manager, lh_service = start_lighthouse_service(chrome_env, slots)
+    lighthouse_cache = LighthouseResultCache() if use_lh_cache else None
+    worker_prefix = f"{os.uname().nodename if hasattr(os, 'uname') else 'host'}:{os.getpid()}"
+    print(f"[Worker {worker_prefix}] {slots} slot(s) pulling shards from {address[0]}:{address[1]}")
+    try:
+        with ProcessPoolExecutor(max_workers=slots, initializer=init_prompt_worker,
+                                 initargs=(BROWSER_RECYCLE_AFTER_PROMPTS, chrome_env, lh_service, lighthouse_cache, (str(workdir), static_server.base_url))) as pool:
+            slot_threads = [threading.Thread(target=_worker_slot, args=(address, authkey, f"{worker_prefix}/{i}", workdir, pool), daemon=True)
+                            for i in range(slots)]
+            for t in slot_threads: t.start()
+            for t in slot_threads: t.join()
+    finally:
+        stop_lighthouse_service(lh_manager, lh_service)
+        static_server.stop()
+    print(f"[Worker {worker_prefix}] Coordinator finished; exiting.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed prompt analysis worker. Start the coordinator with orchestrator.py --coordinator HOST:PORT.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="Lease (model, prompt) shards from a coordinator and analyze them locally.")
+    worker_parser.add_argument("coordinator", help="Coordinator address, HOST:PORT.")
+    worker_parser.add_argument("--slots", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Prompts analyzed concurrently on this host.")
+    worker_parser.add_argument("--workdir", default=None, help="Scratch directory for leased pages and their reports.")
+    worker_parser.add_argument("--authkey", default=os.environ.get(AUTHKEY_ENV), help=f"Shared secret (default: ${AUTHKEY_ENV}).")
+    worker_parser.add_argument("--no-lh-cache", action="store_true", help="Always run Lighthouse instead of reusing cached reports.")
+    args = parser.parse_args()
+
+    if not args.authkey: print(f"An authkey is required (--authkey or ${AUTHKEY_ENV})."); sys.exit(1)
+    workdir = args.workdir or Path.home() / ".cache" / "uigeneval" / f"worker-{os.getpid()}"
+    try: run_worker(parse_address(args.coordinator), args.authkey.encode("utf-8"), args.slots, workdir, not args.no_lh_cache)
+    except RuntimeError as e: print(f"FATAL: {e}"); sys.exit(1)
+    finally:
+        if not args.workdir: shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
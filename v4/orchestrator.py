@@ -1,156 +1,529 @@
 # orchestrator.py
 import os
 import sys
-import subprocess
+import argparse
 import json
+import threading
+import queue
+import collections
+import multiprocessing
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 import time
+import secrets
+import subprocess
+
+from ui_benchmark_analyzer import (
+    RunProfile, resolve_chrome_environment, StaticSiteServer, LighthouseResultCache, start_lighthouse_service, stop_lighthouse_service,
+    init_prompt_worker, process_single_prompt_wrapper, failed_prompt_result, make_run_event, slim_prompt_result, find_previous_prompt_reports, plan_model_prompts,
+    build_model_summary, write_model_summary, BROWSER_RECYCLE_AFTER_PROMPTS, INTERACTION_PARALLELISM
+)
+from distributed import ShardCoordinator, parse_address, AUTHKEY_ENV
+
+# Rough peak footprint of one headless Chrome on a heavy generated page; caps the global worker count by RAM
+BROWSER_MEMORY_BUDGET_MB = int(os.environ.get("BROWSER_MEMORY_BUDGET_MB", 600))
+# A worker may run INTERACTION_PARALLELISM browsers at once (its own plus helpers for parallel interaction checks)
+WORKER_MEMORY_BUDGET_MB = BROWSER_MEMORY_BUDGET_MB * INTERACTION_PARALLELISM
+
+# Admission control: a new prompt analysis starts only with this much RAM left over and the 1-min load below the limit
+ADMISSION_MEMORY_RESERVE_MB = int(os.environ.get("ADMISSION_MEMORY_RESERVE_MB", 1024))
+ADMISSION_MAX_LOAD_PER_CORE = float(os.environ.get("ADMISSION_MAX_LOAD_PER_CORE", 1.5))
+ADMISSION_RAMP_S = float(os.environ.get("ADMISSION_RAMP_S", 10.0)) # Browsers admitted this recently may not have allocated yet
+ADMISSION_MAX_BACKOFF_S = 5.0
 
-def run_benchmark_for_single_model(challengename, modelname, base_html_dir_str, master_output_base_str, analyzer_script_path_str, global_run_timestamp_str, workers_per_model_count):
-    base_html_dir = Path(base_html_dir_str)
-    master_output_base = Path(master_output_base_str)
-    analyzer_script_path = Path(analyzer_script_path_str)
-
-    model_html_dir = base_html_dir / challengename / modelname
-    
-    # Define where the ui_benchmark_analyzer.py script should place its outputs for this model.
-    # It will create a subfolder like {modelname}_{timestamp} inside this.
-    # Output path: {master_output_base}/{challengename}/run_{global_run_timestamp}/
-    # The analyzer will then create:
-    # {master_output_base}/{challengename}/run_{global_run_timestamp}/{modelname}_{analyzer_script_timestamp}/
-    output_dir_for_analyzer_base = master_output_base / challengename / f"run_{global_run_timestamp_str}"
-    output_dir_for_analyzer_base.mkdir(parents=True, exist_ok=True)
-
-    # Determine path to the master prompts config file.
-    # Option 1: A single master config at the root of base_html_dir.
-    # Option 2: A master config per challenge (e.g., base_html_dir / challengename / "master_prompts_config.json")
-    # Option 3: A master config per model (e.g., model_html_dir / "master_prompts_config.json") - less likely for this setup.
-    # For this example, let's prioritize per-challenge, then per-base_html_dir.
-    
-    master_config_file_path = base_html_dir / challengename / "master_prompts_benchmark_config.json"
-    if not master_config_file_path.exists():
-        master_config_file_path = base_html_dir / "master_prompts_benchmark_config.json" # Fallback
-        if not master_config_file_path.exists():
-            msg = f"Master prompts config not found for {challengename}/{modelname} (checked in challenge and base HTML dirs)."
-            print(msg)
-            return {"model": modelname, "status": "CONFIG_NOT_FOUND", "error": msg}
-
-    cmd = [
-        sys.executable,  # Path to python interpreter
-        str(analyzer_script_path),
-        str(master_config_file_path),
-        str(model_html_dir),
-        str(output_dir_for_analyzer_base) 
-    ]
-    
-    env = os.environ.copy()
-    if workers_per_model_count is not None and workers_per_model_count > 0:
-        env["PROMPT_WORKERS_COUNT"] = str(workers_per_model_count)
-
-    print(f"[Orchestrator] Running for model: {modelname}. Workers per model: {env.get('PROMPT_WORKERS_COUNT', 'DefaultInAnalyzer')}")
-    print(f"[Orchestrator] Command: {' '.join(cmd)}")
-    
+# Live progress: a status line at this interval, flagging analyses that have been running longer than the stuck threshold
+PROGRESS_INTERVAL_S = float(os.environ.get("PROGRESS_INTERVAL_S", 30))
+PROGRESS_STUCK_AFTER_S = float(os.environ.get("PROGRESS_STUCK_AFTER_S", 600))
+
+# Longest-first ordering: measured durations from the last few runs' manifests; a rough cost model for prompts never timed
+DURATION_HISTORY_RUNS = int(os.environ.get("DURATION_HISTORY_RUNS", 5))
+ESTIMATE_BASE_S_PER_VIEWPORT = 20.0 # Load + technical checks
+ESTIMATE_LIGHTHOUSE_S = 30.0
+ESTIMATE_S_PER_ADHERENCE_CHECK = 1.0
+ESTIMATE_S_PER_INTERACTION_STEP = 3.0
+
+
+def available_memory_bytes():
+    # MemAvailable counts reclaimable page cache, unlike SC_AVPHYS_PAGES; None when neither source exists
     try:
-        # Use Popen for non-blocking if you want to stream output, or run for simpler blocking.
-        # Timeout should be generous, e.g., 1-2 hours per model depending on prompt count.
-        process = subprocess.run(cmd, capture_output=True, text=True, env=env, timeout=7200) # 2-hour timeout
-
-        if process.returncode == 0:
-            print(f"[Orchestrator] Model {modelname} completed successfully.")
-            return {"model": modelname, "status": "SUCCESS", "output_base": str(output_dir_for_analyzer_base), "stdout": process.stdout}
-        else:
-            print(f"[Orchestrator] Model {modelname} failed. RC: {process.returncode}")
-            print(f"[Orchestrator] Model {modelname} STDOUT:\n{process.stdout}")
-            print(f"[Orchestrator] Model {modelname} STDERR:\n{process.stderr}")
-            return {"model": modelname, "status": "ANALYZER_FAILURE", "rc": process.returncode, "stdout": process.stdout, "stderr": process.stderr}
-    except subprocess.TimeoutExpired as e:
-        print(f"[Orchestrator] Model {modelname} timed out.")
-        return {"model": modelname, "status": "TIMEOUT", "stdout": e.stdout, "stderr": e.stderr}
-    except Exception as e:
-        print(f"[Orchestrator] Critical error running benchmark for model {modelname}: {e}")
-        return {"model": modelname, "status": "ORCHESTRATOR_SUBPROCESS_ERROR", "error": str(e)}
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"): return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError): pass
+    try: return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError): return None
+
+def default_global_workers():
+    # One worker per core, but never more workers than the currently free RAM can hold at their peak browser count
+    cpu_count = os.cpu_count() or 2
+    available_bytes = available_memory_bytes()
+    if available_bytes is None: return max(1, cpu_count // 2) # No meminfo/sysconf (e.g. Windows)
+    return max(1, min(cpu_count, available_bytes // (WORKER_MEMORY_BUDGET_MB * 1024 * 1024)))
+
+
+class AdmissionController:
+    # Decides whether the host can take one more prompt analysis (up to INTERACTION_PARALLELISM browsers) right now.
+    # Memory headroom is free RAM minus a reserve, minus the budget of analyses admitted within the last
+    # ADMISSION_RAMP_S that may not have grown to full size yet.
+    def __init__(self, memory_budget_mb=WORKER_MEMORY_BUDGET_MB, reserve_mb=ADMISSION_MEMORY_RESERVE_MB,
+                 max_load_per_core=ADMISSION_MAX_LOAD_PER_CORE, ramp_s=ADMISSION_RAMP_S):
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self.reserve_bytes = reserve_mb * 1024 * 1024
+        self.max_load = max_load_per_core * (os.cpu_count() or 1)
+        self.ramp_s = ramp_s
+        self._recent_admissions = collections.deque()
+
+    def check(self):
+        # (admitted, reason)
+        now = time.monotonic()
+        while self._recent_admissions and now - self._recent_admissions[0] > self.ramp_s: self._recent_admissions.popleft()
+        available_bytes = available_memory_bytes()
+        if available_bytes is not None:
+            headroom = available_bytes - self.reserve_bytes - len(self._recent_admissions) * self.memory_budget_bytes
+            if headroom < self.memory_budget_bytes: return False, f"memory headroom {headroom // (1024 * 1024)}MB"
+        try: load_1m = os.getloadavg()[0]
+        except (OSError, AttributeError): load_1m = 0.0
+        if load_1m > self.max_load: return False, f"load {load_1m:.1f} > {self.max_load:.1f}"
+        return True, None
+
+    def admitted(self):
+        self._recent_admissions.append(time.monotonic())
+
+
+class PromptScheduler:
+    # One flat queue of (model, prompt) jobs drained by a single process pool under one global concurrency limit.
+    # A dispatcher thread hands jobs to the pool only when a slot is free and the admission controller (if any) agrees
+    # the host has room, so the pool never holds a backlog of its own and every model's prompts compete for the same
+    # workers. At least one job is always allowed to run so a saturated host still makes progress.
+    def __init__(self, max_workers, initializer=None, initargs=(), admission=None):
+        self.max_workers = max_workers
+        self.admission = admission
+        self.admission_waits = [] # Seconds each dispatched job spent blocked on admission control
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        self._pending = collections.deque()
+        self._in_flight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._completed = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True, name="prompt-dispatcher")
+        self._dispatcher.start()
+
+    def submit(self, job_key, task_args):
+        with self._cond:
+            self._pending.append((job_key, task_args, time.monotonic())); self._cond.notify_all()
+
+    def _wait_for_admission(self):
+        # Blocks with exponential backoff until the host has room; returns seconds waited, or None if shut down
+        wait_start, backoff, last_reason = time.monotonic(), 0.25, None
+        while True:
+            with self._cond:
+                if self._closed: return None
+                if self._in_flight == 0: break # Never starve: one job may always run
+            admitted, reason = self.admission.check()
+            if admitted: break
+            if reason != last_reason and backoff >= ADMISSION_MAX_BACKOFF_S:
+                print(f"[Orchestrator] Admission paused ({reason}); {self._in_flight} analyses running."); last_reason = reason
+            with self._cond: self._cond.wait(timeout=backoff) # A finishing job wakes us early
+            backoff = min(backoff * 2, ADMISSION_MAX_BACKOFF_S)
+        self.admission.admitted()
+        return time.monotonic() - wait_start
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._pending or self._in_flight >= self.max_workers): self._cond.wait()
+                if self._closed: return
+            admission_wait_s = self._wait_for_admission() if self.admission else 0.0
+            if admission_wait_s is None: return
+            with self._cond:
+                if not self._pending: continue
+                job_key, task_args, submitted_at = self._pending.popleft(); self._in_flight += 1
+            self.admission_waits.append(admission_wait_s)
+            waits = (admission_wait_s, time.monotonic() - submitted_at) # Queue wait includes the admission wait
+            try: future = self._executor.submit(process_single_prompt_wrapper, task_args)
+            except Exception as e_submit: # Pool broken or shut down: fail the job instead of losing it
+                self._finish(job_key, failed_prompt_result(job_key[1], "EXECUTOR_ERROR", str(e_submit)), waits); continue
+            future.add_done_callback(lambda f, key=job_key, waited=waits: self._on_done(key, f, waited))
+
+    def _on_done(self, job_key, future, waits):
+        try: result = future.result()
+        except Exception as e_exec: # Should ideally be caught by worker, but this is a fallback
+            print(f"[Orchestrator] CRITICAL EXCEPTION from worker for {job_key[0]}/{job_key[1]}: {e_exec}")
+            result = failed_prompt_result(job_key[1], "EXECUTOR_ERROR", str(e_exec))
+        self._finish(job_key, result, waits)
+
+    def _finish(self, job_key, result, waits):
+        result["admission_wait_s"], result["queue_wait_s"] = round(waits[0], 3), round(waits[1], 3)
+        with self._cond:
+            self._in_flight -= 1; self._cond.notify_all()
+        self._completed.put((job_key, result))
+
+    def as_completed(self, count):
+        # Yields (job_key, result) for the next `count` jobs to finish, in completion order
+        for _ in range(count): yield self._completed.get()
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True; self._pending.clear(); self._cond.notify_all()
+        self._dispatcher.join(timeout=5)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class RunEventLog:
+    # Workers put JSON-able events on a multiprocessing queue (see emit_worker_event); one thread here appends each to
+    # the run's JSON-lines log as it arrives and drives the progress view, so nothing is buffered per model.
+    def __init__(self, log_path, total_jobs, progress_interval_s=PROGRESS_INTERVAL_S, stuck_after_s=PROGRESS_STUCK_AFTER_S):
+        self.queue = multiprocessing.Queue()
+        self.log_path = Path(log_path)
+        self.total_jobs = total_jobs
+        self.progress_interval_s, self.stuck_after_s = progress_interval_s, stuck_after_s
+        self.finished_count = 0
+        self.finished_by_model = collections.Counter()
+        self.running = {} # (model, prompt_id) -> start timestamp
+        self.phase_of = {} # (model, prompt_id) -> current analysis phase
+        self._log_file = open(self.log_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._drain, daemon=True, name="run-event-log"); self._thread.start()
+
+    def emit(self, event_type, **fields):
+        self.queue.put(make_run_event(event_type, source="orchestrator", **fields))
+
+    def _drain(self):
+        next_progress = time.monotonic() + self.progress_interval_s
+        while True:
+            try: event = self.queue.get(timeout=max(0.1, next_progress - time.monotonic()))
+            except queue.Empty: event = False
+            if event is None: break # close() sentinel
+            if event:
+                self._log_file.write(json.dumps(event, default=str) + "\n"); self._log_file.flush()
+                self._handle(event)
+            if time.monotonic() >= next_progress:
+                self._print_progress(); next_progress = time.monotonic() + self.progress_interval_s
+        self._log_file.close()
+
+    def _handle(self, event):
+        job_key = (event.get("model"), event.get("prompt_id"))
+        if event["event"] == "prompt_started": self.running[job_key] = event["ts"]
+        elif event["event"] == "prompt_phase": self.phase_of[job_key] = event.get("phase")
+        elif event["event"] == "prompt_retry":
+            print(f"[Orchestrator] {job_key[0]}/{job_key[1]}: attempt {event.get('attempt')} ended {event.get('status')}, retrying in {event.get('backoff_s')}s")
+        elif event["event"] == "prompt_finished":
+            self.running.pop(job_key, None); self.phase_of.pop(job_key, None)
+            self.finished_count += 1; self.finished_by_model[job_key[0]] += 1
+            score = f", {event['score']:.1f}%" if isinstance(event.get("score"), (int, float)) else ""
+            duration = f" in {event['duration_s']:.0f}s" if event.get("duration_s") is not None else ""
+            print(f"[Orchestrator] [{self.finished_count}/{self.total_jobs}] {job_key[0]}/{job_key[1]}: {event.get('status')}{score}{duration}")
+
+    def _print_progress(self):
+        now = time.time()
+        per_model = ", ".join(f"{m}: {n}" for m, n in sorted(self.finished_by_model.items()))
+        print(f"[Orchestrator] Progress: {self.finished_count}/{self.total_jobs} done, {len(self.running)} running. {per_model}")
+        stuck = sorted(((now - started, key) for key, started in self.running.items() if now - started > self.stuck_after_s), reverse=True)
+        for elapsed, (model, prompt_id) in stuck[:5]:
+            print(f"[Orchestrator]   Still running after {elapsed:.0f}s: {model}/{prompt_id} (phase: {self.phase_of.get((model, prompt_id), '?')})")
+
+    def close(self):
+        self.queue.put(None); self._thread.join(timeout=10)
+
+
+class RunManifest:
+    # Checkpoint of one orchestrator run: every (model, prompt) pair with its state and, once finished, its slim
+    # result. Rewritten atomically (temp file + rename) after each prompt, so a crashed or preempted run can be picked
+    # up with --resume <run_id> and its model summaries rebuilt without re-running finished prompts.
+    FILENAME = "RUN_MANIFEST.json"
+
+    def __init__(self, path, data):
+        self.path = Path(path)
+        self.data = data
+
+    @classmethod
+    def create(cls, run_output_dir, run_id, challengename, base_html_dir, master_config_path, prompt_ids_by_model, model_run_dirs):
+        data = {"run_id": run_id, "challenge": challengename, "base_html_dir": str(base_html_dir),
+                "master_config": str(master_config_path), "created": time.strftime('%Y-%m-%dT%H:%M:%S'), "models": {}}
+        for model_name, prompt_ids in prompt_ids_by_model.items():
+            data["models"][model_name] = {"run_dir": str(model_run_dirs[model_name]), "summary": None,
+                                          "prompts": {prompt_id: {"state": "pending"} for prompt_id in prompt_ids}}
+        manifest = cls(Path(run_output_dir) / cls.FILENAME, data)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, run_output_dir):
+        path = Path(run_output_dir) / cls.FILENAME
+        with open(path, 'r', encoding='utf-8') as f: return cls(path, json.load(f))
+
+    def save(self):
+        self.data["updated"] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1); f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def record(self, model_name, prompt_id, result):
+        self.data["models"][model_name]["prompts"][prompt_id] = {"state": "done", "result": slim_prompt_result(result)}
+        self.save()
+
+    def record_summary(self, model_name, summary_path):
+        self.data["models"][model_name]["summary"] = str(summary_path)
+        self.save()
+
+    def pending_prompt_ids(self, model_name):
+        return {pid for pid, entry in self.data["models"][model_name]["prompts"].items() if entry["state"] != "done"}
+
+    def finished_results(self, model_name):
+        return [entry["result"] for entry in self.data["models"][model_name]["prompts"].values() if entry["state"] == "done"]
+
+
+def find_master_config(base_html_dir, challengename):
+    # Per-challenge master config first, then one shared by all challenges at the root of base_html_dir
+    for candidate in (base_html_dir / challengename / "master_prompts_benchmark_config.json", base_html_dir / "master_prompts_benchmark_config.json"):
+        if candidate.exists(): return candidate
+    return None
+
+
+def interleave_by_model(tasks_by_model):
+    # Round-robin across models so every model makes progress from the start instead of one model at a time
+    queues = [collections.deque((model, task) for task in tasks) for model, tasks in tasks_by_model.items()]
+    while queues:
+        for q in list(queues):
+            yield q.popleft()
+            if not q: queues.remove(q)
+
+
+def load_duration_history(challenge_output_dir, exclude_run_dir=None, max_runs=DURATION_HISTORY_RUNS):
+    # Measured prompt durations from earlier runs' manifests: (model, prompt_id) -> latest seconds, and
+    # prompt_id -> median across models for models that have never run that prompt. Carried-over reports have no duration.
+    by_pair, samples_by_prompt = {}, collections.defaultdict(list)
+    run_dirs = sorted((d for d in Path(challenge_output_dir).glob("run_*") if d.is_dir() and d != exclude_run_dir), reverse=True)
+    for run_dir in run_dirs[:max_runs]: # Newest first, so the first duration seen for a pair wins
+        try:
+            with open(run_dir / RunManifest.FILENAME, 'r', encoding='utf-8') as f: models = json.load(f).get("models", {})
+        except (OSError, json.JSONDecodeError): continue
+        for model_name, model_entry in models.items():
+            for prompt_id, prompt_entry in model_entry.get("prompts", {}).items():
+                duration_s = (prompt_entry.get("result") or {}).get("duration_s")
+                if not duration_s: continue
+                by_pair.setdefault((model_name, prompt_id), duration_s)
+                samples_by_prompt[prompt_id].append(duration_s)
+    by_prompt = {prompt_id: sorted(samples)[len(samples) // 2] for prompt_id, samples in samples_by_prompt.items()}
+    return by_pair, by_prompt
+
+
+def estimate_prompt_duration_s(prompt_config_obj):
+    # Cost model for prompts without history: viewports dominate, then Lighthouse, then interaction-heavy adherence checks
+    viewports = len(prompt_config_obj.get("viewports_to_test") or {"desktop": None, "mobile": None})
+    estimate_s = viewports * (ESTIMATE_BASE_S_PER_VIEWPORT + ESTIMATE_LIGHTHOUSE_S)
+    for check in prompt_config_obj.get("adherence_checks", []):
+        check_viewports = len(check.get("viewports") or []) or viewports
+        check_s = ESTIMATE_S_PER_ADHERENCE_CHECK
+        for step in (check.get("sequence", []) if check.get("type") == "interaction" else []):
+            check_s += ESTIMATE_S_PER_INTERACTION_STEP * (1 + len(step.get("expected_outcomes", []))) + step.get("wait_for_outcome_ms", 500) / 1000.0
+        estimate_s += check_viewports * check_s
+    return estimate_s
+
+
+def order_longest_first(tasks_by_model, duration_history):
+    # LPT: the longest expected (model, prompt) jobs are dispatched first so no slow prompt is left to finish alone at
+    # the end. Model interleaving breaks ties (and is the whole order when there is no history and every estimate matches).
+    by_pair, by_prompt = duration_history
+    def expected_s(model_name, task_args):
+        prompt_id = task_args[0].get("prompt_id", "UNKNOWN_PROMPT_IN_CONFIG")
+        if (model_name, prompt_id) in by_pair: return by_pair[(model_name, prompt_id)]
+        if prompt_id in by_prompt: return by_prompt[prompt_id]
+        return estimate_prompt_duration_s(task_args[0])
+    return sorted(interleave_by_model(tasks_by_model), key=lambda job: expected_s(*job), reverse=True)
+
 
 def main_orchestrator():
-    if len(sys.argv) < 4:
-        print("Usage: python orchestrator.py <base_html_dir> <challengename> <master_output_dir> [max_parallel_models] [workers_per_model]")
-        print("  <base_html_dir>: Directory containing challenge subdirectories (e.g., './data').")
-        print("  <challengename>: Name of the challenge subdirectory (e.g., 'my_web_challenge').")
-        print("  <master_output_dir>: Base directory for all benchmark results (e.g., './benchmark_runs').")
-        print("  [max_parallel_models]: Max models to run concurrently (default: 2).")
-        print("  [workers_per_model]: Max prompts per model to run concurrently (default: uses analyzer's default or PROMPT_WORKERS_COUNT env var).")
-        print("\nExample: python orchestrator.py ./all_code_outputs web-challenge-alpha ./benchmark_results 3 4")
-        print("  This expects HTMLs in: ./all_code_outputs/web-challenge-alpha/{model1_name}/prompt1.html, etc.")
-        print("  And a master config like: ./all_code_outputs/web-challenge-alpha/master_prompts_benchmark_config.json")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Benchmark every model of a challenge with one global (model x prompt) work queue.",
+        epilog="Example: python orchestrator.py ./all_code_outputs web-challenge-alpha ./benchmark_results --workers 16\n"
+               "  This expects HTMLs in: ./all_code_outputs/web-challenge-alpha/{model1_name}/prompt1.html, etc.\n"
+               "  And a master config like: ./all_code_outputs/web-challenge-alpha/master_prompts_benchmark_config.json",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base_html_dir", help="Directory containing challenge subdirectories (e.g., './data').")
+    parser.add_argument("challengename", help="Name of the challenge subdirectory (e.g., 'my_web_challenge').")
+    parser.add_argument("master_output_dir", help="Base directory for all benchmark results (e.g., './benchmark_runs').")
+    parser.add_argument("max_parallel_models", nargs="?", type=int, default=None,
+                        help="Deprecated: with workers_per_model, their product caps the global worker count.")
+    parser.add_argument("workers_per_model", nargs="?", type=int, default=None, help="Deprecated: see max_parallel_models.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"Prompt analyses to run concurrently across all models (default: cores, capped by free RAM / {WORKER_MEMORY_BUDGET_MB}MB).")
+    parser.add_argument("--no-admission-control", action="store_true",
+                        help="Start analyses whenever a worker is free, without checking free RAM and load first.")
+    parser.add_argument("--no-lh-cache", action="store_true", help="Always run Lighthouse instead of reusing cached reports.")
+    parser.add_argument("--incremental", action="store_true", help="Only re-analyze prompt/model pairs whose page or prompt config changed since earlier runs.")
+    parser.add_argument("--coordinator", metavar="HOST:PORT", default=None,
+                        help="Hand (model, prompt) shards to `distributed.py worker` processes connecting here instead of analyzing locally.")
+    parser.add_argument("--authkey", default=os.environ.get(AUTHKEY_ENV), help=f"Shared secret for --coordinator (default: ${AUTHKEY_ENV}, else generated).")
+    parser.add_argument("--local-workers", type=int, default=0, metavar="SLOTS",
+                        help="With --coordinator, also start a worker on this host with this many slots.")
+    parser.add_argument("--resume", metavar="RUN_ID", default=None,
+                        help="Continue an interrupted run (e.g. 20250101-120000 or run_20250101-120000): only its unfinished prompts are analyzed.")
+    args = parser.parse_args()
 
-    base_html_dir_arg = Path(sys.argv[1]).resolve()
-    challengename_arg = sys.argv[2]
-    master_output_dir_arg = Path(sys.argv[3]).resolve()
-    
-    max_parallel_models_arg = int(sys.argv[4]) if len(sys.argv) > 4 else 2
-    workers_per_model_arg = int(sys.argv[5]) if len(sys.argv) > 5 else None # None lets analyzer script use its default/env
-
-    # Assuming orchestrator.py is in the same directory as ui_benchmark_analyzer.py
-    analyzer_script_path_obj = (Path(__file__).parent / "ui_benchmark_analyzer.py").resolve()
-    if not analyzer_script_path_obj.exists():
-        print(f"FATAL: Analyzer script not found at {analyzer_script_path_obj}")
-        sys.exit(1)
+    base_html_dir_arg = Path(args.base_html_dir).resolve()
+    challengename_arg = args.challengename
+    master_output_dir_arg = Path(args.master_output_dir).resolve()
+
+    global_workers = args.workers or default_global_workers()
+    if not args.workers and args.max_parallel_models and args.workers_per_model:
+        global_workers = min(global_workers, args.max_parallel_models * args.workers_per_model)
+        print(f"[Orchestrator] Positional parallelism arguments are deprecated; use --workers. Capping at {global_workers}.")
 
     challenge_data_path = base_html_dir_arg / challengename_arg
     if not challenge_data_path.is_dir():
         print(f"Challenge data directory not found: {challenge_data_path}")
         sys.exit(1)
 
-    model_dirs = [d for d in challenge_data_path.iterdir() if d.is_dir()]
+    model_dirs = sorted(d for d in challenge_data_path.iterdir() if d.is_dir())
     if not model_dirs:
         print(f"No model subdirectories found in {challenge_data_path}")
         sys.exit(1)
 
-    master_output_dir_arg.mkdir(parents=True, exist_ok=True)
-    global_run_timestamp_val = time.strftime('%Y%m%d-%H%M%S')
+    manifest = None
+    if args.resume:
+        run_output_dir = master_output_dir_arg / challengename_arg / f"run_{args.resume.removeprefix('run_')}"
+        try: manifest = RunManifest.load(run_output_dir)
+        except (OSError, ValueError) as e:
+            print(f"Cannot resume: no readable {RunManifest.FILENAME} in {run_output_dir} ({e})")
+            sys.exit(1)
+        master_config_file_path = Path(manifest.data["master_config"]) # Same prompts as the interrupted run
+        model_dirs = [challenge_data_path / model_name for model_name in manifest.data["models"]]
+    else: master_config_file_path = find_master_config(base_html_dir_arg, challengename_arg)
+    if not master_config_file_path or not master_config_file_path.exists():
+        print(f"Master prompts config not found for {challengename_arg} (checked in challenge and base HTML dirs).")
+        sys.exit(1)
+    try:
+        with open(master_config_file_path, 'r', encoding='utf-8') as f: master_config = json.load(f)
+    except Exception as e:
+        print(f"Error loading master config: {e}")
+        sys.exit(1)
+    prompt_configs = master_config.get("prompts", [])
+
+    chrome_env = None # A coordinator only hands out shards; each worker resolves its own Chrome
+    if not args.coordinator:
+        try: chrome_env = resolve_chrome_environment()
+        except RuntimeError as e:
+            print(f"FATAL: {e}")
+            sys.exit(1)
+        print(f"ChromeDriver resolved once for this run: {chrome_env['chromedriver_path']} ({chrome_env['chromedriver_version']})")
+        print(f"Chrome: {chrome_env['chrome_binary'] or 'auto-detected by ChromeDriver'} ({chrome_env['chrome_version'] or 'version unknown'})")
 
-    print(f"Orchestrator starting. Max parallel models: {max_parallel_models_arg}.")
-    print(f"Analyzer script: {analyzer_script_path_obj}")
-    
-    all_model_run_results = []
-    
-    # Convert Paths to strings for ProcessPoolExecutor arguments for max compatibility
-    tasks_for_model_workers = []
+    # Output path: {master_output_dir}/{challengename}/run_{global_run_timestamp}/{modelname}_{global_run_timestamp}/
+    global_run_timestamp_val = manifest.data["run_id"] if manifest else time.strftime('%Y%m%d-%H%M%S')
+    run_output_dir = master_output_dir_arg / challengename_arg / f"run_{global_run_timestamp_val}"
+    run_output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Plan every model up front: carried-over reports go straight into the results, the rest into the global queue
+    model_run_dirs, results_by_model, tasks_by_model = {}, {}, {}
     for model_dir_path_obj in model_dirs:
-        tasks_for_model_workers.append(
-            (challengename_arg, model_dir_path_obj.name, str(base_html_dir_arg), 
-             str(master_output_dir_arg), str(analyzer_script_path_obj), 
-             global_run_timestamp_val, workers_per_model_arg)
-        )
-
-    with ProcessPoolExecutor(max_workers=max_parallel_models_arg) as executor:
-        future_to_modelname = {
-            executor.submit(run_benchmark_for_single_model, *task_args): task_args[1] # modelname is task_args[1]
-            for task_args in tasks_for_model_workers
-        }
-        
-        for future in as_completed(future_to_modelname):
-            model_name_completed = future_to_modelname[future]
-            try:
-                result = future.result()
-                all_model_run_results.append(result)
-            except Exception as e_exec:
-                print(f"[Orchestrator] CRITICAL EXCEPTION from model worker for {model_name_completed}: {e_exec}")
-                all_model_run_results.append({"model": model_name_completed, "status": "ORCHESTRATOR_FUTURE_ERROR", "error": str(e_exec)})
-    
+        model_name = model_dir_path_obj.name
+        model_run_dirs[model_name] = run_output_dir / f"{model_name}_{global_run_timestamp_val}"
+        model_run_dirs[model_name].mkdir(parents=True, exist_ok=True)
+        if manifest: # Resume: finished prompts come from the checkpoint, only pending ones are planned again
+            pending_ids = manifest.pending_prompt_ids(model_name)
+            tasks_by_model[model_name], _ = plan_model_prompts([cfg for cfg in prompt_configs if cfg.get("prompt_id", "UNKNOWN_PROMPT_IN_CONFIG") in pending_ids],
+                                                               model_dir_path_obj, model_run_dirs[model_name], global_run_timestamp_val)
+            results_by_model[model_name] = manifest.finished_results(model_name)
+            print(f"[Orchestrator] {model_name}: {len(results_by_model[model_name])} prompt(s) already finished, {len(tasks_by_model[model_name])} to run.")
+            continue
+        previous_reports = find_previous_prompt_reports(run_output_dir, model_name, model_run_dirs[model_name]) if args.incremental else {}
+        tasks_by_model[model_name], results_by_model[model_name] = plan_model_prompts(
+            prompt_configs, model_dir_path_obj, model_run_dirs[model_name], global_run_timestamp_val, previous_reports)
+        if args.incremental: print(f"[Orchestrator] {model_name}: reusing {len(results_by_model[model_name])} unchanged prompt report(s).")
+
+    if not manifest:
+        manifest = RunManifest.create(run_output_dir, global_run_timestamp_val, challengename_arg, base_html_dir_arg, master_config_file_path,
+                                      {d.name: [cfg.get("prompt_id", "UNKNOWN_PROMPT_IN_CONFIG") for cfg in prompt_configs] for d in model_dirs}, model_run_dirs)
+        for model_name, reused_results in results_by_model.items():
+            for reused_report in reused_results: manifest.data["models"][model_name]["prompts"][reused_report["prompt_id"]] = {"state": "done", "result": slim_prompt_result(reused_report)}
+        manifest.save()
+
+    remaining_by_model = {model: len(tasks) for model, tasks in tasks_by_model.items()}
+    total_jobs = sum(remaining_by_model.values())
+    print(f"Orchestrator starting. {len(model_dirs)} models x {len(prompt_configs)} prompts; {total_jobs} prompt analyses queued, {global_workers} global workers.")
+
+    duration_history = load_duration_history(run_output_dir.parent, exclude_run_dir=run_output_dir)
+    ordered_jobs = order_longest_first(tasks_by_model, duration_history)
+    print(f"[Orchestrator] Longest-first order from {len(duration_history[0])} measured (model, prompt) durations in earlier runs.")
+
+    events = RunEventLog(run_output_dir / "RUN_EVENTS.jsonl", total_jobs)
+    events.emit("run_resumed" if args.resume else "run_started", challenge=challengename_arg, models=[d.name for d in model_dirs], prompts=len(prompt_configs),
+                queued=total_jobs, workers=global_workers)
+
+    all_model_run_results = []
+    def finalize_model(model_name):
+        master_summary = build_model_summary(model_name, master_config_file_path, master_config, challenge_data_path / model_name,
+                                             global_run_timestamp_val, results_by_model[model_name])
+        summary_path = write_model_summary(model_run_dirs[model_name], master_summary)
+        manifest.record_summary(model_name, summary_path)
+        events.emit("model_finished", model=model_name, summary=str(summary_path), prompts_analyzed_successfully=master_summary["prompts_analyzed_successfully"],
+                    overall_weighted_score=master_summary["aggregate_scores"]["overall_weighted_score_from_totals"])
+        all_model_run_results.append({"model": model_name, "status": "SUCCESS", "prompts_analyzed_successfully": master_summary["prompts_analyzed_successfully"],
+                                      "prompts_configured": master_summary["total_prompts_configured"]})
+
+    for model_name, remaining in remaining_by_model.items():
+        if remaining == 0: finalize_model(model_name) # Nothing to run (e.g. everything reused)
+
+    static_server, lh_manager, lh_service, local_worker_process = None, None, None, None
+    if args.coordinator:
+        # Workers (remote, or the local one below) bring their own browsers, static server and Lighthouse service
+        authkey = args.authkey or secrets.token_hex(16)
+        scheduler = ShardCoordinator(parse_address(args.coordinator), authkey.encode("utf-8"), on_event=events.emit)
+        coordinator_address = f"{scheduler.address[0]}:{scheduler.address[1]}"
+        print(f"[Orchestrator] Coordinating {total_jobs} shards on {coordinator_address}. Start workers with:")
+        print(f"  {AUTHKEY_ENV}={authkey} python distributed.py worker {coordinator_address} --slots N")
+        if args.local_workers > 0:
+            worker_cmd = [sys.executable, str(Path(__file__).parent / "distributed.py"), "worker", coordinator_address, "--slots", str(args.local_workers)]
+            if args.no_lh_cache: worker_cmd.append("--no-lh-cache")
+            local_worker_process = subprocess.Popen(worker_cmd, env={**os.environ, AUTHKEY_ENV: authkey})
+    else:
+        # One server for every model/prompt page of this run
+        static_server = StaticSiteServer(base_html_dir_arg); static_server.start()
+        static_site = (str(static_server.root_dir), static_server.base_url)
+        print(f"Serving {base_html_dir_arg} at {static_server.base_url}")
+        lighthouse_cache = None if args.no_lh_cache else LighthouseResultCache()
+        lh_manager, lh_service = start_lighthouse_service(chrome_env, global_workers)
+        scheduler = PromptScheduler(global_workers, initializer=init_prompt_worker,
+                                    initargs=(BROWSER_RECYCLE_AFTER_PROMPTS, chrome_env, lh_service, lighthouse_cache, static_site, events.queue),
+                                    admission=None if args.no_admission_control else AdmissionController())
+    profile = RunProfile()
+    try:
+        for model_name, task_args in ordered_jobs:
+            scheduler.submit((model_name, task_args[0].get("prompt_id", "UNKNOWN_PROMPT_IN_CONFIG")), task_args)
+
+        for (model_name, prompt_id), result in scheduler.as_completed(total_jobs):
+            if "duration_s" not in result and not getattr(scheduler, "reports_events", False): # Worker died before it could report; close the job ourselves
+                events.emit("prompt_finished", model=model_name, prompt_id=prompt_id, status=result.get("status"), error=result.get("error"))
+            profile.add(model_name, result)
+            results_by_model[model_name].append(slim_prompt_result(result)) # Full reports stay on disk
+            manifest.record(model_name, prompt_id, result) # Checkpoint before anything else can go wrong
+            remaining_by_model[model_name] -= 1
+            if remaining_by_model[model_name] == 0: finalize_model(model_name) # Summary is written as soon as a model is complete
+    finally:
+        scheduler.shutdown()
+        if local_worker_process:
+            try: local_worker_process.wait(timeout=30) # Exits once the coordinator stops answering
+            except subprocess.TimeoutExpired: local_worker_process.terminate()
+        stop_lighthouse_service(lh_manager, lh_service)
+        if static_server: static_server.stop()
+        profile_path = profile.write(run_output_dir / "RUN_PROFILE.json") # Also for interrupted runs: covers what did finish
+        events.emit("run_finished", models_finished=len(all_model_run_results), profile=str(profile_path))
+        events.close()
+
     print("\n--- Orchestrator Overall Summary ---")
-    successful_models = 0
-    for res in all_model_run_results:
-        print(f"  Model: {res.get('model')}, Status: {res.get('status')}")
-        if res.get('status') == "SUCCESS":
-            successful_models += 1
-        elif res.get('stderr'):
-            print(f"    Error Snippet: {res['stderr'][:300]}...")
-    
-    print(f"\nTotal models processed: {len(all_model_run_results)}. Successful models: {successful_models}.")
-    print(f"Main benchmark outputs in: {master_output_dir_arg}/{challengename_arg}/run_{global_run_timestamp_val}/")
-    print("Each successful model run will have a MASTER_BENCHMARK_SUMMARY.json inside its respective modelname_timestamp subfolder.")
+    for res in sorted(all_model_run_results, key=lambda r: r["model"]):
+        print(f"  Model: {res['model']}, Prompts analyzed successfully: {res['prompts_analyzed_successfully']}/{res['prompts_configured']}")
+
+    if scheduler.admission_waits:
+        print(f"Admission wait: total {sum(scheduler.admission_waits):.1f}s, max {max(scheduler.admission_waits):.1f}s, "
+              f"{sum(1 for w in scheduler.admission_waits if w > 0.01)}/{len(scheduler.admission_waits)} analyses delayed.")
+    print(f"\nTotal models processed: {len(all_model_run_results)}.")
+    print(f"Main benchmark outputs in: {run_output_dir}/")
+    print(f"Event log: {events.log_path}")
+    print(f"Run profile: {profile_path}")
+    print(f"Run manifest: {manifest.path} (resume with --resume {global_run_timestamp_val})")
+    print("Each model has a MASTER_BENCHMARK_SUMMARY.json inside its respective modelname_timestamp subfolder.")
 
 if __name__ == "__main__":
-    main_orchestrator()
\ No newline at end of file
+    main_orchestrator()
@@ -0,0 +1,99 @@
+# Unit tests for how interaction checks are split into isolated groups and how isolated copies are built.
+# No browser needed. Run from v4/: python -m unittest discover tests
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import ui_benchmark_analyzer as analyzer
+
+
+def interaction(name, **extra):
+    return {"type": "interaction", "name": name, "sequence": [], **extra}
+
+def static(name):
+    return {"type": "element_presence", "name": name, "selector": "#x"}
+
+
+class FakeDriver:
+    def quit(self): pass
+
+
+def make_analyzer(tmp, checks, **prompt_extra):
+    html_path = Path(tmp) / "p.html"; html_path.write_text("<html></html>", encoding="utf-8")
+    config = {"prompt_id": "p", "adherence_checks": checks, **prompt_extra}
+    with redirect_stdout(StringIO()): # Lighthouse-not-found warning
+        return analyzer.UIBenchmarkAnalyzer(html_path, config, Path(tmp) / "out", "ts", driver=FakeDriver())
+
+
+class PlanIsolatedInteractionsTest(unittest.TestCase):
+    def plan(self, checks, **prompt_extra):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = StringIO()
+            with redirect_stdout(out): groups = make_analyzer(tmp, checks, **prompt_extra)._plan_isolated_interactions(checks)
+            return sorted(groups), out.getvalue()
+
+    def test_independent_checks_get_their_own_groups(self):
+        groups, _ = self.plan([static("s"), interaction("a"), interaction("b")])
+        self.assertEqual(groups, [[1], [2]])
+
+    def test_depends_on_chain_shares_one_group(self):
+        checks = [interaction("a"), interaction("b", depends_on="a"), interaction("c", depends_on=["b"]), interaction("d")]
+        groups, _ = self.plan(checks)
+        self.assertEqual(groups, [[0, 1, 2], [3]])
+
+    def test_forward_dependency_is_grouped_in_config_order_with_a_warning(self):
+        groups, log = self.plan([interaction("a", depends_on="b"), interaction("b")])
+        self.assertEqual(groups, [[0, 1]])
+        self.assertIn("depends on the later check 'b'", log)
+
+    def test_unknown_dependency_is_ignored_with_a_warning(self):
+        groups, log = self.plan([interaction("a", depends_on="missing"), interaction("b")])
+        self.assertEqual(groups, [[0], [1]])
+        self.assertIn("unknown check 'missing'", log)
+
+    def test_dependency_on_static_check_does_not_group(self):
+        groups, log = self.plan([static("s"), interaction("a", depends_on="s"), interaction("b", depends_on="s")])
+        self.assertEqual(groups, [[1], [2]])
+        self.assertEqual(log, "")
+
+    def test_sequential_check_keeps_its_whole_group_on_the_main_page(self):
+        checks = [interaction("a"), interaction("b", depends_on="a", sequential=True), interaction("c")]
+        groups, _ = self.plan(checks)
+        self.assertEqual(groups, [[2]])
+
+    def test_sequential_prompt_runs_nothing_isolated(self):
+        groups, _ = self.plan([interaction("a"), interaction("b")], sequential=True)
+        self.assertEqual(groups, [])
+
+
+class IsolatedCopyTest(unittest.TestCase):
+    def test_copy_shares_only_allow_listed_attributes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            parent = make_analyzer(tmp, [interaction("a")])
+            parent._adherence_checks_passed_this_prompt = {}
+            for driver in (parent.driver, FakeDriver()):
+                isolated = parent._isolated_copy(driver)
+                # Every analyzer attribute must be set on the copy, so new state cannot be left out unnoticed
+                self.assertEqual(set(vars(parent)) - set(vars(isolated)), set())
+                for attr, value in vars(isolated).items():
+                    if attr in analyzer.UIBenchmarkAnalyzer.ISOLATED_SHARED_ATTRS or not isinstance(value, (dict, list, set)): continue
+                    self.assertIsNot(value, getattr(parent, attr, None), f"{attr} is shared with the parent")
+
+    def test_findings_are_deferred_until_merged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            parent = make_analyzer(tmp, [interaction("a", points=1)])
+            isolated = parent._isolated_copy(FakeDriver())
+            isolated._add_finding("Prompt Adherence", "a", 1, 1, "ok", "PASS", is_adherence_check=True)
+            isolated.viewport_navigation_log.append({"viewport": "desktop", "mode": "reload"})
+            self.assertEqual(parent.current_prompt_scores["prompt_adherence"]["details"], [])
+            parent._merge_isolated_copy(isolated)
+            self.assertEqual([d["status"] for d in parent.current_prompt_scores["prompt_adherence"]["details"]], ["PASS"])
+            self.assertEqual(parent.viewport_navigation_log, [{"viewport": "desktop", "mode": "reload"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
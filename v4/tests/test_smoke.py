@@ -0,0 +1,74 @@
+# End-to-end smoke test: analyzes one small local page through analyze_model() with a real Chrome.
+# Skipped when no usable Chrome/ChromeDriver is found. Run from v4/: python -m unittest discover tests
+import os
+import sys
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("PROMPT_WORKERS_COUNT", "1")
+os.environ.setdefault("INTERACTION_PARALLELISM", "2") # Exercise a helper browser too
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import ui_benchmark_analyzer as analyzer
+
+SMOKE_PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>Smoke Test</title></head>
+<body>
+  <h1 id="title">Smoke</h1>
+  <button id="toggle">Toggle</button><div id="panel" class="panel">Panel</div>
+  <button id="add">Add</button><ul id="list"><li>one</li></ul>
+  <script>
+    document.getElementById('toggle').addEventListener('click', () => document.getElementById('panel').classList.toggle('open'));
+    document.getElementById('add').addEventListener('click', () => {
+      const li = document.createElement('li'); li.textContent = 'new'; document.getElementById('list').appendChild(li);
+    });
+  </script>
+</body></html>
+"""
+
+def click_step(trigger, outcome):
+    return {"trigger_element": {"selector": trigger}, "action": {"type": "click"}, "wait_for_outcome_ms": 2000, "expected_outcomes": [outcome]}
+
+SMOKE_CONFIG = {"benchmark_run_name": "Smoke", "prompts": [{
+    "prompt_id": "smoke_001", "prompt_description": "Toggle panel and list.",
+    "viewports_to_test": {"desktop": [1280, 800]},
+    "adherence_checks": [
+        {"type": "element_presence", "name": "Title", "selector": "#title", "points": 1},
+        {"type": "interaction", "name": "Open panel", "points": 1,
+         "sequence": [click_step("#toggle", {"outcome_type": "class_change", "element_selector": "#panel", "expected_class_present": "open"})]},
+        {"type": "interaction", "name": "Close panel", "depends_on": "Open panel", "points": 1,
+         "sequence": [click_step("#toggle", {"outcome_type": "class_change", "element_selector": "#panel", "expected_class_absent": "open"})]},
+        # Both pass only if each starts from the page as loaded (one list item before the click)
+        *[{"type": "interaction", "name": f"Add item {i}", "points": 1,
+           "sequence": [click_step("#add", {"outcome_type": "new_element_count", "element_selector": "#list", "child_element_selector": "li", "expected_count": 2})]}
+          for i in (1, 2)],
+        {"type": "element_count", "name": "Main page untouched", "selector": "#list li", "expected_count": 1, "points": 1},
+    ]}]}
+
+
+class AnalyzeOnePageSmokeTest(unittest.TestCase):
+    def setUp(self):
+        try: self.chrome_env = analyzer.resolve_chrome_environment()
+        except Exception as e: self.skipTest(f"No usable Chrome/ChromeDriver: {e}")
+
+    def test_analyze_model_scores_local_page(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            html_dir = Path(tmp) / "smoke_model"; html_dir.mkdir()
+            (html_dir / "smoke_001.html").write_text(SMOKE_PAGE, encoding="utf-8")
+            run = analyzer.analyze_model(SMOKE_CONFIG, html_dir, Path(tmp) / "runs", chrome_env=self.chrome_env)
+
+            self.assertEqual(len(run["prompt_results"]), 1)
+            result = run["prompt_results"][0]
+            self.assertEqual(result.get("status"), "SUCCESS", result.get("error"))
+            adherence = result["scores"]["prompt_adherence"]
+            failed = [d for d in adherence["details"] if d["status"] != "PASS"]
+            self.assertEqual(failed, [])
+            self.assertEqual(adherence["earned"], adherence["max"])
+            self.assertTrue(run["summary_path"].is_file())
+            report_path = Path(result["output_directory_for_this_prompt"]) / "smoke_001_detailed_report.json"
+            self.assertTrue(json.loads(report_path.read_text(encoding="utf-8"))["page_state_resets"])
+
+
+if __name__ == "__main__":
+    unittest.main()
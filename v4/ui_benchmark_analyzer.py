@@ -7,15 +7,32 @@ import json
 import subprocess
 import time
 import shutil
+import signal
+import collections
+import hashlib
+import gzip
+import io
+import email.utils
+import argparse
+import queue
+import tempfile
+import random
+import itertools
+import copy
+try: import resource # Peak RSS of worker processes; Unix only
+except ImportError: resource = None
 from urllib.parse import urlparse, unquote, quote
 from pathlib import Path
 import threading
-import socket
+import multiprocessing
+import multiprocessing.util
+from multiprocessing.managers import BaseManager
 import http.server
 import socketserver
-from functools import partial
+from functools import partial, lru_cache
+from contextlib import contextmanager
 from difflib import SequenceMatcher
-from concurrent.futures import ProcessPoolExecutor, as_completed # Add this
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, as_completed # Add this
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
@@ -60,11 +77,82 @@ TECHNICAL_QUALITY_MAX_POINTS_CONFIG = {
 WEIGHT_TECHNICAL_QUALITY = 0.3
 WEIGHT_PROMPT_ADHERENCE = 0.7
 
+# Bump whenever a check or its scoring changes so --incremental runs stop reusing older reports
+ANALYZER_VERSION = "4.2"
+
 # NEW: Configuration for parallel prompt processing within a single model run
 # Adjust default based on typical machine capabilities or make it a script argument
 DEFAULT_PROMPT_WORKERS = max(1, os.cpu_count() // 2)
 PROMPT_WORKERS_COUNT = int(os.environ.get("PROMPT_WORKERS_COUNT", DEFAULT_PROMPT_WORKERS))
 
+# Load each prompt page once and switch viewports in place via CDP device-metrics emulation.
+# The page is only re-navigated when an interaction has mutated it since the last load.
+SINGLE_NAVIGATION_VIEWPORTS = os.environ.get("SINGLE_NAVIGATION_VIEWPORTS", "0").lower() in ("1", "true", "yes")
+
+# "Page settled" waits (replace fixed sleeps): no in-flight requests and no DOM mutations for the quiet window
+PAGE_SETTLE_MAX_WAIT_S = float(os.environ.get("PAGE_SETTLE_MAX_WAIT_S", 5.0)) # Ceiling after a navigation
+PAGE_SETTLE_QUIET_MS = int(os.environ.get("PAGE_SETTLE_QUIET_MS", 300))
+ACTION_SETTLE_MAX_WAIT_S = float(os.environ.get("ACTION_SETTLE_MAX_WAIT_S", 1.0)) # Ceiling after setup/cleanup actions
+
+# Upper bound on text elements sampled by the contrast check (single in-page scan, so this can be generous)
+CONTRAST_MAX_ELEMENTS = int(os.environ.get("CONTRAST_MAX_ELEMENTS", 1000))
+
+# Static adherence checks are probed in one injected script per run of consecutive static checks (interactions and
+# custom scripts may change the page, so they split the batch); scoring stays in Python. 0 = one lookup per check.
+ADHERENCE_BATCH_PROBES = os.environ.get("ADHERENCE_BATCH_PROBES", "1").lower() in ("1", "true", "yes")
+# Interaction outcomes are awaited through in-page watchers (execute_async_script) instead of WebDriver polling
+OUTCOME_WATCHERS = os.environ.get("OUTCOME_WATCHERS", "1").lower() in ("1", "true", "yes")
+# Interactions get their page back from an in-page snapshot (reverting logged DOM mutations, form values, scroll, storage)
+# instead of a reload; a reload is still used when the restore cannot be verified. 0 = always reload.
+PAGE_STATE_RESTORE = os.environ.get("PAGE_STATE_RESTORE", "1").lower() in ("1", "true", "yes")
+PAGE_STATE_MAX_MUTATIONS = int(os.environ.get("PAGE_STATE_MAX_MUTATIONS", 20000))
+# Interaction checks with no declared dependency on each other can run side by side: one in the prompt's browser, the
+# rest in helper browsers launched for the prompt. Caps the browsers a worker uses at once (1 = no helpers). Each helper
+# is another full Chrome, so the orchestrator multiplies its per-worker memory budget by this.
+INTERACTION_PARALLELISM = max(1, int(os.environ.get("INTERACTION_PARALLELISM", 1)))
+BATCHABLE_ADHERENCE_TYPES = ("element_presence", "element_count", "text_content", "attribute_value", "css_property", "element_order")
+
+# Lighthouse runs go through one shared service per run: a few pre-launched Chromes (one job each at a
+# time) that the lighthouse CLI attaches to via --port, so it never boots its own browser. Unset = sized from the
+# number of prompt workers by lighthouse_slot_count(); how long prompts waited for a slot is in RUN_PROFILE.json.
+LIGHTHOUSE_WORKERS_COUNT = int(os.environ["LIGHTHOUSE_WORKERS_COUNT"]) if os.environ.get("LIGHTHOUSE_WORKERS_COUNT") else None
+LIGHTHOUSE_CHROME_RECYCLE_AFTER = int(os.environ.get("LIGHTHOUSE_CHROME_RECYCLE_AFTER", 50))
+LIGHTHOUSE_TIMEOUT_S = 300
+# Longest a prompt waits for a free Lighthouse slot; after that the audit is scored as failed instead of blocking the worker
+LIGHTHOUSE_QUEUE_TIMEOUT_S = float(os.environ.get("LIGHTHOUSE_QUEUE_TIMEOUT_S", 300))
+
+# Content-addressed Lighthouse report cache (HTML + local assets + LH version/settings), LRU-evicted by size
+LIGHTHOUSE_CACHE_DIR = Path(os.environ.get("LIGHTHOUSE_CACHE_DIR", Path.home() / ".cache" / "uigeneval" / "lighthouse"))
+LIGHTHOUSE_CACHE_MAX_MB = int(os.environ.get("LIGHTHOUSE_CACHE_MAX_MB", 1024))
+LIGHTHOUSE_THROTTLING_METHOD = "simulate"
+
+# One static HTTP server per run serves every model/prompt directory; its location is handed to child processes via env
+STATIC_SITE_ROOT_ENV = "UIGENEVAL_STATIC_ROOT"
+STATIC_SITE_BASE_URL_ENV = "UIGENEVAL_STATIC_BASE_URL"
+STATIC_GZIP_MIN_BYTES = 1024
+
+# Wall-clock budgets per analysis phase (each time a phase is entered) and for the whole prompt. A watchdog kills the
+# browser when one is exceeded and the prompt is recorded as TIMEOUT. Prompts may override via "phase_timeouts_s".
+PROMPT_PHASE_TIMEOUTS_S = {
+    "load": float(os.environ.get("PROMPT_TIMEOUT_LOAD_S", 90)), # Browser acquisition + navigation + settle
+    "technical": float(os.environ.get("PROMPT_TIMEOUT_TECHNICAL_S", 240)), # Axe, contrast, HTML/CSS/JS, responsiveness
+    "lighthouse_queue": LIGHTHOUSE_QUEUE_TIMEOUT_S + 30, # Waiting for a Lighthouse service slot, kept out of "lighthouse"
+    "lighthouse": float(os.environ.get("PROMPT_TIMEOUT_LIGHTHOUSE_S", LIGHTHOUSE_TIMEOUT_S + 60)),
+    "adherence": float(os.environ.get("PROMPT_TIMEOUT_ADHERENCE_S", 300)),
+}
+PROMPT_TIMEOUT_S = float(os.environ.get("PROMPT_TIMEOUT_S", 1800))
+
+# Transient failures (a crashed or hung Chrome) are retried inside the worker before a prompt counts as failed.
+# Backoff doubles per attempt with jitter; by default every retry gets a freshly launched browser.
+PROMPT_MAX_ATTEMPTS = int(os.environ.get("PROMPT_MAX_ATTEMPTS", 3))
+PROMPT_RETRY_BACKOFF_S = float(os.environ.get("PROMPT_RETRY_BACKOFF_S", 5.0))
+PROMPT_RETRY_STATUSES = set(os.environ.get("PROMPT_RETRY_STATUSES", "WEBDRIVER_ERROR").split(","))
+PROMPT_RETRY_FRESH_BROWSER = os.environ.get("PROMPT_RETRY_FRESH_BROWSER", "1").lower() in ("1", "true", "yes")
+
+# Each prompt worker keeps one warm Chrome; it is relaunched after this many prompts to bound leaks/bloat
+BROWSER_RECYCLE_AFTER_PROMPTS = int(os.environ.get("BROWSER_RECYCLE_AFTER_PROMPTS", 25))
+WEBDRIVER_SCRIPT_TIMEOUT_S = 30 # WebDriver's default; outcome waits raise it for one wait and put it back
+
 
 # --- Helper Functions ---
 def parse_color_string_to_rgb_tuple(color_str):
@@ -105,33 +193,546 @@ def blend_colors(fg_rgba, bg_rgb): # fg_rgba=(r,g,b,a), bg_rgb=(r,g,b)
     b = int(fg_b * alpha + bg_b * (1 - alpha))
     return (r, g, b)
 
-def get_effective_background_rgb(element, driver):
-    current_el = element
-    path_colors_with_alpha = []
-    doc_bg_color_str = driver.execute_script("return getComputedStyle(document.documentElement).backgroundColor;")
-    doc_bg_rgba = parse_color_string_to_rgb_tuple(doc_bg_color_str)
-    effective_bg_rgb = (doc_bg_rgba[0], doc_bg_rgba[1], doc_bg_rgba[2]) if doc_bg_rgba and doc_bg_rgba[3] == 1.0 else (255, 255, 255)
+class EffectiveBackgroundCache:
+    # Per-page memo of resolved opaque backgrounds, keyed by WebElement id (Python walker) and by the
+    # in-page node id handed out by CONTRAST_SCAN_SCRIPT (doc_token ties those ids to one document).
+    # Must be cleared when the viewport changes or an interaction may have mutated the DOM.
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.doc_bg_rgb = None
+        self.rgb_by_element = {}
+        self.doc_token = None
+        self.rgb_by_node = {}
+
+def get_effective_background_rgb(element, driver, bg_cache=None):
+    if bg_cache is not None and bg_cache.doc_bg_rgb is not None: effective_bg_rgb = bg_cache.doc_bg_rgb
+    else:
+        doc_bg_color_str = driver.execute_script("return getComputedStyle(document.documentElement).backgroundColor;")
+        doc_bg_rgba = parse_color_string_to_rgb_tuple(doc_bg_color_str)
+        effective_bg_rgb = (doc_bg_rgba[0], doc_bg_rgba[1], doc_bg_rgba[2]) if doc_bg_rgba and doc_bg_rgba[3] == 1.0 else (255, 255, 255)
+        if bg_cache is not None: bg_cache.doc_bg_rgb = effective_bg_rgb
 
+    current_el = element
+    path_layers = [] # (element id, translucent layer or None), element first
     while current_el:
+        if bg_cache is not None and current_el.id in bg_cache.rgb_by_element:
+            effective_bg_rgb = bg_cache.rgb_by_element[current_el.id]; break # Stop at the first cached ancestor
         try:
             tag_name = current_el.tag_name.lower()
             is_root_or_body = tag_name in ['html', 'body']
             bg_color_str = driver.execute_script("return getComputedStyle(arguments[0]).backgroundColor;", current_el)
             parsed_rgba = parse_color_string_to_rgb_tuple(bg_color_str)
-            if parsed_rgba:
-                if parsed_rgba[3] == 1.0: # Fully opaque
-                    effective_bg_rgb = (parsed_rgba[0], parsed_rgba[1], parsed_rgba[2])
-                    for layer_rgba in reversed(path_colors_with_alpha): effective_bg_rgb = blend_colors(layer_rgba, effective_bg_rgb)
-                    return effective_bg_rgb
-                elif parsed_rgba[3] > 0: path_colors_with_alpha.append(parsed_rgba)
+            if parsed_rgba and parsed_rgba[3] == 1.0: # Fully opaque
+                effective_bg_rgb = (parsed_rgba[0], parsed_rgba[1], parsed_rgba[2])
+                if bg_cache is not None: bg_cache.rgb_by_element[current_el.id] = effective_bg_rgb
+                break
+            path_layers.append((current_el.id, parsed_rgba if parsed_rgba and parsed_rgba[3] > 0 else None))
             if is_root_or_body: break
             parent = driver.execute_script("return arguments[0].parentElement;", current_el)
             if not parent or current_el == parent : break
             current_el = parent
         except (WebDriverException, StaleElementReferenceException): break
-    for layer_rgba in reversed(path_colors_with_alpha): effective_bg_rgb = blend_colors(layer_rgba, effective_bg_rgb)
+    for el_id, layer_rgba in reversed(path_layers):
+        if layer_rgba: effective_bg_rgb = blend_colors(layer_rgba, effective_bg_rgb)
+        if bg_cache is not None: bg_cache.rgb_by_element[el_id] = effective_bg_rgb
     return effective_bg_rgb
 
+DOM_QUIET_SCRIPT = """
+    const quietMs = arguments[0], maxMs = arguments[1], done = arguments[arguments.length - 1];
+    const start = performance.now(); let lastMutation = start, finished = false;
+    const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    const finish = (quiet) => { if (finished) return; finished = true; observer.disconnect(); done({quiet: quiet, waited_ms: performance.now() - start}); };
+    const tick = () => {
+        const now = performance.now();
+        if (now - lastMutation >= quietMs) return finish(true);
+        if (now - start >= maxMs) return finish(false);
+        requestAnimationFrame(tick);
+    };
+    requestAnimationFrame(() => requestAnimationFrame(tick)); // At least two painted frames
+    setTimeout(() => finish(performance.now() - lastMutation >= quietMs), maxMs + 50); // rAF can stall in hidden tabs
+"""
+
+def _drain_network_events(driver, in_flight):
+    # Tracks in-flight request ids from the CDP Network events ChromeDriver buffers in the performance log
+    try: entries = driver.get_log('performance')
+    except WebDriverException: return False
+    for entry in entries:
+        try: msg = json.loads(entry['message'])['message']
+        except (KeyError, ValueError, TypeError): continue
+        method, params = msg.get('method', ''), msg.get('params', {})
+        if method == 'Network.requestWillBeSent':
+            if not params.get('request', {}).get('url', '').startswith('data:'): in_flight.add(params.get('requestId'))
+        elif method in ('Network.loadingFinished', 'Network.loadingFailed'): in_flight.discard(params.get('requestId'))
+    return True
+
+def wait_for_page_settled(driver, max_wait_s=PAGE_SETTLE_MAX_WAIT_S, quiet_ms=PAGE_SETTLE_QUIET_MS):
+    # Returns (settled, waited_s). Settled = network idle (CDP events) + no DOM mutations for quiet_ms
+    # across requestAnimationFrame ticks. Gives up at max_wait_s, e.g. for pages that animate forever.
+    start = time.monotonic(); deadline = start + max_wait_s
+    in_flight = set()
+    network_visible = _drain_network_events(driver, in_flight)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0: return False, time.monotonic() - start
+        if in_flight:
+            time.sleep(min(0.05, remaining)); _drain_network_events(driver, in_flight); continue
+        try: dom_state = driver.execute_async_script(DOM_QUIET_SCRIPT, quiet_ms, int(min(remaining, 20.0) * 1000))
+        except WebDriverException: return False, time.monotonic() - start
+        if network_visible: _drain_network_events(driver, in_flight) # Requests fired while we watched the DOM
+        if dom_state and dom_state.get("quiet") and not in_flight: return True, time.monotonic() - start
+
+# Single in-page pass for the contrast check: candidate selection, computed text styles and a shared
+# table of ancestor backgrounds (each node listed once, pointing at its parent's row) so Python can
+# resolve alpha-blended backgrounds without one WebDriver round-trip per element/ancestor.
+# Rows are [backgroundColor, parentRow, nodeId, isCached]; the walk stops at ancestors whose nodeId
+# Python already resolved for this document (arguments[1] = doc token, arguments[2] = known ids).
+CONTRAST_SCAN_SCRIPT = """
+    const maxElements = arguments[0];
+    const bgState = window.__uigenevalBg || (window.__uigenevalBg = {token: Math.random().toString(36).slice(2), ids: new WeakMap(), next: 0});
+    const knownIds = (arguments[1] === bgState.token) ? new Set(arguments[2] || []) : new Set();
+    const idOf = (n) => { let id = bgState.ids.get(n); if (id === undefined) { id = bgState.next++; bgState.ids.set(n, id); } return id; };
+    const treeWalker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT, {
+        acceptNode: function (node) {
+            if (node.nodeName === 'SCRIPT' || node.nodeName === 'STYLE' || node.nodeName === 'NOSCRIPT' ||
+                node.nodeName === 'IFRAME' || node.nodeName === 'HEAD' || node.nodeName === 'META' ||
+                node.nodeName === 'LINK' || node.nodeName === 'TITLE' || node.closest('svg')) {
+                return NodeFilter.FILTER_REJECT;
+            }
+            let hasDirectText = false;
+            for (let child = node.firstChild; child; child = child.nextSibling) {
+                if (child.nodeType === Node.TEXT_NODE && child.nodeValue.trim().length > 0) {
+                    hasDirectText = true; break;
+                }
+            }
+            let hasPlaceholderText = ( (node.nodeName === 'INPUT' || node.nodeName === 'TEXTAREA') &&
+                                       node.placeholder && node.placeholder.trim().length > 0 );
+            if (!hasDirectText && !hasPlaceholderText) return NodeFilter.FILTER_SKIP;
+
+            const style = window.getComputedStyle(node);
+            if (!style || style.display === 'none' || style.visibility === 'hidden' ||
+                parseFloat(style.opacity) === 0 || parseFloat(style.fontSize) < 8 ||
+                node.offsetWidth === 0 || node.offsetHeight === 0) {
+                return NodeFilter.FILTER_REJECT;
+            }
+            return NodeFilter.FILTER_ACCEPT;
+        }
+    });
+    const candidates = [];
+    while (treeWalker.nextNode() && candidates.length < maxElements) candidates.push(treeWalker.currentNode);
+
+    const nodes = [], nodeIndex = new Map();
+    const backgroundRow = (el) => {
+        const chain = []; let cur = el;
+        while (cur && !nodeIndex.has(cur)) {
+            if (knownIds.has(idOf(cur))) { nodes.push([null, -1, idOf(cur), true]); nodeIndex.set(cur, nodes.length - 1); break; }
+            chain.push(cur);
+            if (cur.nodeName === 'HTML' || cur.nodeName === 'BODY') break;
+            cur = cur.parentElement;
+        }
+        const cachedParent = (cur && nodeIndex.has(cur)) ? nodeIndex.get(cur) : -1;
+        for (let i = chain.length - 1; i >= 0; i--) {
+            const n = chain[i];
+            const isRootOrBody = n.nodeName === 'HTML' || n.nodeName === 'BODY';
+            const parentRow = isRootOrBody ? -1 : (i === chain.length - 1 ? cachedParent : nodeIndex.get(chain[i + 1]));
+            nodes.push([getComputedStyle(n).backgroundColor, parentRow, idOf(n), false]);
+            nodeIndex.set(n, nodes.length - 1);
+        }
+        return nodeIndex.get(el);
+    };
+    const describe = (el) => {
+        let desc = '<' + el.tagName.toLowerCase();
+        if (el.id) desc += " id='" + el.id + "'";
+        const testId = el.getAttribute('data-testid'); if (testId) desc += " data-testid='" + testId + "'";
+        const cls = el.getAttribute('class'); if (cls) desc += " class='" + cls.slice(0, 30) + (cls.length > 30 ? '...' : '') + "'";
+        return desc + '>';
+    };
+
+    const rows = []; let visibleCount = 0;
+    for (const el of candidates) {
+        if (!el.checkVisibility || !el.checkVisibility()) continue;
+        visibleCount++;
+        const text = (el.innerText || '').trim();
+        const placeholder = (el.nodeName === 'INPUT' || el.nodeName === 'TEXTAREA') ? (el.placeholder || '').trim() : '';
+        const effectiveText = (!text && placeholder) ? placeholder : text;
+        if (!effectiveText) continue;
+        const style = window.getComputedStyle(el);
+        if (!style) continue;
+        rows.push([backgroundRow(el), effectiveText, style.color, style.fontSize, style.fontWeight, style.opacity, describe(el)]);
+    }
+    return {candidate_count: candidates.length, visible_count: visibleCount, rows: rows, nodes: nodes,
+            doc_bg: getComputedStyle(document.documentElement).backgroundColor, doc_token: bgState.token};
+"""
+
+# Relation of each element to the previous one for element_order checks, via compareDocumentPosition: O(depth) per pair,
+# no walk over the whole DOM. "before"/"after" for disjoint nodes, "contains"/"inside" when one is nested in the other.
+ELEMENT_ORDER_RELATION_JS = """
+    const orderRelations = (elements) => elements.slice(1).map((el, i) => {
+        const prev = elements[i];
+        if (!prev || !el) return null;
+        if (prev === el) return 'same';
+        const pos = prev.compareDocumentPosition(el);
+        if (pos & Node.DOCUMENT_POSITION_CONTAINED_BY) return 'inside'; // el is nested in the previous element
+        if (pos & Node.DOCUMENT_POSITION_CONTAINS) return 'contains'; // el wraps the previous element
+        return (pos & Node.DOCUMENT_POSITION_FOLLOWING) ? 'after' : 'before';
+    });
+"""
+ELEMENT_ORDER_SCRIPT = ELEMENT_ORDER_RELATION_JS + "return orderRelations(Array.from(arguments));"
+
+# In-page element helpers shared by the adherence probe and the outcome watchers. Lookups follow the WebDriver locator
+# strategies _find_element_by_config uses (optionally below a root element), visibility approximates WebDriver's
+# isDisplayed and attributes follow its getAttribute (property first, boolean attributes as "true"/null).
+ELEMENT_LOOKUP_JS = """
+    const BOOLEAN_ATTRIBUTES = new Set(['allowfullscreen', 'async', 'autofocus', 'autoplay', 'checked', 'compact', 'complete',
+        'controls', 'declare', 'default', 'defaultchecked', 'defaultselected', 'defer', 'disabled', 'ended', 'formnovalidate',
+        'hidden', 'indeterminate', 'iscontenteditable', 'ismap', 'itemscope', 'loop', 'multiple', 'muted', 'nohref', 'nomodule',
+        'noresize', 'noshade', 'novalidate', 'nowrap', 'open', 'paused', 'playsinline', 'pubdate', 'readonly', 'required',
+        'reversed', 'scoped', 'seamless', 'seeking', 'selected', 'truespeed', 'willvalidate']);
+    const PROPERTY_ALIASES = {'class': 'className', 'readonly': 'readOnly'};
+    const find = (probe, root) => {
+        const type = (probe.selector_type || 'css').toLowerCase(), sel = probe.selector;
+        root = root || document;
+        if (sel === null || sel === undefined) throw new Error('No selector');
+        if (type === 'xpath') {
+            const snapshot = document.evaluate(sel, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            const found = [];
+            for (let i = 0; i < snapshot.snapshotLength; i++) if (snapshot.snapshotItem(i).nodeType === 1) found.push(snapshot.snapshotItem(i));
+            return found;
+        }
+        if (type === 'link_text' || type === 'partial_link_text') {
+            return Array.from(root.querySelectorAll('a')).filter(a => {
+                const text = (a.innerText || '').trim();
+                return type === 'link_text' ? text === sel : text.includes(sel);
+            });
+        }
+        const css = type === 'id' ? '[id="' + CSS.escape(sel) + '"]' : type === 'name' ? '[name="' + CSS.escape(sel) + '"]'
+                  : type === 'class_name' ? '.' + CSS.escape(sel) : type === 'data-testid' ? '[data-testid="' + CSS.escape(sel) + '"]' : sel;
+        return Array.from(root.querySelectorAll(css));
+    };
+    const isShown = (el) => {
+        if (el === document.documentElement || el === document.body) return true;
+        if (el.tagName === 'INPUT' && (el.type || '').toLowerCase() === 'hidden') return false;
+        if (el.tagName === 'OPTION' || el.tagName === 'OPTGROUP') { const select = el.closest('select'); if (select) return isShown(select); }
+        if (el.checkVisibility && !el.checkVisibility({opacityProperty: true, visibilityProperty: true})) return false;
+        const style = getComputedStyle(el);
+        if (style.display === 'none' || style.visibility === 'hidden' || style.visibility === 'collapse' || parseFloat(style.opacity) === 0) return false;
+        const hasSize = (node) => Array.from(node.getClientRects()).some(r => r.width > 0 && r.height > 0);
+        return hasSize(el) || Array.from(el.querySelectorAll('*')).some(child => hasSize(child) && getComputedStyle(child).visibility === 'visible');
+    };
+    const attributeOf = (el, name) => {
+        const lower = name.toLowerCase();
+        if (BOOLEAN_ATTRIBUTES.has(lower)) return (el.hasAttribute(name) || el[PROPERTY_ALIASES[lower] || lower] === true) ? 'true' : null;
+        if ((el.tagName === 'A' && lower === 'href') || (el.tagName === 'IMG' && lower === 'src')) return el.getAttribute(name) ? el[lower] : el.getAttribute(name);
+        const property = el[PROPERTY_ALIASES[lower] || name];
+        if (property === undefined || property === null || typeof property === 'object' || typeof property === 'function') return el.getAttribute(name);
+        return String(property);
+    };
+    const describe = (el) => {
+        let desc = '<' + el.tagName.toLowerCase();
+        if (el.id) desc += " id='" + el.id + "'";
+        const testId = el.getAttribute('data-testid'); if (testId) desc += " data-testid='" + testId + "'";
+        const cls = el.getAttribute('class'); if (cls) desc += " class='" + cls.slice(0, 30) + (cls.length > 30 ? '...' : '') + "'";
+        return desc + '>';
+    };
+"""
+
+# Facts for a batch of adherence probes in one round-trip. Each probe is {selector, selector_type, multiple, attribute,
+# css_property, text} or {order: [probe, ...]}. A probe that throws (e.g. an invalid selector) reports its error
+# instead of failing the batch.
+ADHERENCE_PROBE_SCRIPT = ELEMENT_ORDER_RELATION_JS + ELEMENT_LOOKUP_JS + """
+    const probes = arguments[0];
+    const facts = (probe) => {
+        try {
+            const found = find(probe);
+            const el = found[0] || null;
+            const result = {present: !!el, count: found.length, visible: !!el && isShown(el), desc: el ? describe(el) : null};
+            if (el && probe.text) result.text = el.innerText;
+            if (el && probe.attribute) result.attribute = attributeOf(el, probe.attribute);
+            if (el && probe.css_property) result.css = getComputedStyle(el).getPropertyValue(probe.css_property);
+            result.element = el;
+            return result;
+        } catch (e) { return {error: String(e && e.message || e), present: false, count: 0, visible: false, element: null}; }
+    };
+    return probes.map(probe => {
+        if (!probe.order) { const result = facts(probe); delete result.element; return result; }
+        const items = probe.order.map(facts);
+        const relations = orderRelations(items.map(item => item.element));
+        items.forEach(item => delete item.element);
+        return {items: items, relations: relations};
+    });
+"""
+
+# Interaction outcome watchers, installed before a step's action fires. Each watcher reads one observable value
+# (presence/visibility, an attribute, text, a computed style, a child count or the URL) and, where the verifier's rule
+# can be mirrored exactly, carries a predicate. Values are re-read on every DOM mutation, on transition/animation ends
+# and every 50ms (style-only changes such as :hover fire no mutation), recording when a predicate first held and when
+# the value last changed. The first input event after installation marks when the action reached the page.
+OUTCOME_WATCH_INSTALL_SCRIPT = ELEMENT_LOOKUP_JS + """
+    const specs = arguments[0];
+    if (window.__uigenevalOutcomeWatch) window.__uigenevalOutcomeWatch.dispose();
+    const lookup = (spec) => find(spec)[0] || null;
+    const readers = {
+        presence: (spec) => { const el = spec.selector ? lookup(spec) : null; return [!!el, !!el && isShown(el)]; },
+        attribute: (spec) => { const el = lookup(spec); return el ? [true, attributeOf(el, spec.attribute)] : [false, null]; },
+        text: (spec) => { const el = lookup(spec); return el ? el.innerText : null; },
+        css: (spec) => { const el = lookup(spec); return el ? getComputedStyle(el).getPropertyValue(spec.property_name) : null; },
+        count: (spec) => { const parent = lookup(spec); return parent ? find({selector: spec.child_selector, selector_type: spec.child_selector_type}, parent).length : null; },
+        url: () => location.href
+    };
+    const compareCount = (n, p) => {
+        if (p.expected !== null && p.expected !== undefined) {
+            return {equals: n === p.expected, not_equals: n !== p.expected, greater_than: n > p.expected, less_than: n < p.expected,
+                    greater_than_or_equals: n >= p.expected, less_than_or_equals: n <= p.expected}[p.comparison] || false;
+        }
+        if (p.min !== null && p.max !== null) return p.min <= n && n <= p.max;
+        if (p.min !== null) return n >= p.min;
+        if (p.max !== null) return n <= p.max;
+        return false;
+    };
+    const satisfied = (p, value) => {
+        if (p.kind === 'presence') return (p.present === null || value[0] === p.present) && (p.shown === null || (value[0] && value[1]) === p.shown);
+        if (p.kind === 'classes') {
+            if (!value[0]) return false;
+            const classes = (value[1] || '').split(/\s+/).filter(Boolean);
+            return (p.present === null || classes.includes(p.present)) && (p.absent === null || !classes.includes(p.absent));
+        }
+        if (p.kind === 'attribute') {
+            if (!value[0]) return false;
+            const v = value[1];
+            if (p.mode === 'bool') return (v !== null && v !== 'false') === p.expected;
+            if (p.mode === 'null') return v === null;
+            const classes = (v || '').split(/\s+/).filter(Boolean);
+            if (p.mode === 'all') return p.expected.every(c => classes.includes(c));
+            if (p.mode === 'any') return p.expected.some(c => classes.includes(c));
+            return (v === null ? 'None' : String(v)) === p.expected;
+        }
+        if (p.kind === 'count') return value !== null && compareCount(value, p);
+        return false;
+    };
+    const state = {installedAt: performance.now(), actionAt: null, watchers: [], waiters: new Set()};
+    state.evaluate = () => {
+        const now = performance.now();
+        for (const w of state.watchers) {
+            let value;
+            try { value = readers[w.spec.observe](w.spec); } catch (e) { continue; }
+            const key = JSON.stringify(value);
+            if (key !== w.lastKey) { w.lastKey = key; w.changedAt = now; }
+            if (w.spec.predicate) {
+                const met = satisfied(w.spec.predicate, value);
+                if (met && w.metAt === null) w.metAt = now;
+                if (!met) w.metAt = null;
+            }
+        }
+        for (const waiter of Array.from(state.waiters)) waiter();
+    };
+    state.wait = (index, timeoutMs, mode, done) => {
+        const w = state.watchers[index];
+        state.evaluate();
+        const baselineKey = w.lastKey;
+        let finished = false, timer = null;
+        const finish = (met, at) => {
+            if (finished) return; finished = true;
+            state.waiters.delete(waiter); clearTimeout(timer);
+            const since = state.actionAt !== null ? state.actionAt : state.installedAt;
+            done({met: met, reaction_ms: (met && at !== null && at >= since) ? Math.round((at - since) * 10) / 10 : null,
+                  already_met: met && at !== null && at < since, action_seen: state.actionAt !== null});
+        };
+        const waiter = () => {
+            if (mode === 'predicate' ? w.metAt !== null : w.lastKey !== baselineKey) finish(true, mode === 'predicate' ? w.metAt : w.changedAt);
+        };
+        waiter();
+        if (finished) return;
+        state.waiters.add(waiter);
+        timer = setTimeout(() => finish(false, null), timeoutMs);
+    };
+    const ACTION_EVENTS = ['pointerdown', 'mousedown', 'click', 'keydown', 'input', 'change', 'focusin', 'mouseover', 'submit', 'scroll'];
+    const onAction = () => { if (state.actionAt === null) state.actionAt = performance.now(); };
+    const observer = new MutationObserver(state.evaluate);
+    const onSettledEvent = () => state.evaluate();
+    const poll = setInterval(state.evaluate, 50);
+    state.dispose = () => {
+        observer.disconnect(); clearInterval(poll);
+        ACTION_EVENTS.forEach(type => window.removeEventListener(type, onAction, true));
+        ['transitionend', 'animationend', 'hashchange', 'popstate'].forEach(type => window.removeEventListener(type, onSettledEvent, true));
+        if (window.__uigenevalOutcomeWatch === state) delete window.__uigenevalOutcomeWatch;
+    };
+    specs.forEach(spec => { if (spec) state.watchers.push({spec: spec, lastKey: undefined, changedAt: null, metAt: null}); });
+    state.evaluate(); // Baseline before the action
+    state.watchers.forEach(w => { w.changedAt = null; });
+    observer.observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+    ACTION_EVENTS.forEach(type => window.addEventListener(type, onAction, true));
+    ['transitionend', 'animationend', 'hashchange', 'popstate'].forEach(type => window.addEventListener(type, onSettledEvent, true));
+    window.__uigenevalOutcomeWatch = state;
+    let next = 0;
+    return specs.map(spec => spec ? next++ : null);
+"""
+
+# Resolves when watcher arguments[0] is satisfied ("predicate") or its value changes ("change"), or after arguments[1] ms.
+# {lost: true} means the watchers are gone, e.g. the action navigated to a new document.
+OUTCOME_WATCH_WAIT_SCRIPT = """
+    const done = arguments[arguments.length - 1];
+    const state = window.__uigenevalOutcomeWatch;
+    if (!state || !state.watchers[arguments[0]]) { done({lost: true}); return; }
+    state.wait(arguments[0], arguments[1], arguments[2], done);
+"""
+
+# Canonical digest of a subtree (attributes sorted, so a reverted attribute that moved position still matches)
+DOM_DIGEST_JS = """
+    function domDigest(root) {
+        let h = 0x811c9dc5;
+        const feed = (s) => { for (let i = 0; i < s.length; i++) { h ^= s.charCodeAt(i); h = Math.imul(h, 0x01000193); } };
+        const visit = (node) => {
+            if (node.nodeType === 3 || node.nodeType === 8) { feed((node.nodeType === 3 ? '#' : '!') + node.data); return; }
+            if (node.nodeType !== 1) return;
+            feed('<' + node.nodeName);
+            for (const attr of Array.from(node.attributes, (a) => a.name + '=' + a.value).sort()) feed(' ' + attr);
+            feed('>');
+            for (let child = node.firstChild; child; child = child.nextSibling) visit(child);
+            feed('</>');
+        };
+        visit(root);
+        return (h >>> 0).toString(16);
+    }
+"""
+
+# Page state snapshot taken before interactions run (arguments[0] = mutation cap). The DOM is not copied: a
+# MutationObserver logs every change from here on, and restoring reverts that log, so the page keeps its original
+# nodes and the listeners bound to them. Form values, scroll offsets, focus, open dialogs, URL, local/sessionStorage
+# and the page's plain globals (primitives, JSON-able objects) are recorded alongside.
+PAGE_STATE_CAPTURE_SCRIPT = DOM_DIGEST_JS + """
+    const maxMutations = arguments[0];
+    const previous = window.__uigenevalPageState;
+    if (previous) previous.observer.disconnect();
+    const isPlain = (value) => Array.isArray(value) || Object.getPrototypeOf(value) === Object.prototype;
+    const copyStorage = (name) => { try { return Object.assign({}, window[name]); } catch (e) { return null; } };
+    const globals = {};
+    for (const key of Object.keys(window)) {
+        if (key.startsWith('__uigeneval')) continue;
+        let value;
+        try { value = window[key]; } catch (e) { continue; }
+        if (value === null || ['string', 'number', 'boolean', 'undefined'].includes(typeof value)) globals[key] = {value: value};
+        else if (typeof value === 'object' && isPlain(value)) {
+            try { const json = JSON.stringify(value); if (json !== undefined && json.length <= 100000) globals[key] = {json: json}; } catch (e) {}
+        }
+    }
+    const state = {
+        log: [], overflow: false, globals: globals, keys: new Set(Object.keys(window)),
+        forms: Array.from(document.querySelectorAll('input, textarea, select'), (el) =>
+            [el, el.value, el.checked, el.tagName === 'SELECT' ? Array.from(el.options, (o) => o.selected) : null]),
+        scroll: [window.scrollX, window.scrollY],
+        scrolled: Array.from(document.querySelectorAll('*')).filter((el) => el.scrollTop || el.scrollLeft).map((el) => [el, el.scrollTop, el.scrollLeft]),
+        focused: document.activeElement, openDialogs: new Set(document.querySelectorAll('dialog[open]')),
+        href: location.href, historyState: history.state,
+        local: copyStorage('localStorage'), session: copyStorage('sessionStorage'),
+        digest: domDigest(document.documentElement),
+    };
+    state.observer = new MutationObserver((records) => {
+        if (state.overflow) return;
+        if (state.log.length + records.length > maxMutations) { state.overflow = true; state.log = []; }
+        else state.log.push(...records);
+    });
+    state.observer.observe(document, {subtree: true, childList: true, attributes: true, attributeOldValue: true, characterData: true, characterDataOldValue: true});
+    window.__uigenevalPageState = state;
+    return {digest: state.digest, globals: Object.keys(globals).length, form_fields: state.forms.length};
+"""
+
+# Puts the page back to its snapshot. Returns {restored: true, mutations} or {restored: false, reason}; the caller then
+# reloads. Storage is restored either way since it outlives a reload. Script state the snapshot cannot see (closures,
+# top-level let/const, module scope) is not restored.
+PAGE_STATE_RESTORE_SCRIPT = DOM_DIGEST_JS + """
+    const maxMutations = arguments[0];
+    const state = window.__uigenevalPageState;
+    if (!state) return {restored: false, reason: 'no snapshot in this document'};
+    const restoreStorage = (name, saved) => {
+        if (!saved) return;
+        try { const storage = window[name]; storage.clear(); for (const [k, v] of Object.entries(saved)) storage.setItem(k, v); } catch (e) {}
+    };
+    restoreStorage('localStorage', state.local); restoreStorage('sessionStorage', state.session);
+    if (document.activeElement !== state.focused && document.activeElement && document.activeElement.blur) document.activeElement.blur();
+    const records = state.log.concat(state.observer.takeRecords()); state.log = [];
+    if (state.overflow) return {restored: false, reason: 'more than ' + maxMutations + ' DOM mutations since the snapshot'};
+
+    const changed = Object.keys(window).filter((key) => !state.keys.has(key) && !key.startsWith('__uigeneval'));
+    for (const [key, saved] of Object.entries(state.globals)) {
+        let value;
+        try { value = window[key]; } catch (e) { changed.push(key); continue; }
+        if ('json' in saved) {
+            let json;
+            try { json = JSON.stringify(value); } catch (e) {}
+            if (json !== saved.json) changed.push(key);
+        } else if (!Object.is(value, saved.value)) {
+            try { window[key] = saved.value; } catch (e) {}
+            if (!Object.is(window[key], saved.value)) changed.push(key);
+        }
+    }
+    if (changed.length) return {restored: false, reason: 'page script state changed: ' + changed.slice(0, 5).join(', ')};
+
+    // Modal dialogs must leave the top layer through close(); the 'open' removals it logs are reverted below anyway
+    for (const dialog of document.querySelectorAll('dialog[open]')) if (!state.openDialogs.has(dialog)) { try { dialog.close(); } catch (e) {} }
+    state.observer.takeRecords();
+    try {
+        for (let i = records.length - 1; i >= 0; i--) {
+            const r = records[i];
+            if (r.type === 'attributes') {
+                if (r.oldValue === null) r.target.removeAttributeNS(r.attributeNamespace, r.attributeName);
+                else r.target.setAttributeNS(r.attributeNamespace, r.attributeName, r.oldValue);
+            } else if (r.type === 'characterData') r.target.data = r.oldValue;
+            else {
+                for (const node of Array.from(r.addedNodes).reverse()) if (node.parentNode === r.target) r.target.removeChild(node);
+                const before = r.nextSibling && r.nextSibling.parentNode === r.target ? r.nextSibling : null;
+                for (const node of Array.from(r.removedNodes)) r.target.insertBefore(node, before);
+            }
+        }
+    } catch (e) { return {restored: false, reason: 'reverting DOM mutations failed: ' + e.message}; }
+
+    for (const [el, value, checked, selected] of state.forms) {
+        try { if (el.type === 'file') { if (el.value) el.value = ''; } else if (el.value !== value) el.value = value; } catch (e) {}
+        if (el.checked !== checked) el.checked = checked;
+        if (selected) Array.from(el.options).forEach((option, i) => { if (i < selected.length) option.selected = selected[i]; });
+    }
+    const savedScroll = new Map(state.scrolled.map(([el, top, left]) => [el, [top, left]]));
+    for (const el of document.querySelectorAll('*')) {
+        const [top, left] = savedScroll.get(el) || [0, 0];
+        if (el.scrollTop !== top) el.scrollTop = top;
+        if (el.scrollLeft !== left) el.scrollLeft = left;
+    }
+    window.scrollTo(state.scroll[0], state.scroll[1]);
+    if (location.href !== state.href) {
+        try { history.replaceState(state.historyState, '', state.href); }
+        catch (e) { return {restored: false, reason: 'URL could not be restored'}; }
+    }
+    if (state.focused && state.focused !== document.activeElement && state.focused.focus) state.focused.focus({preventScroll: true});
+
+    const digest = domDigest(document.documentElement);
+    state.observer.takeRecords(); // Our own changes
+    if (digest !== state.digest) return {restored: false, reason: 'DOM differs from the snapshot after reverting'};
+    return {restored: true, mutations: records.length};
+"""
+
+def resolve_node_backgrounds(node_table, doc_bg_color_str, cached_rgb_by_node=None):
+    # node_table rows are [backgroundColor, parent_row or -1, node_id, is_cached]; returns the effective
+    # opaque background per row with the same blending rules as get_effective_background_rgb, resolving
+    # every row once. Cached rows take their value from cached_rgb_by_node instead.
+    doc_bg_rgba = parse_color_string_to_rgb_tuple(doc_bg_color_str)
+    base_rgb = (doc_bg_rgba[0], doc_bg_rgba[1], doc_bg_rgba[2]) if doc_bg_rgba and doc_bg_rgba[3] == 1.0 else (255, 255, 255)
+    resolved = [None] * len(node_table)
+    for row, node_row in enumerate(node_table):
+        if len(node_row) > 3 and node_row[3]: resolved[row] = (cached_rgb_by_node or {}).get(node_row[2], base_rgb)
+    for row in range(len(node_table)):
+        pending, cur, below_rgb = [], row, base_rgb
+        while cur != -1 and resolved[cur] is None:
+            parsed_rgba = parse_color_string_to_rgb_tuple(node_table[cur][0])
+            if parsed_rgba and parsed_rgba[3] == 1.0: resolved[cur] = parsed_rgba[:3]; break
+            pending.append((cur, parsed_rgba if parsed_rgba and parsed_rgba[3] > 0 else None))
+            cur = node_table[cur][1]
+        if cur != -1: below_rgb = resolved[cur]
+        for pending_row, layer_rgba in reversed(pending):
+            below_rgb = blend_colors(layer_rgba, below_rgb) if layer_rgba else below_rgb
+            resolved[pending_row] = below_rgb
+    return resolved
+
 def get_element_desc(element):
     try:
         tag = element.tag_name; el_id = element.get_attribute('id'); el_class = element.get_attribute('class')
@@ -146,6 +747,610 @@ def get_element_desc(element):
 def string_similarity(a, b):
     return SequenceMatcher(None, str(a), str(b)).ratio()
 
+def build_chrome_options():
+    options = ChromeOptions()
+    options.add_argument('--headless=new')
+    options.add_argument('--disable-gpu'); options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage'); options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    options.add_argument('--log-level=3'); options.set_capability("goog:loggingPrefs", {"browser": "ALL", "performance": "ALL"})
+    return options
+
+def _binary_version(binary_path):
+    try:
+        out = subprocess.run([binary_path, "--version"], capture_output=True, text=True, timeout=15)
+        return out.stdout.strip() if out.returncode == 0 and out.stdout.strip() else None
+    except (OSError, subprocess.SubprocessError): return None
+
+def resolve_chrome_environment():
+    # Resolves ChromeDriver and Chrome once per run. Values already resolved by a parent process
+    # (CHROMEDRIVER_PATH / CHROME_BINARY env vars) are only re-validated, never looked up again.
+    chrome_env = {"chromedriver_path": None, "chromedriver_version": None, "chrome_binary": None, "chrome_version": None}
+
+    driver_candidates = []
+    if os.environ.get("CHROMEDRIVER_PATH"): driver_candidates.append(("CHROMEDRIVER_PATH", lambda: os.environ["CHROMEDRIVER_PATH"]))
+    else:
+        driver_candidates.append(("webdriver-manager", lambda: ChromeDriverManager().install()))
+        driver_candidates.append(("system PATH", lambda: shutil.which("chromedriver")))
+    for source, locate in driver_candidates:
+        try: candidate = locate()
+        except Exception as e: print(f"ChromeDriver lookup via {source} failed: {str(e)[:200]}"); continue
+        version = _binary_version(candidate) if candidate and os.access(candidate, os.X_OK) else None
+        if version:
+            chrome_env["chromedriver_path"], chrome_env["chromedriver_version"] = str(candidate), version
+            break
+        print(f"ChromeDriver from {source} is not usable: {candidate}")
+    if not chrome_env["chromedriver_path"]:
+        raise RuntimeError("No usable ChromeDriver found (checked CHROMEDRIVER_PATH / webdriver-manager / system PATH).")
+
+    chrome_candidates = [os.environ["CHROME_BINARY"]] if os.environ.get("CHROME_BINARY") else \
+        [shutil.which(name) for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")] + \
+        ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"]
+    for candidate in filter(None, chrome_candidates):
+        version = _binary_version(candidate) if os.access(candidate, os.X_OK) else None
+        if version:
+            chrome_env["chrome_binary"], chrome_env["chrome_version"] = candidate, version
+            break
+    if os.environ.get("CHROME_BINARY") and not chrome_env["chrome_binary"]:
+        raise RuntimeError(f"CHROME_BINARY is set but not usable: {os.environ['CHROME_BINARY']}")
+    return chrome_env
+
+def export_chrome_environment(chrome_env, env):
+    # Hands a resolved environment down to child processes so they skip the lookup
+    env["CHROMEDRIVER_PATH"] = chrome_env["chromedriver_path"]
+    if chrome_env.get("chrome_binary"): env["CHROME_BINARY"] = chrome_env["chrome_binary"]
+    return env
+
+def create_chrome_driver(owner_label, chrome_env=None):
+    options = build_chrome_options()
+    try:
+        if chrome_env:
+            service = ChromeService(executable_path=chrome_env["chromedriver_path"])
+            if chrome_env.get("chrome_binary"): options.binary_location = chrome_env["chrome_binary"]
+        else:
+            try: driver_path = ChromeDriverManager().install(); service = ChromeService(executable_path=driver_path)
+            except Exception: print(f"WebDriverManager failed for {owner_label}, trying system ChromeDriver."); service = ChromeService()
+        return webdriver.Chrome(service=service, options=options)
+    except WebDriverException as e:
+        raise WebDriverException(f"Fatal WebDriver Error for {owner_label}: {e}")
+
+
+@lru_cache(maxsize=256)
+def _gzip_file_bytes(path, mtime_ns, size): # mtime/size only key the cache so edited files are recompressed
+    with open(path, "rb") as f: return gzip.compress(f.read(), compresslevel=6)
+
+
+class StaticSiteRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 keep-alive: every response sent from send_head carries a Content-Length (or is a body-less 304)
+    protocol_version = "HTTP/1.1"
+    GZIP_CONTENT_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+
+    def log_message(self, format, *args): pass # Per-request logging would drown the worker output
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try: return int(mtime) <= email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError): return False
+        return False
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path): return super().send_head() # Redirects / index.html / listings unchanged
+        try: st = os.stat(path)
+        except OSError: self.send_error(404, "File not found"); return None
+        ctype = self.guess_type(path)
+        use_gzip = ("gzip" in self.headers.get("Accept-Encoding", "") and st.st_size >= STATIC_GZIP_MIN_BYTES
+                    and ctype.startswith(self.GZIP_CONTENT_TYPES))
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-gz" if use_gzip else ""}"'
+        if self._not_modified(etag, st.st_mtime):
+            self.send_response(304); self.send_header("ETag", etag); self.send_header("Last-Modified", self.date_time_string(int(st.st_mtime)))
+            self.end_headers(); return None
+        try:
+            if use_gzip: body = io.BytesIO(_gzip_file_bytes(path, st.st_mtime_ns, st.st_size)); length = len(body.getvalue())
+            else: body = open(path, "rb"); length = st.st_size
+        except OSError: self.send_error(404, "File not found"); return None
+        self.send_response(200)
+        self.send_header("Content-Type", ctype); self.send_header("Content-Length", str(length))
+        if use_gzip: self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding"); self.send_header("Cache-Control", "no-cache") # Revalidate via ETag
+        self.send_header("ETag", etag); self.send_header("Last-Modified", self.date_time_string(int(st.st_mtime)))
+        self.end_headers()
+        return body
+
+
+class StaticSiteServer:
+    # Threaded server rooted at root_dir; pages are addressed as <base_url>/<path relative to root_dir>
+    def __init__(self, root_dir, host="localhost"):
+        self.root_dir = Path(root_dir).resolve()
+        self.host = host
+        self.httpd = self.thread = self.base_url = None
+
+    def start(self):
+        handler = partial(StaticSiteRequestHandler, directory=str(self.root_dir))
+        self.httpd = http.server.ThreadingHTTPServer((self.host, 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name="static-site-server"); self.thread.start()
+        self.base_url = f"http://{self.host}:{self.httpd.server_address[1]}"
+        return self.base_url
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown(); self.httpd.server_close()
+            if self.thread and self.thread.is_alive(): self.thread.join(timeout=2)
+            self.httpd = self.thread = None
+
+    def export(self, env):
+        env[STATIC_SITE_ROOT_ENV] = str(self.root_dir); env[STATIC_SITE_BASE_URL_ENV] = self.base_url
+        return env
+
+def static_site_from_env(env=None):
+    # (root_dir, base_url) of a server started by a parent process, or None
+    env = os.environ if env is None else env
+    root, base_url = env.get(STATIC_SITE_ROOT_ENV), env.get(STATIC_SITE_BASE_URL_ENV)
+    return (root, base_url) if root and base_url else None
+
+def static_url_for(file_path, static_site):
+    if not static_site: return None
+    root, base_url = static_site
+    try: rel_path = Path(file_path).resolve().relative_to(Path(root).resolve())
+    except ValueError: return None # Not under the served tree
+    return f"{base_url.rstrip('/')}/{quote(rel_path.as_posix())}"
+
+
+def process_tree_pids(root_pid):
+    # root_pid and all its descendants (chromedriver -> chrome -> renderers), read from /proc in one pass
+    children_of = collections.defaultdict(list)
+    for stat_path in Path("/proc").glob("[0-9]*/stat"):
+        try: children_of[int(stat_path.read_text().rsplit(")", 1)[1].split()[1])].append(int(stat_path.parent.name))
+        except (OSError, IndexError, ValueError): continue
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop(); pids.append(pid); stack.extend(children_of.get(pid, []))
+    return pids
+
+def process_tree_rss_bytes(root_pid):
+    # Resident memory of a whole browser (all Chrome processes under chromedriver); None without /proc
+    total, seen = 0, False
+    for pid in process_tree_pids(root_pid):
+        try:
+            with open(f"/proc/{pid}/status", encoding="ascii", errors="replace") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"): total += int(line.split()[1]) * 1024; seen = True; break
+        except (OSError, ValueError, IndexError): continue
+    return total if seen else None
+
+def python_peak_rss_bytes():
+    # Lifetime peak of this (worker) process; ru_maxrss is KiB on Linux, bytes on macOS
+    if not resource: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def kill_process_tree(root_pid):
+    # SIGKILL root_pid and all its descendants. The tree is read from /proc before anything is killed so children
+    # are not lost to re-parenting; elsewhere only root_pid is killed.
+    for pid in process_tree_pids(root_pid):
+        try: os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError): pass
+
+
+class PromptWatchdog:
+    # Enforces the phase budgets of one prompt from a background thread. When the current phase (or the whole prompt)
+    # overruns, the browser's process tree is killed: whatever WebDriver call the analysis thread is blocked in then
+    # fails fast, and the caller reports the prompt as TIMEOUT instead of stalling the worker.
+    def __init__(self, label, phase_budgets_s=None, total_budget_s=PROMPT_TIMEOUT_S):
+        self.label = label
+        self.phase_budgets_s = phase_budgets_s or PROMPT_PHASE_TIMEOUTS_S
+        self.total_deadline = time.monotonic() + total_budget_s
+        self.driver = None
+        self.helper_drivers = [] # Browsers running isolated interaction checks for this prompt
+        self.phase = self.phase_deadline = self._phase_start = None
+        self.expired_phase = None # Set once the watchdog has fired: a phase name, or "total"
+        self.phase_durations_s = {}
+        self.peak_browser_rss_bytes = None # Sampled every few seconds while a phase is running
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"watchdog-{label}")
+
+    def __enter__(self):
+        self._thread.start(); return self
+
+    def __exit__(self, *exc_info):
+        self.enter(None); self._stop.set(); self._thread.join(timeout=2)
+        if not self.expired_phase: self.sample_browser_rss() # At least one sample for prompts shorter than the interval
+        return False
+
+    def _service_pids(self):
+        processes = [getattr(getattr(driver, "service", None), "process", None) for driver in [self.driver, *self.helper_drivers]]
+        return [process.pid for process in processes if process]
+
+    def sample_browser_rss(self):
+        samples = [rss for rss in map(process_tree_rss_bytes, self._service_pids()) if rss is not None]
+        if samples: self.peak_browser_rss_bytes = max(self.peak_browser_rss_bytes or 0, sum(samples))
+
+    def watch(self, driver):
+        self.driver = driver
+
+    def watch_helpers(self, drivers):
+        self.helper_drivers.extend(d for d in drivers if d not in self.helper_drivers)
+
+    def enter(self, phase):
+        now = time.monotonic()
+        with self._lock:
+            if self.phase:
+                self.phase_durations_s[self.phase] = round(self.phase_durations_s.get(self.phase, 0.0) + now - self._phase_start, 2)
+            self.phase, self._phase_start = phase, now
+            self.phase_deadline = now + self.phase_budgets_s.get(phase, PROMPT_TIMEOUT_S) if phase else None
+
+    def remaining_s(self):
+        # Time left before the watchdog fires in the current phase
+        now = time.monotonic()
+        with self._lock: deadline = min(self.phase_deadline or self.total_deadline, self.total_deadline)
+        return max(0.0, deadline - now)
+
+    def _run(self):
+        ticks = 0
+        while not self._stop.wait(0.5):
+            ticks += 1
+            if ticks % 4 == 0 and self.phase: self.sample_browser_rss() # Outside the lock: walking /proc takes a moment
+            now = time.monotonic()
+            with self._lock:
+                phase = self.phase
+                if not phase: continue
+                expired = phase if now > self.phase_deadline else "total" if now > self.total_deadline else None
+            if expired:
+                self.expired_phase = expired
+                print(f"  WATCHDOG ({self.label}): '{expired}' budget exceeded during phase '{phase}'. Killing browser.")
+                for pid in self._service_pids(): kill_process_tree(pid)
+                return
+
+
+def prompt_phase_budgets(prompt_config_obj):
+    return {**PROMPT_PHASE_TIMEOUTS_S, **prompt_config_obj.get("phase_timeouts_s", {})}
+
+
+class WarmBrowserPool:
+    # Holds one long-lived WebDriver for a prompt worker process. acquire() hands out a browser whose
+    # tabs, cookies, storage and logs were reset since the previous prompt; the browser is relaunched
+    # after `recycle_after` prompts, or when it stopped responding / a prompt reported it crashed.
+    def __init__(self, recycle_after=BROWSER_RECYCLE_AFTER_PROMPTS, chrome_env=None):
+        self.recycle_after = max(1, int(recycle_after))
+        self.chrome_env = chrome_env
+        self.driver = None
+        self.helper_drivers = [] # Launched on first use by acquire_helpers(); quit by release_helpers() when the prompt ends
+        self.prompts_served = 0
+        self.launch_count = 0
+
+    def _launch(self):
+        self.driver = create_chrome_driver(f"worker {os.getpid()}", self.chrome_env)
+        self.prompts_served = 0
+        self.launch_count += 1
+        print(f"[Worker PID: {os.getpid()}] Warm Chrome launched (launch #{self.launch_count}).")
+
+    def _is_alive(self):
+        try: return self.driver.execute_script("return 1;") == 1
+        except Exception: return False
+
+    def _reset_state(self, d=None):
+        d = d or self.driver
+        # Wipe storage of the origin the previous prompt left open before its tab goes away
+        try:
+            origin = d.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {} return window.location.origin;")
+            if origin and origin != "null":
+                d.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        except WebDriverException: pass
+        d.switch_to.new_window('tab'); fresh_handle = d.current_window_handle
+        for handle in d.window_handles:
+            if handle != fresh_handle: d.switch_to.window(handle); d.close()
+        d.switch_to.window(fresh_handle)
+        d.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        d.execute_cdp_cmd("Network.clearBrowserCache", {})
+        d.set_script_timeout(WEBDRIVER_SCRIPT_TIMEOUT_S) # In case a prompt died mid-wait with it raised
+        for log_type in ("browser", "performance"): # Drain buffered logs so JS Health only sees this prompt
+            try: d.get_log(log_type)
+            except WebDriverException: pass
+
+    def acquire(self):
+        if self.driver and (self.prompts_served >= self.recycle_after or not self._is_alive()):
+            print(f"[Worker PID: {os.getpid()}] Recycling Chrome after {self.prompts_served} prompt(s).")
+            self.discard()
+        if self.driver:
+            try: self._reset_state()
+            except WebDriverException as e:
+                print(f"[Worker PID: {os.getpid()}] Browser reset failed ({str(e)[:100]}), relaunching.")
+                self.discard()
+        if not self.driver: self._launch()
+        self.prompts_served += 1
+        return self.driver
+
+    def acquire_helpers(self, count):
+        # Extra browsers for isolated interaction checks, reset like the main one; fewer than asked if launches fail
+        helpers = []
+        for i in range(count):
+            driver = self.helper_drivers[i] if i < len(self.helper_drivers) else None
+            if driver:
+                try: self._reset_state(driver)
+                except WebDriverException:
+                    try: driver.quit()
+                    except Exception: pass
+                    driver = None
+            if not driver:
+                try: driver = create_chrome_driver(f"worker {os.getpid()} helper {i+1}", self.chrome_env)
+                except WebDriverException as e: print(f"[Worker PID: {os.getpid()}] Could not launch helper Chrome: {str(e)[:100]}"); break
+                if i < len(self.helper_drivers): self.helper_drivers[i] = driver
+                else: self.helper_drivers.append(driver)
+            helpers.append(driver)
+        return helpers
+
+    def release_helpers(self):
+        # Helpers are only worth their memory while a prompt with parallel interactions runs
+        for driver in self.helper_drivers:
+            try: driver.quit()
+            except Exception: pass
+        self.helper_drivers = []
+
+    def discard(self):
+        self.release_helpers()
+        if self.driver:
+            try: self.driver.quit()
+            except Exception: pass
+        self.driver = None
+
+    close = discard
+
+
+# Per-process browser pool and Lighthouse service proxy, set by init_prompt_worker() in each ProcessPoolExecutor worker
+_WORKER_BROWSER_POOL = None
+_WORKER_LIGHTHOUSE_BACKEND = None
+_WORKER_LIGHTHOUSE_CACHE = None
+_WORKER_STATIC_SITE = None
+_WORKER_EVENT_QUEUE = None
+
+def init_prompt_worker(recycle_after=BROWSER_RECYCLE_AFTER_PROMPTS, chrome_env=None, lighthouse_backend=None, lighthouse_cache=None, static_site=None, event_queue=None):
+    global _WORKER_BROWSER_POOL, _WORKER_LIGHTHOUSE_BACKEND, _WORKER_LIGHTHOUSE_CACHE, _WORKER_STATIC_SITE, _WORKER_EVENT_QUEUE
+    _WORKER_LIGHTHOUSE_BACKEND = lighthouse_backend
+    _WORKER_LIGHTHOUSE_CACHE = lighthouse_cache
+    _WORKER_STATIC_SITE = static_site
+    _WORKER_EVENT_QUEUE = event_queue
+    _WORKER_BROWSER_POOL = WarmBrowserPool(recycle_after, chrome_env)
+    # Worker processes skip atexit handlers; a multiprocessing finalizer makes sure Chrome is quit on shutdown
+    multiprocessing.util.Finalize(_WORKER_BROWSER_POOL, _WORKER_BROWSER_POOL.close, exitpriority=10)
+    try: _WORKER_BROWSER_POOL.acquire(); _WORKER_BROWSER_POOL.prompts_served = 0 # Warm start, not a served prompt
+    except WebDriverException as e: print(f"[Worker PID: {os.getpid()}] Could not pre-launch Chrome: {e}")
+
+
+def build_lighthouse_command(lighthouse_path, url, output_base, preset=None, port=None):
+    cmd = [lighthouse_path, url, "--output=json", "--output=html",
+           f"--output-path={output_base}", "--quiet", f"--throttling-method={LIGHTHOUSE_THROTTLING_METHOD}",
+           "--only-categories=" + ",".join(LIGHTHOUSE_CATEGORIES)]
+    if port: cmd.append(f"--port={port}") # Attach to an already running Chrome
+    else: cmd.append("--chrome-flags=--headless=new --disable-gpu --no-sandbox --no-zygote")
+    if preset: cmd.append(f"--preset={preset}")
+    return cmd
+
+def run_lighthouse_cli(lighthouse_path, url, output_base, preset=None, timeout_s=LIGHTHOUSE_TIMEOUT_S, port=None):
+    cmd = build_lighthouse_command(lighthouse_path, url, output_base, preset, port)
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_s, check=False)
+        return {"returncode": process.returncode, "stderr": process.stderr[-2000:], "cmd": cmd, "timed_out": False}
+    except subprocess.TimeoutExpired:
+        return {"returncode": None, "stderr": "", "cmd": cmd, "timed_out": True}
+
+
+@lru_cache(maxsize=None)
+def get_lighthouse_version(lighthouse_path):
+    return _binary_version(lighthouse_path) or "unknown"
+
+LOCAL_ASSET_REF_RE = re.compile(r"""(?:src|href)\s*=\s*["']([^"'#?]+)""", re.IGNORECASE)
+
+def local_asset_paths(html_path):
+    # Files the page references by relative path (scripts, stylesheets, images next to the HTML)
+    html_path = Path(html_path)
+    try: html_text = html_path.read_text(encoding="utf-8", errors="replace")
+    except OSError: return []
+    assets = set()
+    for ref in LOCAL_ASSET_REF_RE.findall(html_text):
+        ref = unquote(ref.strip())
+        if not ref or re.match(r"^[a-z][a-z0-9+.-]*:|^//", ref, re.IGNORECASE): continue # Absolute URLs, data:, mailto: ...
+        candidate = (html_path.parent / ref.lstrip("/")).resolve()
+        if candidate.is_file() and candidate != html_path.resolve(): assets.add(candidate)
+    return sorted(assets)
+
+def update_digest_with_page(digest, html_path):
+    # Page bytes plus each local asset under its path relative to the page, so moving or renaming an asset
+    # between directories (same file name) changes the digest. Shared by the Lighthouse cache and prompt fingerprints.
+    html_path = Path(html_path)
+    digest.update(html_path.read_bytes())
+    page_dir = html_path.resolve().parent
+    for asset in local_asset_paths(html_path):
+        digest.update(Path(os.path.relpath(asset, page_dir)).as_posix().encode("utf-8")); digest.update(asset.read_bytes())
+    return digest
+
+
+class LighthouseResultCache:
+    # Stores <key>.report.json/.report.html under cache_dir/<key[:2]>/. Hits refresh the entry's mtime,
+    # and put() evicts least-recently-used entries once the cache grows past max_bytes. Safe to share
+    # between worker processes: entries are written to a temp file and renamed into place.
+    def __init__(self, cache_dir=LIGHTHOUSE_CACHE_DIR, max_mb=LIGHTHOUSE_CACHE_MAX_MB):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb) * 1024 * 1024
+
+    def key_for(self, html_path, lighthouse_path, preset):
+        digest = update_digest_with_page(hashlib.sha256(), html_path)
+        settings = {"lighthouse_version": get_lighthouse_version(lighthouse_path), "preset": preset or "mobile",
+                    "throttling_method": LIGHTHOUSE_THROTTLING_METHOD, "categories": sorted(LIGHTHOUSE_CATEGORIES)}
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry_paths(self, key):
+        entry_dir = self.cache_dir / key[:2]
+        return entry_dir / f"{key}.report.json", entry_dir / f"{key}.report.html"
+
+    def get(self, key, output_base):
+        cached_json, cached_html = self._entry_paths(key)
+        try:
+            shutil.copyfile(cached_json, f"{output_base}.report.json")
+            if cached_html.exists(): shutil.copyfile(cached_html, f"{output_base}.report.html")
+            os.utime(cached_json) # Mark as recently used
+            return True
+        except OSError: return False # Missing or evicted concurrently: treat as a miss
+
+    def put(self, key, output_base):
+        cached_json, cached_html = self._entry_paths(key)
+        cached_json.parent.mkdir(parents=True, exist_ok=True)
+        for src, dest in ((Path(f"{output_base}.report.html"), cached_html), (Path(f"{output_base}.report.json"), cached_json)):
+            if not src.exists(): continue
+            tmp_dest = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+            shutil.copyfile(src, tmp_dest); os.replace(tmp_dest, dest)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for report_json in self.cache_dir.glob("*/*.report.json"):
+            try:
+                report_html = report_json.with_name(report_json.name.replace(".report.json", ".report.html"))
+                size = report_json.stat().st_size + (report_html.stat().st_size if report_html.exists() else 0)
+                entries.append((report_json.stat().st_mtime, size, report_json, report_html))
+            except OSError: continue
+        total = sum(e[1] for e in entries)
+        for _, size, report_json, report_html in sorted(entries):
+            if total <= self.max_bytes: break
+            for path in (report_json, report_html):
+                try: path.unlink()
+                except OSError: pass
+            total -= size
+
+
+class LighthouseService:
+    # Lives in its own manager process; prompt workers call it through a proxy. Each slot owns one
+    # pre-launched headless Chrome, and a job holds a slot for its whole run, so at most `size` Lighthouse
+    # audits execute at once across all workers no matter how many prompt workers are running. Workers lease a slot
+    # with acquire() (bounded wait), audit with run_leased() and give it back with release(); run() does all three.
+    def __init__(self, lighthouse_path, chrome_binary=None, size=1, recycle_after=LIGHTHOUSE_CHROME_RECYCLE_AFTER):
+        self.lighthouse_path = lighthouse_path
+        self.chrome_binary = chrome_binary
+        self.recycle_after = max(1, int(recycle_after))
+        self._slots = [{"id": i, "proc": None, "port": None, "profile_dir": None, "jobs": 0, "lease": None, "leased_until": None} for i in range(max(1, int(size)))]
+        self._lease_lock = threading.Lock() # The manager serves each proxy connection on its own thread
+        self._lease_counter = itertools.count(1)
+        self._free_slots = queue.Queue()
+        for slot in self._slots: self._free_slots.put(slot)
+        multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def _stop_chrome(self, slot):
+        if slot["proc"] and slot["proc"].poll() is None:
+            slot["proc"].kill()
+            try: slot["proc"].wait(timeout=10)
+            except subprocess.TimeoutExpired: pass
+        if slot["profile_dir"]: shutil.rmtree(slot["profile_dir"], ignore_errors=True)
+        slot.update(proc=None, port=None, profile_dir=None, jobs=0)
+
+    def _ensure_chrome(self, slot):
+        if slot["proc"] and slot["proc"].poll() is None and slot["jobs"] < self.recycle_after: return slot["port"]
+        self._stop_chrome(slot)
+        profile_dir = tempfile.mkdtemp(prefix="uigeneval_lh_chrome_")
+        proc = subprocess.Popen([self.chrome_binary, "--headless=new", "--disable-gpu", "--no-sandbox", "--no-zygote",
+                                 "--no-first-run", "--remote-debugging-port=0", f"--user-data-dir={profile_dir}", "about:blank"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        port_file = Path(profile_dir) / "DevToolsActivePort" # Chrome writes the port it picked here
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and proc.poll() is None:
+            lines = port_file.read_text().splitlines() if port_file.exists() else []
+            if lines and lines[0].strip().isdigit():
+                slot.update(proc=proc, port=int(lines[0]), profile_dir=profile_dir, jobs=0)
+                return slot["port"]
+            time.sleep(0.05)
+        proc.kill(); shutil.rmtree(profile_dir, ignore_errors=True)
+        raise RuntimeError("Pre-launched Chrome for Lighthouse did not report a DevTools port.")
+
+    def _reclaim_expired_leases(self):
+        # A lease outliving any possible audit belongs to a worker that died mid-run: its slot goes back to the pool
+        now = time.monotonic()
+        with self._lease_lock:
+            expired = [slot for slot in self._slots if slot["lease"] and now > slot["leased_until"]]
+            for slot in expired: slot.update(lease=None, leased_until=None)
+        for slot in expired:
+            print(f"  Lighthouse service: reclaiming slot {slot['id']} from an abandoned lease.")
+            self._stop_chrome(slot); self._free_slots.put(slot)
+
+    def acquire(self, timeout_s=LIGHTHOUSE_QUEUE_TIMEOUT_S, run_timeout_s=LIGHTHOUSE_TIMEOUT_S):
+        # Returns a lease (slot id, token) once a slot is free, or None after timeout_s
+        deadline = time.monotonic() + timeout_s
+        while True:
+            self._reclaim_expired_leases()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return None
+            try: slot = self._free_slots.get(timeout=min(5.0, remaining))
+            except queue.Empty: continue
+            with self._lease_lock:
+                slot.update(lease=next(self._lease_counter), leased_until=time.monotonic() + run_timeout_s + 120)
+                return slot["id"], slot["lease"]
+
+    def _leased_slot(self, lease):
+        slot = self._slots[lease[0]]
+        with self._lease_lock: return slot if slot["lease"] == lease[1] else None
+
+    def release(self, lease):
+        slot = self._leased_slot(lease)
+        if slot is None: return # Already reclaimed
+        with self._lease_lock: slot.update(lease=None, leased_until=None)
+        self._free_slots.put(slot)
+
+    def run_leased(self, lease, url, output_base, preset=None, timeout_s=LIGHTHOUSE_TIMEOUT_S):
+        slot = self._leased_slot(lease)
+        if slot is None: raise RuntimeError("Lighthouse slot lease expired.")
+        port = None
+        if self.chrome_binary:
+            try: port = self._ensure_chrome(slot)
+            except (OSError, RuntimeError) as e: print(f"  Lighthouse service: slot {slot['id']} Chrome unavailable ({e}); Lighthouse will launch its own.")
+        result = run_lighthouse_cli(self.lighthouse_path, url, output_base, preset, timeout_s, port)
+        if port: slot["jobs"] += 1
+        if result["timed_out"] or result["returncode"] != 0: self._stop_chrome(slot) # Never reuse a browser a failed audit left behind
+        result["chrome_slot"] = slot["id"]
+        return result
+
+    def run(self, url, output_base, preset=None, timeout_s=LIGHTHOUSE_TIMEOUT_S, queue_timeout_s=LIGHTHOUSE_QUEUE_TIMEOUT_S):
+        queued_at = time.monotonic()
+        lease = self.acquire(queue_timeout_s, timeout_s) # Jobs queue here until a Chrome slot is free
+        queue_wait_s = round(time.monotonic() - queued_at, 3)
+        if lease is None: return lighthouse_queue_timeout_result(queue_wait_s)
+        try: return {**self.run_leased(lease, url, output_base, preset, timeout_s), "queue_wait_s": queue_wait_s}
+        finally: self.release(lease)
+
+    def close(self):
+        for slot in self._slots: self._stop_chrome(slot)
+
+
+def lighthouse_queue_timeout_result(queue_wait_s):
+    return {"returncode": None, "stderr": "", "cmd": [], "timed_out": False, "queue_timed_out": True, "queue_wait_s": queue_wait_s}
+
+
+class LighthouseManager(BaseManager): pass
+LighthouseManager.register("LighthouseService", LighthouseService)
+
+def lighthouse_slot_count(prompt_workers):
+    # One slot per two prompt workers (a prompt spends a fraction of its time in Lighthouse), but at most half the
+    # cores: concurrent audits compete for CPU and skew each other's performance scores
+    return max(1, min((prompt_workers + 1) // 2, (os.cpu_count() or 2) // 2))
+
+def start_lighthouse_service(chrome_env, prompt_workers=PROMPT_WORKERS_COUNT, size=None):
+    # Returns (manager, service proxy); the proxy is picklable and is handed to prompt workers
+    lighthouse_path = shutil.which("lighthouse")
+    if not lighthouse_path: return None, None
+    size = size or LIGHTHOUSE_WORKERS_COUNT or lighthouse_slot_count(prompt_workers)
+    manager = LighthouseManager(); manager.start()
+    service = manager.LighthouseService(lighthouse_path, (chrome_env or {}).get("chrome_binary"), size)
+    print(f"Lighthouse service started: {size} slot(s) for {prompt_workers} prompt worker(s){' with pre-launched Chrome' if (chrome_env or {}).get('chrome_binary') else ''}.")
+    return manager, service
+
+def stop_lighthouse_service(manager, service):
+    if not manager: return
+    try: service.close()
+    except Exception as e: print(f"WARN: Lighthouse service close failed: {e}")
+    manager.shutdown()
+
 class UIBenchmarkAnalyzer:
     # Categories whose max points scale if run on multiple standard viewports (e.g., desktop & mobile)
     PER_VIEWPORT_SCALABLE_CATEGORIES = [
@@ -158,16 +1363,22 @@ class UIBenchmarkAnalyzer:
         "SEO (Lighthouse)"
     ]
 
-    def __init__(self, html_file_path, prompt_config_object, output_base_dir, run_timestamp_str, viewports=None):
+    def __init__(self, html_file_path, prompt_config_object, output_base_dir, run_timestamp_str, viewports=None, driver=None, lighthouse_backend=None, lighthouse_cache=None, page_url=None, watchdog=None, helper_driver_source=None):
         self.file_path = Path(html_file_path).resolve()
         self.prompt_config = prompt_config_object
 
         if not self.file_path.is_file():
             raise FileNotFoundError(f"HTML file not found: {self.file_path}")
 
-        self.selenium_uri = self.file_path.as_uri()
+        # Served over the run's shared HTTP server when one is available, otherwise straight from disk
+        self.page_url = page_url
+        self.selenium_uri = page_url or self.file_path.as_uri()
         self.run_timestamp = run_timestamp_str
         self.prompt_id = self.prompt_config.get("prompt_id", self.file_path.stem)
+        self.fingerprint = compute_prompt_fingerprint(self.file_path, self.prompt_config)
+        self._script_timeout_s = WEBDRIVER_SCRIPT_TIMEOUT_S # What the driver is set to; pooled browsers are reset to it
+        self.lighthouse_queue_waits_s = [] # Seconds each Lighthouse run waited for a service slot
+        self.check_durations_s = {} # Wall time per check/load/Lighthouse call, summed over viewports; written to timings.json
 
         self.prompt_output_dir = Path(output_base_dir) / f"{self.prompt_id}_{self.run_timestamp}"
         self.prompt_output_dir.mkdir(parents=True, exist_ok=True)
@@ -190,6 +1401,8 @@ class UIBenchmarkAnalyzer:
 
         self.page_title = "N/A"
         self.lighthouse_path = shutil.which("lighthouse")
+        self.lighthouse_backend = lighthouse_backend # LighthouseService proxy; None runs the CLI directly
+        self.lighthouse_cache = lighthouse_cache # LighthouseResultCache; None always runs Lighthouse
         if not self.lighthouse_path:
             print(f"WARNING (Prompt: {self.prompt_id}): Lighthouse CLI not found. Performance/some quality checks will be skipped.")
 
@@ -198,33 +1411,49 @@ class UIBenchmarkAnalyzer:
         self.server_port = None
         self.local_server_url_for_lighthouse = None
 
-        options = ChromeOptions()
-        options.add_argument('--headless=new')
-        options.add_argument('--disable-gpu'); options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage'); options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        options.add_argument('--log-level=3'); options.set_capability("goog:loggingPrefs", {"browser": "ALL", "performance": "ALL"})
-
-        try:
-            try: driver_path = ChromeDriverManager().install(); service = ChromeService(executable_path=driver_path)
-            except Exception: print(f"WebDriverManager failed for {self.prompt_id}, trying system ChromeDriver."); service = ChromeService()
-            self.driver = webdriver.Chrome(service=service, options=options)
-        except WebDriverException as e:
-            raise WebDriverException(f"Fatal WebDriver Error for prompt {self.prompt_id}: {e}")
+        # A driver handed in (e.g. from the worker's WarmBrowserPool) is borrowed and left running on close()
+        self._owns_driver = driver is None
+        self.driver = driver if driver is not None else create_chrome_driver(f"prompt {self.prompt_id}")
+        self.watchdog = watchdog # PromptWatchdog enforcing phase budgets; None disables them
+        if self.watchdog: self.watchdog.watch(self.driver)
+        # Callable(count) -> extra drivers for isolated interaction checks (e.g. WarmBrowserPool.acquire_helpers);
+        # without one the analyzer launches its own on first use and quits them on close()
+        self.helper_driver_source = helper_driver_source
+        self._own_helper_drivers = []
 
         self.current_viewport_name = "initial"
         self.global_run_timestamp = run_timestamp_str
 
+        self.single_navigation = self.prompt_config.get("single_navigation", SINGLE_NAVIGATION_VIEWPORTS)
+        self._page_loaded = False
+        self._page_dirty = False # Set once an interaction has changed the page since it was loaded
+        self._background_cache = EffectiveBackgroundCache()
+        self.viewport_navigation_log = []
+        self._page_snapshot = None # Result of PAGE_STATE_CAPTURE_SCRIPT for the current document and viewport
+        self.page_state_log = [] # Every restore/reload that gave an interaction (or the main page) a fresh page
+        self._deferred_findings = None # A list on _isolated_copy() instances
+
+    @contextmanager
+    def _timed_check(self, label):
+        started = time.monotonic()
+        try: yield
+        finally: self.check_durations_s[label] = round(self.check_durations_s.get(label, 0.0) + time.monotonic() - started, 3)
+
+    def _enter_phase(self, phase):
+        if self.watchdog: self.watchdog.enter(phase)
+        emit_worker_event("prompt_phase", model=self.file_path.parent.name, prompt_id=self.prompt_id, phase=phase, viewport=self.current_viewport_name)
+
     def _start_local_server(self):
         if self.http_server: return self.local_server_url_for_lighthouse
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM); sock.bind(('localhost', 0))
-        self.server_port = sock.getsockname()[1]; sock.close()
         handler = partial(http.server.SimpleHTTPRequestHandler, directory=str(self.file_path.parent))
         socketserver.TCPServer.allow_reuse_address = True
-        self.http_server = socketserver.TCPServer(("localhost", self.server_port), handler)
+        # Binding port 0 directly avoids the probe-then-rebind race; the socket is listening once this returns
+        self.http_server = socketserver.TCPServer(("localhost", 0), handler)
+        self.server_port = self.http_server.server_address[1]
         self.http_thread = threading.Thread(target=self.http_server.serve_forever, daemon=True); self.http_thread.start()
         self.local_server_url_for_lighthouse = f"http://localhost:{self.server_port}/{quote(self.file_path.name)}"
         print(f"  (Prompt {self.prompt_id}) Local HTTP server started: {self.local_server_url_for_lighthouse}")
-        time.sleep(0.5); return self.local_server_url_for_lighthouse
+        return self.local_server_url_for_lighthouse
 
     def _stop_local_server(self):
         if self.http_server:
@@ -235,6 +1464,9 @@ class UIBenchmarkAnalyzer:
             print(f"  (Prompt {self.prompt_id}) Local HTTP server stopped.")
 
     def _add_finding(self, category_key, check_name, points_earned, max_points_for_check, message, status="INFO", data=None, is_adherence_check=False):
+        if self._deferred_findings is not None: # An _isolated_copy(): recorded by the parent once its thread is done
+            self._deferred_findings.append(((category_key, check_name, points_earned, max_points_for_check, message), {"status": status, "data": data, "is_adherence_check": is_adherence_check}))
+            return
         points_earned = float(points_earned)
         max_points_for_check = float(max_points_for_check)
 
@@ -272,15 +1504,40 @@ class UIBenchmarkAnalyzer:
         if status == "FAIL": print(f"    -> [FAIL] ({self.prompt_id}@{self.current_viewport_name}) {category_key} - {check_name}: {message}")
         elif status == "WARN" and max_points_for_check > 0: print(f"    -> [WARN] ({self.prompt_id}@{self.current_viewport_name}) {category_key} - {check_name}: {message}")
 
+    def _emulate_viewport(self, width, height):
+        # mobile=False keeps the same layout semantics as a plain resized window (what the reload path measures)
+        self.driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {"width": width, "height": height, "deviceScaleFactor": 0, "mobile": False})
+
+    def _wait_for_page_settled(self, max_wait_s=PAGE_SETTLE_MAX_WAIT_S, context="page"):
+        settled, waited_s = wait_for_page_settled(self.driver, max_wait_s)
+        if not settled: print(f"  INFO ({self.prompt_id}@{self.current_viewport_name}): {context} not settled after {waited_s:.1f}s ceiling, continuing.")
+        return settled
+
     def _load_page_at_viewport(self, viewport_name, width, height):
         print(f"\n--- Viewport: {viewport_name} ({width}x{height}) for Prompt: {self.prompt_id} ---")
         self.current_viewport_name = viewport_name
+        self._background_cache.clear() # Layout (and thus backgrounds) may differ per viewport
+        self._page_snapshot = None # Scroll offsets and layout are per viewport; retaken before the interactions
+        if self.single_navigation and self._page_loaded and not self._page_dirty:
+            try:
+                self._emulate_viewport(width, height)
+                self._wait_for_page_settled(context="viewport switch") # Let resize handlers and media queries re-layout
+                self.viewport_navigation_log.append({"viewport": viewport_name, "mode": "emulated"})
+                screenshot_path = self.screenshots_dir / f"{self.prompt_id}_{viewport_name}.png"
+                self.driver.save_screenshot(str(screenshot_path))
+                print(f"  Viewport switched in place (no reload). Screenshot: {screenshot_path.name}")
+                return
+            except WebDriverException as e:
+                print(f"  WARN: In-place viewport switch failed ({str(e)[:100]}), reloading page.")
         self.driver.set_window_size(width, height)
         try:
+            if self.single_navigation: self._emulate_viewport(width, height)
             self.driver.get(self.selenium_uri)
             WebDriverWait(self.driver, 15).until(lambda d: d.execute_script('return document.readyState') == 'complete')
             self.page_title = self.driver.title or "N/A"
-            time.sleep(1.0)
+            self._page_loaded, self._page_dirty = True, False
+            self.viewport_navigation_log.append({"viewport": viewport_name, "mode": "reload"})
+            self._wait_for_page_settled(context="page load")
             screenshot_path = self.screenshots_dir / f"{self.prompt_id}_{viewport_name}.png"
             self.driver.save_screenshot(str(screenshot_path))
             print(f"  Page loaded. Screenshot: {screenshot_path.name}")
@@ -547,102 +1804,55 @@ class UIBenchmarkAnalyzer:
         category_key = "Rendered Color & Contrast"
         max_points_per_run = TECHNICAL_QUALITY_MAX_POINTS_CONFIG[category_key] # Base for one viewport
         print(f"\nRunning Checks: {category_key} (Prompt: {self.prompt_id}, Viewport: {self.current_viewport_name})")
-        text_elements_script = """
-            const elementsData = [];
-            const treeWalker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT, {
-                acceptNode: function (node) {
-                    if (node.nodeName === 'SCRIPT' || node.nodeName === 'STYLE' || node.nodeName === 'NOSCRIPT' ||
-                        node.nodeName === 'IFRAME' || node.nodeName === 'HEAD' || node.nodeName === 'META' ||
-                        node.nodeName === 'LINK' || node.nodeName === 'TITLE' || node.closest('svg')) {
-                        return NodeFilter.FILTER_REJECT;
-                    }
-                    let hasDirectText = false;
-                    for (let child = node.firstChild; child; child = child.nextSibling) {
-                        if (child.nodeType === Node.TEXT_NODE && child.nodeValue.trim().length > 0) {
-                            hasDirectText = true; break;
-                        }
-                    }
-                    let hasPlaceholderText = ( (node.nodeName === 'INPUT' || node.nodeName === 'TEXTAREA') &&
-                                               node.placeholder && node.placeholder.trim().length > 0 );
-                    if (!hasDirectText && !hasPlaceholderText) return NodeFilter.FILTER_SKIP;
-
-                    const style = window.getComputedStyle(node);
-                    if (!style || style.display === 'none' || style.visibility === 'hidden' ||
-                        parseFloat(style.opacity) === 0 || parseFloat(style.fontSize) < 8 ||
-                        node.offsetWidth === 0 || node.offsetHeight === 0) {
-                        return NodeFilter.FILTER_REJECT;
-                    }
-                    return NodeFilter.FILTER_ACCEPT;
-                }
-            });
-            let count = 0; const MAX_ELEMENTS_TO_CHECK = 150;
-            while (treeWalker.nextNode() && count < MAX_ELEMENTS_TO_CHECK) { elementsData.push(treeWalker.currentNode); count++;}
-            return elementsData;
-        """
-        candidate_elements_from_script = []
         try:
-            candidate_elements_from_script = self.driver.execute_script(text_elements_script)
+            bg_cache = self._background_cache
+            scan = self.driver.execute_script(CONTRAST_SCAN_SCRIPT, CONTRAST_MAX_ELEMENTS, bg_cache.doc_token, list(bg_cache.rgb_by_node.keys()))
         except WebDriverException as e_fetch:
             self._add_finding(category_key, "Contrast Element Fetch", 0, max_points_per_run, f"Error fetching text elements: {e_fetch}", "FAIL"); return
 
-        if not candidate_elements_from_script :
+        if not scan or not scan.get("candidate_count"):
              self._add_finding(category_key, "Contrast Check", max_points_per_run, max_points_per_run, "No visible text elements by script to check.", "INFO")
              return
-
-        elements_to_check = [el for el in candidate_elements_from_script if hasattr(el, 'tag_name') and el.is_displayed()]
-        if not elements_to_check:
+        visible_count = scan.get("visible_count", 0)
+        if not visible_count:
             self._add_finding(category_key, "Contrast Check", max_points_per_run, max_points_per_run, "No valid text elements after filtering.", "INFO"); return
 
-        print(f"  Checking contrast for ~{len(elements_to_check)} text candidate(s)...")
+        print(f"  Checking contrast for ~{visible_count} text candidate(s) (1 in-page scan, {len(scan['nodes'])} background nodes)...")
         failure_count_aa = 0; checked_count = 0; warning_count_aaa = 0
-        script_get_styles = "const el = arguments[0]; if (!el || !el.checkVisibility || !el.checkVisibility()) return null; const style = window.getComputedStyle(el); if (!style) return null; return {color: style.color, fontSize: style.fontSize, fontWeight: style.fontWeight, opacity: style.opacity};"
-
-        for el_web_element in elements_to_check:
-            try:
-                if not el_web_element.is_displayed(): continue
-                text_content_py = el_web_element.text.strip()
-                placeholder_text_py = (el_web_element.get_attribute("placeholder") or "").strip() if el_web_element.tag_name.lower() in ['input', 'textarea'] else ""
-                effective_text_content = placeholder_text_py if not text_content_py and placeholder_text_py else text_content_py
-                if not effective_text_content: continue
-
-                style_dict = self.driver.execute_script(script_get_styles, el_web_element)
-                if not style_dict: continue
-
-                fg_color_str, font_size_str, font_weight_str, opacity_str = style_dict.get('color'), style_dict.get('fontSize'), style_dict.get('fontWeight'), style_dict.get('opacity')
-                if not fg_color_str or not font_size_str: continue
-
-                fg_rgba_tuple = parse_color_string_to_rgb_tuple(fg_color_str)
-                if not fg_rgba_tuple: continue
-
-                effective_text_alpha = fg_rgba_tuple[3] * (float(opacity_str) if opacity_str else 1.0)
-                if effective_text_alpha < 0.1: continue
-
-                fg_rgb_for_contrast = (fg_rgba_tuple[0], fg_rgba_tuple[1], fg_rgba_tuple[2])
-                bg_rgb = get_effective_background_rgb(el_web_element, self.driver)
-                if not bg_rgb: continue
-
-                checked_count += 1
-                font_size_px = float(re.sub(r'[^\d.]', '', font_size_str))
-                is_bold = (str(font_weight_str).lower() in ['bold', 'bolder'] or (str(font_weight_str).isdigit() and int(font_weight_str) >= 700))
-                is_large_wcag = (font_size_px >= 24) or (font_size_px >= 18.66 and is_bold)
-
-                norm_fg, norm_bg = normalize_rgb_for_contrast(fg_rgb_for_contrast), normalize_rgb_for_contrast(bg_rgb)
-                if norm_fg and norm_bg:
-                    ratio = contrast_lib.rgb(norm_fg, norm_bg)
-                    passes_aa, passes_aaa = contrast_lib.passes_AA(ratio, large=is_large_wcag), contrast_lib.passes_AAA(ratio, large=is_large_wcag)
-                    snippet = effective_text_content[:40].replace('\n', ' ') + ('...' if len(effective_text_content) > 40 else '')
-                    el_desc = get_element_desc(el_web_element)
-                    if not passes_aa:
-                        failure_count_aa += 1
-                        # This finding has 0 points and 0 max_points because it's a detail of the main "Contrast Check Result"
-                        self._add_finding(category_key, "Contrast Failure (AA)", 0, 0, f"AA FAIL {ratio:.2f} for '{snippet}' in {el_desc}", "FAIL", data={"ratio": ratio, "text": snippet, "fg": fg_color_str, "bg_eff": f"rgb{bg_rgb}"})
-                    elif not passes_aaa:
-                        warning_count_aaa +=1
-                        self._add_finding(category_key, "Contrast Suboptimal (AAA)", 0, 0, f"AAA WARN {ratio:.2f} for '{snippet}' in {el_desc}", "INFO", data={"ratio": ratio})
-            except (StaleElementReferenceException, WebDriverException): continue
-            except Exception as e_inner: print(f"    Error in contrast loop: {e_inner}")
-
-        if checked_count == 0 and elements_to_check: self._add_finding(category_key, "Contrast Check Result", 0, max_points_per_run, f"Checked 0 of {len(elements_to_check)} candidates.", "FAIL")
+        if scan.get("doc_token") != bg_cache.doc_token: bg_cache.clear(); bg_cache.doc_token = scan.get("doc_token") # New document
+        node_backgrounds = resolve_node_backgrounds(scan["nodes"], scan.get("doc_bg"), bg_cache.rgb_by_node)
+        bg_cache.rgb_by_node.update((node_row[2], rgb) for node_row, rgb in zip(scan["nodes"], node_backgrounds))
+
+        # One pass over the compact rows: [node_idx, text, color, fontSize, fontWeight, opacity, desc]
+        measured = []
+        for node_idx, text, fg_color_str, font_size_str, font_weight_str, opacity_str, el_desc in scan["rows"]:
+            if not fg_color_str or not font_size_str: continue
+            fg_rgba_tuple = parse_color_string_to_rgb_tuple(fg_color_str)
+            if not fg_rgba_tuple: continue
+            try: effective_text_alpha = fg_rgba_tuple[3] * (float(opacity_str) if opacity_str else 1.0)
+            except ValueError: continue
+            if effective_text_alpha < 0.1: continue
+            bg_rgb = node_backgrounds[node_idx]
+            norm_fg, norm_bg = normalize_rgb_for_contrast(fg_rgba_tuple[:3]), normalize_rgb_for_contrast(bg_rgb)
+            if not norm_fg or not norm_bg: continue
+            font_size_px = float(re.sub(r'[^\d.]', '', font_size_str) or 0)
+            is_bold = (str(font_weight_str).lower() in ['bold', 'bolder'] or (str(font_weight_str).isdigit() and int(font_weight_str) >= 700))
+            is_large_wcag = (font_size_px >= 24) or (font_size_px >= 18.66 and is_bold)
+            measured.append((contrast_lib.rgb(norm_fg, norm_bg), is_large_wcag, text, fg_color_str, bg_rgb, el_desc))
+
+        checked_count = len(measured)
+        for ratio, is_large_wcag, text, fg_color_str, bg_rgb, el_desc in measured:
+            passes_aa, passes_aaa = contrast_lib.passes_AA(ratio, large=is_large_wcag), contrast_lib.passes_AAA(ratio, large=is_large_wcag)
+            snippet = text[:40].replace('\n', ' ') + ('...' if len(text) > 40 else '')
+            if not passes_aa:
+                failure_count_aa += 1
+                # This finding has 0 points and 0 max_points because it's a detail of the main "Contrast Check Result"
+                self._add_finding(category_key, "Contrast Failure (AA)", 0, 0, f"AA FAIL {ratio:.2f} for '{snippet}' in {el_desc}", "FAIL", data={"ratio": ratio, "text": snippet, "fg": fg_color_str, "bg_eff": f"rgb{bg_rgb}"})
+            elif not passes_aaa:
+                warning_count_aaa +=1
+                self._add_finding(category_key, "Contrast Suboptimal (AAA)", 0, 0, f"AAA WARN {ratio:.2f} for '{snippet}' in {el_desc}", "INFO", data={"ratio": ratio})
+
+        if checked_count == 0: self._add_finding(category_key, "Contrast Check Result", 0, max_points_per_run, f"Checked 0 of {visible_count} candidates.", "FAIL")
         elif failure_count_aa > 0:
             penalty_per_failure = 2.5
             earned_points = max(0, max_points_per_run - (failure_count_aa * penalty_per_failure))
@@ -658,38 +1868,59 @@ class UIBenchmarkAnalyzer:
                 self._add_finding(cat_key_conf, f"{category_prefix} Execution", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], "Lighthouse CLI not found.", "WARN")
             return
 
-        url_to_check_lh = self._start_local_server()
-        if not url_to_check_lh:
-             for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
-                self._add_finding(cat_key_conf, f"{category_prefix} Server", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], "Failed to start local server.", "FAIL")
-             return
-
         lh_reports_dir = self.prompt_output_dir / f"lighthouse_reports_{self.current_viewport_name}"
         lh_reports_dir.mkdir(parents=True, exist_ok=True)
         lh_base_report_name = lh_reports_dir / f"lh_{self.prompt_id}"
+        report_path_json = lh_base_report_name.with_suffix(".report.json")
 
-        cmd = [self.lighthouse_path, url_to_check_lh, "--output=json", "--output=html",
-               f"--output-path={lh_base_report_name}", "--quiet", "--throttling-method=simulate",
-               f"--chrome-flags=--headless=new --disable-gpu --no-sandbox --no-zygote",
-               "--only-categories=" + ",".join(LIGHTHOUSE_CATEGORIES)]
-
+        lh_preset = None
         lh_viewport_name_lower = self.current_viewport_name.lower()
         if lh_viewport_name_lower == 'desktop':
-            cmd.append("--preset=desktop")
+            lh_preset = "desktop"
         elif lh_viewport_name_lower != 'mobile':
              print(f"  Lighthouse: Viewport '{self.current_viewport_name}' is custom. Using LH default settings based on browser emulation.")
 
+        cache_key, cache_hit = None, False
+        if self.lighthouse_cache is not None:
+            try:
+                cache_key = self.lighthouse_cache.key_for(self.file_path, self.lighthouse_path, lh_preset)
+                cache_hit = self.lighthouse_cache.get(cache_key, lh_base_report_name)
+                if cache_hit: print(f"  Lighthouse cache hit ({cache_key[:12]}), skipping CLI run.")
+            except OSError as e_cache: print(f"  WARN: Lighthouse cache unavailable: {e_cache}"); cache_key = None
 
-        print(f"  Running Lighthouse on {url_to_check_lh} ({self.current_viewport_name})...")
         try:
-            process = subprocess.run(cmd, capture_output=True, text=True, timeout=300, check=False)
-            report_path_json = lh_base_report_name.with_suffix(".report.json")
-
-            if process.returncode != 0 or not report_path_json.exists():
-                err_msg = f"CLI failed. Code: {process.returncode}. Stderr: {process.stderr[:500]}"
-                for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
-                    self._add_finding(cat_key_conf, f"{category_prefix} Execution", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], err_msg, "FAIL", data={"cmd": " ".join(cmd)})
-                return
+            if not cache_hit:
+                report_path_json.unlink(missing_ok=True) # Never score a report an earlier attempt left in this directory
+                url_to_check_lh = self.page_url or self._start_local_server() # Per-prompt server only when run standalone
+                if not url_to_check_lh:
+                     for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
+                        self._add_finding(cat_key_conf, f"{category_prefix} Server", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], "Failed to start local server.", "FAIL")
+                     return
+
+                print(f"  Running Lighthouse on {url_to_check_lh} ({self.current_viewport_name})...")
+                lh_run = None
+                if self.lighthouse_backend is not None:
+                    try: lh_run = self._run_lighthouse_via_service(url_to_check_lh, str(lh_base_report_name), lh_preset)
+                    except Exception as e_backend: print(f"  WARN: Lighthouse service unavailable ({str(e_backend)[:100]}), running CLI directly.")
+                if lh_run is None:
+                    lh_timeout_s = self._lighthouse_timeout_s()
+                    lh_run = {**run_lighthouse_cli(self.lighthouse_path, url_to_check_lh, str(lh_base_report_name), lh_preset, lh_timeout_s), "timeout_s": lh_timeout_s}
+                if "queue_wait_s" in lh_run: self.lighthouse_queue_waits_s.append(lh_run["queue_wait_s"])
+                if lh_run.get("queue_timed_out"):
+                    for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
+                        self._add_finding(cat_key_conf, f"{category_prefix} Execution", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], f"Queue timeout: no Lighthouse slot free within {LIGHTHOUSE_QUEUE_TIMEOUT_S:.0f}s.", "FAIL")
+                    return
+                lh_timeout_s = lh_run["timeout_s"]
+                if lh_run["timed_out"]:
+                    for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
+                        self._add_finding(cat_key_conf, f"{category_prefix} Execution", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], f"Timed out ({lh_timeout_s:.0f}s).", "FAIL")
+                    return
+
+                if lh_run["returncode"] != 0 or not report_path_json.exists():
+                    err_msg = f"CLI failed. Code: {lh_run['returncode']}. Stderr: {lh_run['stderr'][:500]}"
+                    for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
+                        self._add_finding(cat_key_conf, f"{category_prefix} Execution", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], err_msg, "FAIL", data={"cmd": " ".join(lh_run["cmd"])})
+                    return
 
             with open(report_path_json, 'r', encoding='utf-8') as f: lh_results = json.load(f)
             if lh_results.get("runtimeError"):
@@ -697,6 +1928,9 @@ class UIBenchmarkAnalyzer:
                 for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
                      self._add_finding(cat_key_conf, f"{category_prefix} Runtime Error", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], err_msg, "FAIL")
                 return
+            if cache_key and not cache_hit:
+                try: self.lighthouse_cache.put(cache_key, lh_base_report_name)
+                except OSError as e_cache: print(f"  WARN: Could not store Lighthouse report in cache: {e_cache}")
 
             lh_category_mapping = {
                 'performance': "Performance (Lighthouse)", 'accessibility': "Accessibility (Lighthouse)",
@@ -711,16 +1945,29 @@ class UIBenchmarkAnalyzer:
                     status = "PASS" if score_0_1 >= 0.9 else "WARN" if score_0_1 >= 0.5 else "FAIL"
                     self._add_finding(TQ_key, f"{category_prefix} Score", earned_pts, max_cat_pts_per_run, f"{int(score_0_1*100)}/100", status)
                 else: self._add_finding(TQ_key, f"{category_prefix} Score", 0, max_cat_pts_per_run, "Score not found.", "FAIL")
-            print(f"  Lighthouse reports generated in: {lh_reports_dir.name}")
-        except subprocess.TimeoutExpired:
-            for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
-                self._add_finding(cat_key_conf, f"{category_prefix} Execution", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], "Timed out (5 min).", "FAIL")
+            print(f"  Lighthouse reports {'restored from cache' if cache_hit else 'generated'} in: {lh_reports_dir.name}")
         except Exception as e_lh:
             for cat_key_conf in ["Performance (Lighthouse)", "Accessibility (Lighthouse)", "Best Practices (Lighthouse)", "SEO (Lighthouse)"]:
                 self._add_finding(cat_key_conf, f"{category_prefix} Main Error", 0, TECHNICAL_QUALITY_MAX_POINTS_CONFIG[cat_key_conf], f"Error: {str(e_lh)[:200]}", "FAIL")
         finally: self._stop_local_server()
 
 
+    def _lighthouse_timeout_s(self):
+        # Lighthouse runs in another process the watchdog cannot kill, so it gets the phase's remaining budget
+        return min(LIGHTHOUSE_TIMEOUT_S, self.watchdog.remaining_s()) if self.watchdog else LIGHTHOUSE_TIMEOUT_S
+
+    def _run_lighthouse_via_service(self, url, output_base, preset):
+        # Waiting for a slot is its own watchdog phase, so time spent queued does not eat into the audit's budget
+        self._enter_phase("lighthouse_queue")
+        queued_at = time.monotonic()
+        try: lease = self.lighthouse_backend.acquire(LIGHTHOUSE_QUEUE_TIMEOUT_S, LIGHTHOUSE_TIMEOUT_S)
+        finally: self._enter_phase("lighthouse")
+        queue_wait_s = round(time.monotonic() - queued_at, 3)
+        if lease is None: return lighthouse_queue_timeout_result(queue_wait_s)
+        timeout_s = self._lighthouse_timeout_s()
+        try: return {**self.lighthouse_backend.run_leased(lease, url, output_base, preset, timeout_s), "queue_wait_s": queue_wait_s, "timeout_s": timeout_s}
+        finally: self.lighthouse_backend.release(lease)
+
     def check_javascript_health(self):
         category_key = "JavaScript Health"
         if self.technical_checks_completed_flags.get(category_key): return
@@ -752,31 +1999,40 @@ class UIBenchmarkAnalyzer:
         if not hasattr(self, '_adherence_checks_passed_this_prompt'):
             self._adherence_checks_passed_this_prompt = {}
 
-        for check_item_config in adherence_config_list:
+        applicable_checks = [c for c in adherence_config_list if not c.get("viewports") or self.current_viewport_name in c.get("viewports")]
+        facts_by_position = {}
+        isolated_groups = self._plan_isolated_interactions(applicable_checks)
+        isolated_results, isolated_durations_s = self._run_isolated_interactions(applicable_checks, isolated_groups) if isolated_groups else ({}, {})
+        in_place_interactions = any(c.get("type") == "interaction" and pos not in isolated_results for pos, c in enumerate(applicable_checks))
+        if in_place_interactions and not self._page_dirty and not self._page_snapshot: self._capture_page_state()
+        for check_position, check_item_config in enumerate(applicable_checks):
             check_type = check_item_config.get("type")
             check_name = check_item_config.get("name", f"Unnamed {check_type} check")
             points_for_this_check = float(check_item_config.get("points", 0))
 
-            check_applies_to_current_viewport = False
-            specified_viewports = check_item_config.get("viewports")
-            if not specified_viewports or self.current_viewport_name in specified_viewports:
-                check_applies_to_current_viewport = True
-            if not check_applies_to_current_viewport: continue
+            if ADHERENCE_BATCH_PROBES and check_type in BATCHABLE_ADHERENCE_TYPES and check_position not in facts_by_position:
+                # Probe this check and every static check after it, up to the next one that may change the page
+                segment = list(itertools.takewhile(lambda pos: applicable_checks[pos].get("type") in BATCHABLE_ADHERENCE_TYPES, range(check_position, len(applicable_checks))))
+                facts_by_position.update(zip(segment, self._probe_adherence_checks([applicable_checks[pos] for pos in segment])))
+            facts = facts_by_position.get(check_position)
 
             earned_for_this_instance = 0.0
             status_for_this_instance = "FAIL"
             message_for_this_instance = "Check not successfully executed or verified."
             data_for_this_instance = None
 
+            check_started = time.monotonic()
             try:
                 passed_check, msg, data = (False, "Unknown check type", None)
-                if check_type == "element_presence": passed_check, msg, data = self._verify_element_presence(check_item_config)
-                elif check_type == "element_order": passed_check, msg, data = self._verify_element_order(check_item_config)
-                elif check_type == "element_count": passed_check, msg, data = self._verify_element_count(check_item_config)
-                elif check_type == "text_content": passed_check, msg, data = self._verify_text_content(check_item_config)
-                elif check_type == "attribute_value": passed_check, msg, data = self._verify_attribute_value(check_item_config)
-                elif check_type == "css_property": passed_check, msg, data = self._verify_css_property(check_item_config)
-                elif check_type == "interaction": passed_check, msg, data = self._execute_and_verify_interaction(check_item_config)
+                if check_type == "element_presence": passed_check, msg, data = self._verify_element_presence(check_item_config, facts)
+                elif check_type == "element_order": passed_check, msg, data = self._verify_element_order(check_item_config, facts)
+                elif check_type == "element_count": passed_check, msg, data = self._verify_element_count(check_item_config, facts)
+                elif check_type == "text_content": passed_check, msg, data = self._verify_text_content(check_item_config, facts)
+                elif check_type == "attribute_value": passed_check, msg, data = self._verify_attribute_value(check_item_config, facts)
+                elif check_type == "css_property": passed_check, msg, data = self._verify_css_property(check_item_config, facts)
+                elif check_type == "interaction":
+                    if check_position in isolated_results: passed_check, msg, data = isolated_results[check_position].result() # Raises what the check raised
+                    else: passed_check, msg, data = self._execute_and_verify_interaction(check_item_config)
                 elif check_type == "custom_script_evaluates_true":
                     script_to_run = check_item_config.get("script")
                     temp_passed_check, temp_msg, temp_data = True, "", None # Initialize for this block
@@ -817,11 +2073,189 @@ class UIBenchmarkAnalyzer:
                      self._add_finding("Prompt Adherence Details", check_name, 0, points_for_this_check, message_for_this_instance, status_for_this_instance, data_for_this_instance, is_adherence_check=True)
             except Exception as e_adh_check:
                  self._add_finding("Prompt Adherence Details", check_name, 0, points_for_this_check, f"CRITICAL ERROR during check execution: {e_adh_check}", "FAIL", data={"traceback": str(e_adh_check)}, is_adherence_check=True)
-
-    def _verify_element_presence(self, config):
-        element = self._find_element_by_config(config)
-        is_present = element is not None
-        is_visible = is_present and element.is_displayed()
+            finally:
+                adherence_label = f"adherence:{check_type}:{check_name}"
+                check_elapsed_s = isolated_durations_s.get(check_position, time.monotonic() - check_started)
+                self.check_durations_s[adherence_label] = round(self.check_durations_s.get(adherence_label, 0.0) + check_elapsed_s, 3)
+        # In-place interactions share state between them (sequential); afterwards the page is put back if that is cheap,
+        # so the next viewport can switch in place. No reload here: the next viewport reloads a dirty page anyway.
+        if in_place_interactions and self._page_dirty and self._page_snapshot: self._restore_page_state("after in-place interactions")
+
+    def _plan_isolated_interactions(self, applicable_checks):
+        # Groups of interaction checks (positions in applicable_checks) that each get their own freshly loaded page.
+        # Checks linked through "depends_on" share one page and run in config order; a group containing a "sequential"
+        # check, or every group when the prompt sets "sequential", runs in place on the main page as before.
+        if self.prompt_config.get("sequential"): return []
+        interaction_positions = [pos for pos, c in enumerate(applicable_checks) if c.get("type") == "interaction"]
+        position_by_name = {applicable_checks[pos].get("name"): pos for pos in interaction_positions if applicable_checks[pos].get("name")}
+        known_names = {c.get("name") for c in self.prompt_config.get("adherence_checks", [])}
+        group_of = {pos: {pos} for pos in interaction_positions}
+        for pos in interaction_positions:
+            depends_on = applicable_checks[pos].get("depends_on") or []
+            for dep_name in [depends_on] if isinstance(depends_on, str) else depends_on:
+                if dep_name not in known_names: print(f"  WARN ({self.prompt_id}): '{applicable_checks[pos].get('name')}' depends on unknown check '{dep_name}'."); continue
+                dep_pos = position_by_name.get(dep_name)
+                if dep_pos is None: continue # Static checks (or checks for other viewports) leave no page state to depend on
+                if dep_pos > pos: print(f"  WARN ({self.prompt_id}): '{applicable_checks[pos].get('name')}' depends on the later check '{dep_name}'; running in config order.")
+                merged = group_of[pos] | group_of[dep_pos]
+                for member in merged: group_of[member] = merged
+        groups = {id(group): sorted(group) for group in group_of.values()}.values()
+        return [group for group in groups if not any(applicable_checks[pos].get("sequential") for pos in group)]
+
+    def _helper_drivers(self, count):
+        if count <= 0: return []
+        if self.helper_driver_source: helpers = self.helper_driver_source(count)
+        else:
+            while len(self._own_helper_drivers) < count:
+                try: self._own_helper_drivers.append(create_chrome_driver(f"prompt {self.prompt_id} helper {len(self._own_helper_drivers)+1}"))
+                except WebDriverException as e: print(f"  WARN ({self.prompt_id}): Could not launch helper Chrome ({str(e)[:100]})."); break
+            helpers = self._own_helper_drivers[:count]
+        if self.watchdog: self.watchdog.watch_helpers(helpers)
+        return helpers
+
+    # Attributes isolated copies share with their analyzer: configuration that nothing writes while interactions run.
+    # Everything else is created per copy in _isolated_copy(), so a new attribute is missing on copies (AttributeError)
+    # rather than silently shared between threads until it is added to one or the other.
+    ISOLATED_SHARED_ATTRS = ("file_path", "prompt_config", "prompt_id", "fingerprint", "page_url", "selenium_uri", "run_timestamp",
+                             "global_run_timestamp", "prompt_output_dir", "screenshots_dir", "viewports_to_test", "single_navigation",
+                             "current_viewport_name", "page_title", "lighthouse_path", "lighthouse_backend", "lighthouse_cache")
+
+    def _isolated_copy(self, driver):
+        # Same configuration, different browser, built like a fresh analyzer for a page that is already loaded. Copies run
+        # on concurrent threads; _merge_isolated_copy() folds their logs and deferred findings back in once they are done.
+        # The watchdog stays with the parent (it already covers helper browsers).
+        isolated = object.__new__(type(self))
+        for attr in self.ISOLATED_SHARED_ATTRS: setattr(isolated, attr, getattr(self, attr))
+        isolated.driver, isolated._owns_driver, isolated.watchdog = driver, False, None
+        isolated.helper_driver_source, isolated._own_helper_drivers = None, []
+        isolated.http_server = isolated.http_thread = isolated.server_port = isolated.local_server_url_for_lighthouse = None
+        isolated.check_durations_s, isolated.lighthouse_queue_waits_s, isolated.interaction_durations_s = {}, [], {}
+        isolated.page_state_log, isolated.viewport_navigation_log, isolated._deferred_findings = [], [], []
+        isolated.current_prompt_scores = copy.deepcopy(self.current_prompt_scores)
+        isolated.technical_checks_completed_flags = dict(self.technical_checks_completed_flags)
+        isolated._adherence_checks_passed_this_prompt = dict(getattr(self, '_adherence_checks_passed_this_prompt', {}))
+        isolated._background_cache = EffectiveBackgroundCache()
+        if driver is self.driver: # Carries on with the page the parent has loaded
+            isolated._page_loaded, isolated._page_dirty = self._page_loaded, self._page_dirty
+            isolated._script_timeout_s, isolated._page_snapshot = self._script_timeout_s, self._page_snapshot
+        else: # Page not loaded in that browser yet
+            isolated._page_loaded, isolated._page_dirty = False, True
+            isolated._script_timeout_s, isolated._page_snapshot = WEBDRIVER_SCRIPT_TIMEOUT_S, None
+        return isolated
+
+    def _merge_isolated_copy(self, isolated):
+        for label, seconds in isolated.check_durations_s.items():
+            self.check_durations_s[label] = round(self.check_durations_s.get(label, 0.0) + seconds, 3)
+        self.page_state_log.extend(isolated.page_state_log)
+        self.viewport_navigation_log.extend(isolated.viewport_navigation_log)
+        for args, kwargs in isolated._deferred_findings: self._add_finding(*args, **kwargs)
+
+    def _run_isolated_interactions(self, applicable_checks, groups):
+        # Every group starts from the page as loaded. Each browser works through the shared queue of groups, longest
+        # first, getting its page back between groups via _refresh_page(); the main page is put back once they are done.
+        # Returns {position: Future of (passed, msg, data)} and {position: duration_s}.
+        results = {pos: Future() for group in groups for pos in group} # Read-only for the threads; Futures are thread-safe
+        drivers = [self.driver] + self._helper_drivers(min(len(groups), INTERACTION_PARALLELISM) - 1)
+        if not self._page_snapshot: self._capture_page_state()
+        pending = queue.Queue()
+        step_count = lambda group: sum(len(applicable_checks[pos].get("sequence", [])) for pos in group)
+        for group_index, group in sorted(enumerate(groups), key=lambda item: -step_count(item[1])): pending.put((group_index, group))
+        copies = [self._isolated_copy(driver) for driver in drivers]
+        print(f"  Running {len(groups)} interaction group(s) on fresh pages across {len(drivers)} browser(s).")
+
+        def drain(browser_index):
+            isolated = copies[browser_index]
+            while True:
+                try: group_index, group = pending.get_nowait()
+                except queue.Empty: return
+                execution = {"isolated": True, "group": group_index, "browser": "main" if browser_index == 0 else f"helper {browser_index}"}
+                try:
+                    if isolated._page_dirty: execution["page"] = isolated._refresh_page(f"interaction group {group_index}")
+                    for pos in group:
+                        started = time.monotonic()
+                        try:
+                            passed, msg, data = isolated._execute_and_verify_interaction(applicable_checks[pos])
+                            results[pos].set_result((passed, msg, {**(data or {}), "execution": execution}))
+                        except Exception as e: results[pos].set_exception(e)
+                        isolated.interaction_durations_s[pos] = round(time.monotonic() - started, 3)
+                except Exception as e: # The group's page could not be loaded (or the browser died)
+                    for pos in group:
+                        if not results[pos].done(): results[pos].set_exception(e)
+
+        with ThreadPoolExecutor(len(drivers), thread_name_prefix=f"interactions-{self.prompt_id}") as pool: list(pool.map(drain, range(len(drivers))))
+        main = copies[0]
+        if main._page_dirty: # The static checks that follow need the page as loaded
+            try: main._refresh_page("main page after interactions")
+            except WebDriverException as e: print(f"  WARN ({self.prompt_id}@{self.current_viewport_name}): Could not reset the page after interactions ({str(e)[:100]})."); self._page_dirty = True
+            self._background_cache.clear()
+        self._page_snapshot, self._script_timeout_s = main._page_snapshot, main._script_timeout_s # Same session as ours
+        durations_s = {}
+        for isolated in copies: self._merge_isolated_copy(isolated); durations_s.update(isolated.interaction_durations_s)
+        return results, durations_s
+
+    def _capture_page_state(self):
+        self._page_snapshot = None
+        if not PAGE_STATE_RESTORE: return None
+        try: self._page_snapshot = self.driver.execute_script(PAGE_STATE_CAPTURE_SCRIPT, PAGE_STATE_MAX_MUTATIONS)
+        except WebDriverException as e: print(f"  WARN ({self.prompt_id}@{self.current_viewport_name}): Page state snapshot failed ({str(e)[:100]}); interactions will reload instead.")
+        return self._page_snapshot
+
+    def _restore_page_state(self, context):
+        # Reverts the page to the snapshot in place; False when that cannot be done (and verified) for this page
+        started = time.monotonic()
+        try: outcome = self.driver.execute_script(PAGE_STATE_RESTORE_SCRIPT, PAGE_STATE_MAX_MUTATIONS) or {}
+        except WebDriverException as e: outcome = {"restored": False, "reason": f"restore script failed: {str(e)[:100]}"}
+        restored = bool(outcome.get("restored"))
+        if restored: self._page_dirty = False; self._background_cache.clear()
+        else: print(f"  INFO ({self.prompt_id}@{self.current_viewport_name}): Page state not restored for {context}: {outcome.get('reason')}.")
+        self.page_state_log.append({"viewport": self.current_viewport_name, "context": context, "mode": "restore", "restored": restored,
+                                    "mutations_reverted": outcome.get("mutations"), "reason": outcome.get("reason"), "duration_s": round(time.monotonic() - started, 3)})
+        return restored
+
+    def _refresh_page(self, context):
+        # Brings the current tab back to the state it had right after loading: a snapshot restore where the page allows
+        # it, otherwise a reload at the current viewport (followed by a new snapshot). Returns "restored" or "reloaded".
+        if self._page_snapshot and self._restore_page_state(context):
+            self._wait_for_page_settled(ACTION_SETTLE_MAX_WAIT_S, context=f"{context} restore") # Timers/transitions the revert may kick off
+            return "restored"
+        started = time.monotonic()
+        width, height = self.viewports_to_test.get(self.current_viewport_name, (None, None))
+        if width:
+            self.driver.set_window_size(width, height)
+            if self.single_navigation: self._emulate_viewport(width, height)
+        self.driver.get(self.selenium_uri)
+        WebDriverWait(self.driver, 15).until(lambda d: d.execute_script('return document.readyState') == 'complete')
+        self._wait_for_page_settled(context=f"{context} reload")
+        self._page_dirty = False; self._background_cache.clear()
+        self.page_state_log.append({"viewport": self.current_viewport_name, "context": context, "mode": "reload", "duration_s": round(time.monotonic() - started, 3)})
+        self._capture_page_state()
+        return "reloaded"
+
+    def _probe_adherence_checks(self, check_configs):
+        # One ADHERENCE_PROBE_SCRIPT call for a run of static checks; None entries make a check look its element up itself
+        def selector_probe(sel_config): return {"selector": sel_config.get("selector"), "selector_type": sel_config.get("selector_type")}
+        probes = []
+        for config in check_configs:
+            if config.get("type") == "element_order":
+                probes.append({"order": [selector_probe(s if isinstance(s, dict) else {"selector": s}) for s in config.get("selectors_in_order", [])]})
+            else: probes.append({**selector_probe(config), "text": config.get("type") == "text_content",
+                                 "attribute": config.get("attribute_name") if config.get("type") == "attribute_value" else None,
+                                 "css_property": config.get("property_name") if config.get("type") == "css_property" else None})
+        try: all_facts = self.driver.execute_script(ADHERENCE_PROBE_SCRIPT, probes)
+        except WebDriverException as e:
+            print(f"    WARN: Batched adherence probe failed ({str(e)[:100]}); checking elements one by one.")
+            return [None] * len(check_configs)
+        for config, facts in zip(check_configs, all_facts):
+            for item in (facts.get("items", []) if "items" in facts else [facts]):
+                if item.get("error"): print(f"    WARN: Error finding element for '{config.get('name')}': {item['error']}")
+        return all_facts
+
+    def _verify_element_presence(self, config, facts=None):
+        if facts is None:
+            element = self._find_element_by_config(config)
+            is_present = element is not None
+            is_visible = is_present and element.is_displayed()
+        else: is_present, is_visible = facts["present"], facts["present"] and facts["visible"]
         should_not_exist = config.get("should_not_exist", False)
         passed, msg = (False, "")
 
@@ -834,41 +2268,55 @@ class UIBenchmarkAnalyzer:
             else: msg = f"Element '{config.get('selector')}' NOT found."
         return passed, msg, {"selector": config.get("selector"), "is_present": is_present, "is_visible": is_visible if is_present else False}
 
-    def _verify_element_order(self, config):
+    def _verify_element_order(self, config, facts=None):
+        # Consecutive selectors must follow each other in document order. "nesting" decides pairs where one element
+        # contains the other: "document_order" (default; an ancestor comes before its descendants), "allow" (nested
+        # pairs pass either way) or "fail" (expected elements must be disjoint, e.g. sibling sections).
         selectors_in_order = config.get("selectors_in_order", [])
         if len(selectors_in_order) < 2: return False, "Order check needs >= 2 selectors.", None
-        elements_found = []
-        for sel_config_item in selectors_in_order:
-            sel_conf = sel_config_item if isinstance(sel_config_item, dict) else {"selector": sel_config_item}
-            el = self._find_element_by_config(sel_conf)
-            if not el or not el.is_displayed(): return False, f"Order element '{sel_conf.get('selector')}' not found/visible.", None
-            elements_found.append(el)
-        try:
-            source_indices = self.driver.execute_script("return Array.from(arguments).map(el => Array.from(document.querySelectorAll('*')).indexOf(el));", *elements_found)
-            for i in range(1, len(source_indices)):
-                if source_indices[i] < source_indices[i-1] and source_indices[i] != -1 and source_indices[i-1] != -1 :
-                    try:
-                        elements_found[i].find_element(By.XPATH, f".//*[self::node()[name()='{elements_found[i-1].tag_name}' and @id='{elements_found[i-1].get_attribute('id')}']]")
-                        if elements_found[i-1].id == elements_found[i].id: continue
-                    except NoSuchElementException:
-                        pass
-                    except StaleElementReferenceException: return False, "Stale element during order parent check.", None
-
-                    return False, "Elements not in expected DOM source order.", {"indices": source_indices, "selectors": [get_element_desc(e) for e in elements_found]}
-            return True, "Elements in expected DOM source order.", {"indices": source_indices}
-        except WebDriverException as e: return False, f"Error getting element order: {e}", None
-
-    def _verify_element_count(self, config):
-        elements = self._find_element_by_config({**config, "find_multiple": True})
-        actual_count = len(elements) if elements else 0
+        nesting_policy = config.get("nesting", "document_order").lower()
+        if nesting_policy not in ("document_order", "allow", "fail"): return False, f"Unknown nesting policy '{nesting_policy}'.", None
+        if facts is None:
+            elements_found = []
+            for sel_config_item in selectors_in_order:
+                sel_conf = sel_config_item if isinstance(sel_config_item, dict) else {"selector": sel_config_item}
+                el = self._find_element_by_config(sel_conf)
+                if not el or not el.is_displayed(): return False, f"Order element '{sel_conf.get('selector')}' not found/visible.", None
+                elements_found.append(el)
+            try: relations = self.driver.execute_script(ELEMENT_ORDER_SCRIPT, *elements_found)
+            except WebDriverException as e: return False, f"Error getting element order: {e}", None
+            descs = None
+        else:
+            for sel_config_item, item in zip(selectors_in_order, facts["items"]):
+                if not item["present"] or not item["visible"]:
+                    return False, f"Order element '{sel_config_item.get('selector') if isinstance(sel_config_item, dict) else sel_config_item}' not found/visible.", None
+            relations, descs = facts["relations"], [item["desc"] for item in facts["items"]]
+        in_order = {"same", "after"} | {"document_order": {"inside"}, "allow": {"inside", "contains"}, "fail": set()}[nesting_policy]
+        out_of_order = [i + 1 for i, relation in enumerate(relations) if relation not in in_order]
+        if out_of_order:
+            descs = descs or [get_element_desc(e) for e in elements_found]
+            relation_words = {"before": "before", "inside": "nested inside", "contains": "wrapping"}
+            pair_msgs = [f"{descs[i]} is {relation_words.get(relations[i-1], relations[i-1])} {descs[i-1]}" for i in out_of_order]
+            return False, f"Elements not in expected DOM source order ({'; '.join(pair_msgs)[:300]}).", {"relations": relations, "nesting": nesting_policy, "selectors": descs}
+        return True, "Elements in expected DOM source order.", {"relations": relations, "nesting": nesting_policy}
+
+    def _verify_element_count(self, config, facts=None):
+        if facts is None:
+            elements = self._find_element_by_config({**config, "find_multiple": True})
+            actual_count = len(elements) if elements else 0
+        else: actual_count = facts["count"]
         passed, msg_part, _ = self._compare_counts(actual_count, config.get("expected_count"), config.get("comparison", "equals"), config.get("min_count"), config.get("max_count"))
         msg = f"Count is {actual_count} ({msg_part})."
         return passed, msg, {"actual": actual_count, "expected_str": msg_part}
 
-    def _verify_text_content(self, config):
-        element = self._find_element_by_config(config)
-        if not element or not element.is_displayed(): return False, f"Element '{config.get('selector')}' not found/visible for text.", None
-        actual_text = element.text.strip()
+    def _verify_text_content(self, config, facts=None):
+        if facts is None:
+            element = self._find_element_by_config(config)
+            if not element or not element.is_displayed(): return False, f"Element '{config.get('selector')}' not found/visible for text.", None
+            actual_text = element.text.strip()
+        else:
+            if not facts["present"] or not facts["visible"]: return False, f"Element '{config.get('selector')}' not found/visible for text.", None
+            actual_text = (facts.get("text") or "").strip()
         expected_text_raw = config.get("expected_text", "")
         expected_text_stripped = str(expected_text_raw).strip()
         match_type = config.get("match_type", "exact").lower()
@@ -887,12 +2335,12 @@ class UIBenchmarkAnalyzer:
         msg = f"Text (type: {match_type}{'' if case_sensitive else ',i'}). Expected '{expected_text_stripped[:50]}...', Actual '{actual_text[:50]}...'"
         return passed, msg, {"actual": actual_text, "expected": expected_text_stripped, "match_type":match_type}
 
-    def _verify_attribute_value(self, config):
-        element = self._find_element_by_config(config)
-        if not element: return False, f"Element '{config.get('selector')}' not found for attribute.", None
+    def _verify_attribute_value(self, config, facts=None):
+        element = self._find_element_by_config(config) if facts is None else None
+        if not (facts["present"] if facts is not None else element): return False, f"Element '{config.get('selector')}' not found for attribute.", None
         attr_name = config.get("attribute_name")
         expected_value = config.get("expected_value")
-        actual_value = element.get_attribute(attr_name)
+        actual_value = element.get_attribute(attr_name) if facts is None else facts.get("attribute")
         passed = False
 
         if isinstance(expected_value, bool):
@@ -911,12 +2359,13 @@ class UIBenchmarkAnalyzer:
         msg = f"Attr '{attr_name}'. Expected: '{expected_value}', Actual: '{actual_value}'."
         return passed, msg, {"actual": actual_value, "expected": expected_value, "attr_name": attr_name}
 
-    def _verify_css_property(self, config):
-        element = self._find_element_by_config(config)
-        if not element or not element.is_displayed(): return False, f"Element '{config.get('selector')}' not found/visible for CSS.", None
+    def _verify_css_property(self, config, facts=None):
+        element = self._find_element_by_config(config) if facts is None else None
+        is_visible = (facts["present"] and facts["visible"]) if facts is not None else (element is not None and element.is_displayed())
+        if not is_visible: return False, f"Element '{config.get('selector')}' not found/visible for CSS.", None
         prop_name = config.get("property_name")
         expected_val_str = str(config.get("expected_value","")).strip()
-        try: actual_val_str = element.value_of_css_property(prop_name).strip()
+        try: actual_val_str = (element.value_of_css_property(prop_name) if facts is None else facts["css"]).strip()
         except: return False, f"Could not get CSS property '{prop_name}'.", None
         passed = False
 
@@ -943,7 +2392,7 @@ class UIBenchmarkAnalyzer:
         elif action_type == "clear_local_storage_key": self.driver.execute_script(f"localStorage.removeItem('{action_config.get('key')}');")
         elif action_type == "set_local_storage_key": self.driver.execute_script(f"localStorage.setItem('{action_config.get('key')}', '{action_config.get('value')}');")
         else: raise ValueError(f"Unknown setup/cleanup action type: {action_type}")
-        time.sleep(0.2)
+        self._wait_for_page_settled(ACTION_SETTLE_MAX_WAIT_S, context=f"'{action_type}' action")
 
     def _execute_action_on_element(self, action_config, element_to_act_on):
         action_type = action_config.get("type", "click").lower()
@@ -1095,8 +2544,99 @@ class UIBenchmarkAnalyzer:
         msg = f"Actual: {actual_count}, Expected: {expected_msg_part}"
         return passed, msg, {"actual": actual_count, "expected_str": expected_msg_part}
 
+    def _outcome_watch_spec(self, o_config):
+        # In-page view of an outcome for OUTCOME_WATCH_INSTALL_SCRIPT: what to observe, plus a predicate where the rule in
+        # _verify_single_outcome can be mirrored exactly (otherwise the watcher just signals changes). None = poll instead.
+        outcome_type = o_config.get("outcome_type")
+        if o_config.get("find_multiple"): return None # The verifier then sees a list, not an element
+        target = {"selector": o_config.get("element_selector"), "selector_type": o_config.get("element_selector_type")}
+        expected_vis = str(o_config.get("expected_visibility", "visible")).lower()
+        presence = lambda present, shown: {"observe": "presence", **target, "predicate": {"kind": "presence", "present": present, "shown": shown}}
+        if outcome_type == "element_does_not_exist": return presence(False, None)
+        if outcome_type in ("element_exists", "visibility_change") and expected_vis not in ("visible", "hidden"): return {"observe": "presence", **target, "predicate": None}
+        if outcome_type == "element_exists": return presence(True, (expected_vis == "visible") if "expected_visibility" in o_config else None)
+        if outcome_type == "visibility_change": return presence(None, expected_vis == "visible")
+        if outcome_type == "class_change":
+            if "expected_class_present" not in o_config and "expected_class_absent" not in o_config: return None
+            return {"observe": "attribute", **target, "attribute": "class", "predicate": {"kind": "classes", "present": o_config.get("expected_class_present"), "absent": o_config.get("expected_class_absent")}}
+        if outcome_type == "attribute_change":
+            attr_name, expected_value = o_config.get("attribute_name"), o_config.get("expected_value")
+            if not attr_name: return None
+            if isinstance(expected_value, bool): predicate = {"mode": "bool", "expected": expected_value}
+            elif expected_value is None: predicate = {"mode": "null", "expected": None}
+            elif attr_name.lower() == "class" and (o_config.get("class_contains_all") or o_config.get("class_contains_any")):
+                predicate = {"mode": "all" if o_config.get("class_contains_all") else "any", "expected": expected_value if isinstance(expected_value, list) else [expected_value]}
+            else: predicate = {"mode": "equals", "expected": str(expected_value)}
+            return {"observe": "attribute", **target, "attribute": attr_name, "predicate": {"kind": "attribute", **predicate}}
+        if outcome_type == "new_element_count":
+            return {"observe": "count", **target, "child_selector": o_config.get("child_element_selector"), "child_selector_type": o_config.get("child_element_selector_type", "css"),
+                    "predicate": {"kind": "count", "expected": o_config.get("expected_count"), "comparison": str(o_config.get("comparison", "equals")).lower(),
+                                  "min": o_config.get("min_count"), "max": o_config.get("max_count")}}
+        if outcome_type == "text_content_change": return {"observe": "text", **target, "predicate": None}
+        if outcome_type == "css_property_change": return {"observe": "css", **target, "property_name": o_config.get("property_name"), "predicate": None}
+        if outcome_type == "url_change": return {"observe": "url", "predicate": None}
+        return None # custom_script_evaluates_true, animation_or_transition_ends: verified as before
+
+    def _install_outcome_watchers(self, outcome_configs):
+        # Must run before the step's action; returns the watcher index per outcome (None = polled), or None if unavailable
+        specs = [self._outcome_watch_spec(o_config) for o_config in outcome_configs]
+        if not any(specs): return None
+        try: return self.driver.execute_script(OUTCOME_WATCH_INSTALL_SCRIPT, specs)
+        except WebDriverException as e:
+            print(f"    WARN: Could not install outcome watchers ({str(e)[:100]}); polling instead.")
+            return None
+
+    def _poll_outcome(self, o_config, trigger_el, wait_s):
+        try:
+            WebDriverWait(self.driver, wait_s, 0.1).until(lambda d: self._verify_single_outcome(o_config, trigger_el)[0])
+            return self._verify_single_outcome(o_config, trigger_el)
+        except TimeoutException:
+            _, o_msg, o_data = self._verify_single_outcome(o_config, trigger_el)
+            return False, f"Timeout. Last state: {o_msg}", o_data
+
+    def _await_outcome(self, o_config, trigger_el, watch_index, wait_s):
+        # Waits in the page for the watcher to fire, then verifies once with the regular verifier, which has the last
+        # word. Change-only watchers are verified up front too, since the outcome may already hold.
+        spec = self._outcome_watch_spec(o_config)
+        mode = "predicate" if spec.get("predicate") else "change"
+        deadline = time.monotonic() + wait_s
+        previous_timeout_s = self._script_timeout_s # The wait script must outlive wait_s; only for this wait
+        try:
+            if wait_s + 5 > previous_timeout_s:
+                self._script_timeout_s = wait_s + 5; self.driver.set_script_timeout(self._script_timeout_s)
+            return self._await_outcome_signal(o_config, trigger_el, watch_index, wait_s, deadline, mode)
+        finally:
+            if self._script_timeout_s != previous_timeout_s:
+                try: self.driver.set_script_timeout(previous_timeout_s)
+                except WebDriverException: pass # Browser gone; the pool resets the timeout on reuse
+                self._script_timeout_s = previous_timeout_s
+
+    def _await_outcome_signal(self, o_config, trigger_el, watch_index, wait_s, deadline, mode):
+        timing = {"waited_ms": None, "reaction_ms": None, "verifications": 0}
+        def verify():
+            timing["verifications"] += 1
+            timing["waited_ms"] = round((time.monotonic() - deadline + wait_s) * 1000, 1)
+            return self._verify_single_outcome(o_config, trigger_el)
+        if mode == "change":
+            o_passed, o_msg, o_data = verify()
+            if o_passed: return o_passed, o_msg, o_data, timing
+        while True:
+            remaining_s = max(0.0, deadline - time.monotonic())
+            signal = self.driver.execute_async_script(OUTCOME_WATCH_WAIT_SCRIPT, watch_index, int(remaining_s * 1000), mode)
+            if signal.get("lost"): # New document: the watchers went with the old one
+                timing["watchers_lost"] = True
+                return (*self._poll_outcome(o_config, trigger_el, max(0.0, deadline - time.monotonic())), timing)
+            o_passed, o_msg, o_data = verify()
+            if o_passed:
+                timing["reaction_ms"], timing["already_met"] = signal.get("reaction_ms"), signal.get("already_met", False)
+                return o_passed, o_msg, o_data, timing
+            if not signal.get("met") or time.monotonic() >= deadline: return False, f"Timeout. Last state: {o_msg}", o_data, timing
+            mode = "change" # The watcher's view matched but the verifier's did not: wait for the page to change again
+
     def _execute_and_verify_interaction(self, interaction_config):
-        overall_passed, log_msgs = True, []
+        overall_passed, log_msgs, outcome_timings = True, [], []
+        self._page_dirty = True # Next viewport must start from a freshly loaded page
+        self._background_cache.clear() # The interaction may restyle or replace nodes
         for setup_action_config in interaction_config.get("initial_setup", []):
             try: self._perform_setup_cleanup_action(setup_action_config)
             except Exception as e: return False, f"Interaction setup failed: {e}", {"setup_error": str(e)}
@@ -1111,6 +2651,8 @@ class UIBenchmarkAnalyzer:
             action_config = step_config.get("action")
             if not action_config or not action_config.get("type"): log_msgs.append(f"  [FAIL] Action config missing."); overall_passed = False; break
 
+            expected_outcomes = step_config.get("expected_outcomes", [])
+            watch_indices = self._install_outcome_watchers(expected_outcomes) if OUTCOME_WATCHERS and expected_outcomes else None
             try:
                 self._execute_action_on_element(action_config, trigger_el)
                 log_msgs.append(f"  Action '{action_config.get('type')}' on {get_element_desc(trigger_el)}.")
@@ -1118,16 +2660,22 @@ class UIBenchmarkAnalyzer:
 
             wait_s = step_config.get("wait_for_outcome_ms", 500) / 1000.0
             all_step_outcomes_passed = True
-            for o_idx, o_config in enumerate(step_config.get("expected_outcomes", [])):
+            for o_idx, o_config in enumerate(expected_outcomes):
                 o_name = o_config.get("name", f"Outcome {o_idx+1}"); o_passed, o_msg, o_data = (False, "", None)
+                watch_index = watch_indices[o_idx] if watch_indices else None
                 try:
-                    WebDriverWait(self.driver, wait_s, 0.1).until(lambda d: self._verify_single_outcome(o_config, trigger_el)[0])
-                    o_passed, o_msg, o_data = self._verify_single_outcome(o_config, trigger_el)
-                except TimeoutException: _, o_msg, o_data = self._verify_single_outcome(o_config, trigger_el); o_msg = f"Timeout. Last state: {o_msg}"
+                    if watch_index is None: o_passed, o_msg, o_data = self._poll_outcome(o_config, trigger_el, wait_s)
+                    else:
+                        o_passed, o_msg, o_data, o_timing = self._await_outcome(o_config, trigger_el, watch_index, wait_s)
+                        outcome_timings.append({"step": step_name, "outcome": o_name, "passed": o_passed, **o_timing})
+                        if o_timing.get("reaction_ms") is not None: o_msg += f" (reacted in {o_timing['reaction_ms']:.0f} ms)"
                 except Exception as e_o_v: o_msg = f"Error verifying: {e_o_v}"
 
                 log_msgs.append(f"    [{'PASS' if o_passed else 'FAIL'}] {o_name}: {o_msg}")
                 if not o_passed: all_step_outcomes_passed = False
+            if watch_indices:
+                try: self.driver.execute_script("if (window.__uigenevalOutcomeWatch) window.__uigenevalOutcomeWatch.dispose();")
+                except WebDriverException: pass
             if not all_step_outcomes_passed: overall_passed = False; break
             log_msgs.append(f"--- Step {step_name} Passed ---")
 
@@ -1135,7 +2683,7 @@ class UIBenchmarkAnalyzer:
             try: self._perform_setup_cleanup_action(cleanup_action_config)
             except Exception as e: log_msgs.append(f"  WARN: Cleanup failed: {e}")
         final_msg = "All interaction steps/outcomes verified." if overall_passed else "One or more interaction steps/outcomes failed."
-        return overall_passed, final_msg, {"interaction_log": log_msgs}
+        return overall_passed, final_msg, {"interaction_log": log_msgs, "outcome_timings": outcome_timings}
 
     def run_single_prompt_analysis(self):
         print(f"--- Starting Analysis for Prompt: {self.prompt_id} (File: {self.file_path.name}) ---")
@@ -1145,8 +2693,10 @@ class UIBenchmarkAnalyzer:
 
         for vp_name, (vp_width, vp_height) in self.viewports_to_test.items():
             try:
-                self._load_page_at_viewport(vp_name, vp_width, vp_height)
+                self._enter_phase("load")
+                with self._timed_check(f"page_load:{vp_name}"): self._load_page_at_viewport(vp_name, vp_width, vp_height)
                 page_load_ok_once = True
+                self._enter_phase("technical")
 
                 run_page_level_checks = not self.technical_checks_completed_flags.get("any_page_checks_done", False)
                 if vp_name.lower() == "desktop" and not self.technical_checks_completed_flags.get("desktop_page_checks_done"):
@@ -1155,32 +2705,38 @@ class UIBenchmarkAnalyzer:
 
 
                 if run_page_level_checks:
-                    self.check_html_structure_semantics()
-                    self.check_css_quality()
-                    self.check_javascript_health()
+                    with self._timed_check("html_structure_semantics"): self.check_html_structure_semantics()
+                    with self._timed_check("css_quality"): self.check_css_quality()
+                    with self._timed_check("javascript_health"): self.check_javascript_health()
                     self.technical_checks_completed_flags["any_page_checks_done"] = True
 
-                self.check_accessibility_axe()
-                self.check_rendered_color_contrast()
-                self.check_responsiveness_viewport_scroll()
+                with self._timed_check("accessibility_axe"): self.check_accessibility_axe()
+                with self._timed_check("color_contrast"): self.check_rendered_color_contrast()
+                with self._timed_check("responsiveness"): self.check_responsiveness_viewport_scroll()
 
                 lh_preset_key = vp_name.lower()
                 # Only run Lighthouse once per standard viewport type (desktop/mobile) to avoid redundant checks
                 # if multiple custom viewports of the same "type" are defined.
                 if lh_preset_key in ["desktop", "mobile"] and self.lighthouse_path and \
                    not self.technical_checks_completed_flags.get(f"lighthouse_{lh_preset_key}_done"):
-                    self.check_performance_lighthouse()
+                    self._enter_phase("lighthouse")
+                    with self._timed_check(f"lighthouse:{lh_preset_key}"): self.check_performance_lighthouse()
                     self.technical_checks_completed_flags[f"lighthouse_{lh_preset_key}_done"] = True
                 elif self.lighthouse_path and lh_preset_key not in ["desktop", "mobile"] and \
                      not self.technical_checks_completed_flags.get(f"lighthouse_custom_{lh_preset_key}_done"): # For custom viewports
                     print(f"  INFO: Running Lighthouse for custom viewport '{lh_preset_key}'.")
-                    self.check_performance_lighthouse()
+                    self._enter_phase("lighthouse")
+                    with self._timed_check(f"lighthouse:{lh_preset_key}"): self.check_performance_lighthouse()
                     self.technical_checks_completed_flags[f"lighthouse_custom_{lh_preset_key}_done"] = True
 
 
+                self._enter_phase("adherence")
                 self.check_prompt_adherence()
 
             except (TimeoutException, WebDriverException) as e_vp_critical:
+                if self.watchdog and self.watchdog.expired_phase:
+                    print(f"  Prompt {self.prompt_id} timed out in phase '{self.watchdog.expired_phase}' at viewport {vp_name}. Abandoning remaining viewports.")
+                    break
                 print(f"  CRITICAL ERROR for prompt {self.prompt_id} at viewport {vp_name}: {type(e_vp_critical).__name__}. Skipping further checks for this viewport.")
                 continue
 
@@ -1214,7 +2770,7 @@ class UIBenchmarkAnalyzer:
         )
 
         prompt_report = {
-            "prompt_id": self.prompt_id, "html_file": str(self.file_path.name),
+            "prompt_id": self.prompt_id, "html_file": str(self.file_path.name), "fingerprint": self.fingerprint,
             "prompt_description": self.prompt_config.get("prompt_description", "N/A"),
             "page_title": self.page_title, "analysis_timestamp_for_this_prompt": self.run_timestamp,
             "scores": {
@@ -1237,21 +2793,165 @@ class UIBenchmarkAnalyzer:
                 }
             },
             "page_load_errors": self.current_prompt_scores["page_load_errors"],
+            "viewport_navigation": self.viewport_navigation_log,
+            "page_state_resets": self.page_state_log,
+            "check_durations_s": self.check_durations_s,
             "output_directory_for_this_prompt": str(self.prompt_output_dir)
         }
-        with open(self.prompt_output_dir / f"{self.prompt_id}_detailed_report.json", "w", encoding='utf-8') as f:
+        with self._timed_check("report_write"), open(self.prompt_output_dir / f"{self.prompt_id}_detailed_report.json", "w", encoding='utf-8') as f:
             json.dump(prompt_report, f, indent=2)
         return prompt_report
 
     def close(self):
         self._stop_local_server()
-        if hasattr(self, 'driver') and self.driver:
-            self.driver.quit()
+        for helper in getattr(self, '_own_helper_drivers', []):
+            try: helper.quit()
+            except Exception: pass
+        if hasattr(self, 'driver') and self.driver and self._owns_driver:
+            try: self.driver.quit()
+            except Exception: pass # Already gone, e.g. killed by the watchdog
             print(f"\nWebDriver closed for prompt {self.prompt_id}.")
 
 
+def compute_prompt_fingerprint(html_file, prompt_config_obj):
+    # Everything that can change a prompt's report: page + local assets, its config entry, analyzer version, scoring constants
+    digest = update_digest_with_page(hashlib.sha256(), html_file)
+    scoring = {"analyzer_version": ANALYZER_VERSION, "default_viewports": DEFAULT_VIEWPORTS, "lighthouse_categories": LIGHTHOUSE_CATEGORIES,
+               "tq_max_points": TECHNICAL_QUALITY_MAX_POINTS_CONFIG, "weights": [WEIGHT_TECHNICAL_QUALITY, WEIGHT_PROMPT_ADHERENCE]}
+    digest.update(json.dumps([prompt_config_obj, scoring], sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def find_previous_prompt_reports(output_base_dir, model_name, exclude_dir=None):
+    # prompt_id -> detailed report path of its newest successful analysis. Looks at earlier runs of this model in
+    # output_base_dir and in sibling run directories (the orchestrator's {challenge}/run_<timestamp>/ layout).
+    output_base_dir = Path(output_base_dir)
+    summaries = set(output_base_dir.glob(f"{model_name}_*/MASTER_BENCHMARK_SUMMARY.json"))
+    summaries.update(output_base_dir.parent.glob(f"*/{model_name}_*/MASTER_BENCHMARK_SUMMARY.json"))
+    previous_reports = {}
+    summaries = [p for p in summaries if re.fullmatch(rf"{re.escape(model_name)}_\d{{8}}-\d{{6}}", p.parent.name)] # Not "<model>_v2_..."
+    for summary_path in sorted(summaries, key=lambda p: p.stat().st_mtime, reverse=True):
+        if exclude_dir and summary_path.parent.resolve() == Path(exclude_dir).resolve(): continue
+        try:
+            with open(summary_path, 'r', encoding='utf-8') as f: summary = json.load(f)
+        except (OSError, ValueError): continue
+        for entry in summary.get("individual_prompt_results", []):
+            prompt_id, report_dir = entry.get("prompt_id"), entry.get("report_directory")
+            if entry.get("status") != "SUCCESS" or not report_dir or prompt_id in previous_reports: continue
+            report_path = Path(report_dir) / f"{prompt_id}_detailed_report.json"
+            if report_path.is_file(): previous_reports[prompt_id] = report_path
+    return previous_reports
+
+def reuse_previous_prompt_report(previous_report_path, fingerprint, current_run_output_dir, run_timestamp):
+    # Returns the report carried over into this run, or None if the previous one is stale
+    try:
+        with open(previous_report_path, 'r', encoding='utf-8') as f: previous_report = json.load(f)
+    except (OSError, ValueError): return None
+    if previous_report.get("fingerprint") != fingerprint: return None
+    source_dir = previous_report_path.parent
+    target_dir = Path(current_run_output_dir) / f"{previous_report['prompt_id']}_{run_timestamp}"
+    def link_or_copy(src, dst):
+        try: os.link(src, dst)
+        except OSError: shutil.copy2(src, dst)
+    shutil.copytree(source_dir, target_dir, copy_function=link_or_copy, dirs_exist_ok=True) # Hard links: assets cost no space
+    previous_report["output_directory_for_this_prompt"] = str(target_dir)
+    previous_report["reused_from"] = previous_report.get("reused_from") or str(source_dir)
+    previous_report.setdefault("status", "SUCCESS")
+    report_path = target_dir / previous_report_path.name
+    tmp_report_path = report_path.with_name(f"{report_path.name}.tmp")
+    with open(tmp_report_path, "w", encoding='utf-8') as f: json.dump(previous_report, f, indent=2)
+    os.replace(tmp_report_path, report_path) # Replaces the hard link instead of writing through to the old run
+    return previous_report
+
+
+def make_run_event(event_type, **fields):
+    # One line of the run's JSON-lines event log
+    return {"ts": round(time.time(), 3), "event": event_type, "pid": os.getpid(), **fields}
+
+def emit_worker_event(event_type, **fields):
+    if _WORKER_EVENT_QUEUE is None: return
+    try: _WORKER_EVENT_QUEUE.put_nowait(make_run_event(event_type, **fields))
+    except Exception: pass # Progress reporting must never fail an analysis
+
+
+def slim_prompt_result(res):
+    # Just what build_model_summary reads; the per-check details stay in the prompt's detailed report on disk
+    scores = res.get("scores", {})
+    slim = {key: res.get(key) for key in ("prompt_id", "status", "error", "output_directory_for_this_prompt", "reused_from", "admission_wait_s", "duration_s")}
+    slim["attempts"] = len(res.get("analysis_attempts") or []) or None
+    slim["queue_wait_s"] = res.get("queue_wait_s")
+    slim["scores"] = {"technical_quality": {k: scores.get("technical_quality", {}).get(k, 0) for k in ("earned", "max")},
+                      "prompt_adherence": {k: scores.get("prompt_adherence", {}).get(k, 0) for k in ("earned", "max")},
+                      "overall": {"percentage_weighted": scores.get("overall", {}).get("percentage_weighted", 0)}}
+    return slim
+
+def failed_prompt_result(prompt_id, status, error):
+    return {"prompt_id": prompt_id, "status": status, "error": error,
+            "scores": {"overall": {"percentage_weighted":0}, "technical_quality": {"earned":0, "max":0}, "prompt_adherence": {"earned":0, "max":0}}}
+
+
 # NEW: Wrapper function for processing a single prompt in a separate process
 def process_single_prompt_wrapper(prompt_config_obj_tuple):
+    # Entry point for pool workers: analyzes one prompt and reports start/finish on the run's event queue
+    prompt_config_obj, html_dir_path_str = prompt_config_obj_tuple[0], prompt_config_obj_tuple[1]
+    event_fields = {"model": Path(html_dir_path_str).name, "prompt_id": prompt_config_obj.get("prompt_id")}
+    emit_worker_event("prompt_started", **event_fields)
+    start_time = time.monotonic()
+    result = analyze_prompt_with_retries(prompt_config_obj_tuple, event_fields)
+    result["duration_s"] = round(time.monotonic() - start_time, 2)
+    emit_worker_event("prompt_finished", **event_fields, status=result.get("status"), duration_s=result["duration_s"],
+                      score=result.get("scores", {}).get("overall", {}).get("percentage_weighted"), error=result.get("error"))
+    return result
+
+def analyze_prompt_with_retries(prompt_config_obj_tuple, event_fields=None):
+    # Re-runs only this prompt on a retryable status, up to PROMPT_MAX_ATTEMPTS (prompt config may set "max_attempts").
+    # Every attempt is listed in the result and the detailed report; the last attempt's outcome is what counts.
+    prompt_config_obj = prompt_config_obj_tuple[0]
+    max_attempts = max(1, int(prompt_config_obj.get("max_attempts", PROMPT_MAX_ATTEMPTS)))
+    attempts = []
+    for attempt in range(1, max_attempts + 1):
+        attempt_start = time.monotonic()
+        result = _analyze_prompt_task(prompt_config_obj_tuple)
+        attempts.append({"attempt": attempt, "status": result.get("status"), "error": result.get("error"),
+                         "duration_s": round(time.monotonic() - attempt_start, 2)})
+        if result.get("status") not in PROMPT_RETRY_STATUSES or attempt == max_attempts: break
+        backoff_s = PROMPT_RETRY_BACKOFF_S * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        print(f"[Worker PID: {os.getpid()}] Prompt {prompt_config_obj.get('prompt_id')} attempt {attempt}/{max_attempts} ended {result.get('status')}; retrying in {backoff_s:.1f}s.")
+        emit_worker_event("prompt_retry", **(event_fields or {}), attempt=attempt, status=result.get("status"), error=result.get("error"), backoff_s=round(backoff_s, 2))
+        if PROMPT_RETRY_FRESH_BROWSER and _WORKER_BROWSER_POOL: _WORKER_BROWSER_POOL.discard()
+        time.sleep(backoff_s)
+    result["analysis_attempts"] = attempts
+    if len(attempts) > 1 and result.get("output_directory_for_this_prompt"): # Retried and produced a report: record the history there too
+        report_path = Path(result["output_directory_for_this_prompt"]) / f"{result.get('prompt_id')}_detailed_report.json"
+        try:
+            with open(report_path, 'r', encoding='utf-8') as f: report = json.load(f)
+            report["analysis_attempts"] = attempts
+            tmp_report_path = report_path.with_name(f"{report_path.name}.tmp")
+            with open(tmp_report_path, "w", encoding='utf-8') as f: json.dump(report, f, indent=2)
+            os.replace(tmp_report_path, report_path) # A crash mid-write must not leave a truncated report behind
+        except (OSError, json.JSONDecodeError) as e_rep: print(f"  WARN: Could not add attempt history to {report_path}: {e_rep}")
+    return result
+
+def _analyze_prompt_task(prompt_config_obj_tuple):
+    # One attempt at a prompt, plus its timings.json (and a copy in the result for the run profile) once it got a browser
+    telemetry = {}
+    result = _run_prompt_analysis(prompt_config_obj_tuple, telemetry)
+    if telemetry.get("driver_start_s") is not None: result["timings"] = write_prompt_timings(telemetry)
+    return result
+
+def write_prompt_timings(telemetry):
+    analyzer, watchdog = telemetry.get("analyzer"), telemetry["watchdog"]
+    to_mb = lambda n: round(n / 1024 / 1024, 1) if n else None
+    timings = {"prompt_id": telemetry["prompt_id"], "model": telemetry["model"], "driver_start_s": telemetry["driver_start_s"],
+               "phases_s": watchdog.phase_durations_s, "checks_s": analyzer.check_durations_s if analyzer else {},
+               "lighthouse_queue_waits_s": analyzer.lighthouse_queue_waits_s if analyzer else [],
+               "peak_rss_mb": {"chrome": to_mb(watchdog.peak_browser_rss_bytes), "python": to_mb(python_peak_rss_bytes())}}
+    if analyzer:
+        try:
+            with open(analyzer.prompt_output_dir / "timings.json", "w", encoding='utf-8') as f: json.dump(timings, f, indent=2)
+        except OSError as e_tim: print(f"  WARN: Could not write timings.json for {telemetry['prompt_id']}: {e_tim}")
+    return timings
+
+def _run_prompt_analysis(prompt_config_obj_tuple, telemetry):
     # Unpack tuple: (prompt_config_obj, html_dir_path_str, current_run_output_dir_str, run_timestamp_str)
     prompt_config_obj, html_dir_path_str, current_run_output_dir_str, run_timestamp_str = prompt_config_obj_tuple
 
@@ -1273,20 +2973,40 @@ def process_single_prompt_wrapper(prompt_config_obj_tuple):
                 "scores": {"overall": {"percentage_weighted":0}, "technical_quality": {"earned":0, "max":0}, "prompt_adherence": {"earned":0, "max":0}}}
 
     analyzer = None
+    watchdog = PromptWatchdog(prompt_id, prompt_phase_budgets(prompt_config_obj))
+    telemetry.update(prompt_id=prompt_id, model=html_dir_path.name, watchdog=watchdog)
+    def timeout_result():
+        # The watchdog killed this worker's browser; drop it so the next prompt gets a fresh Chrome
+        if _WORKER_BROWSER_POOL: _WORKER_BROWSER_POOL.discard()
+        result = failed_prompt_result(prompt_id, "TIMEOUT", f"Phase '{watchdog.expired_phase}' exceeded its time budget.")
+        result.update({"timed_out_phase": watchdog.expired_phase, "phase_durations_s": watchdog.phase_durations_s})
+        return result
     try:
-        analyzer = UIBenchmarkAnalyzer(html_file, prompt_config_obj, current_run_output_dir, run_timestamp_str)
-        analyzer.run_single_prompt_analysis()
+        with watchdog:
+            watchdog.enter("load") # Covers a cold browser launch in acquire() too
+            driver_start = time.monotonic()
+            driver = _WORKER_BROWSER_POOL.acquire() if _WORKER_BROWSER_POOL else None
+            analyzer = UIBenchmarkAnalyzer(html_file, prompt_config_obj, current_run_output_dir, run_timestamp_str, driver=driver, lighthouse_backend=_WORKER_LIGHTHOUSE_BACKEND, lighthouse_cache=_WORKER_LIGHTHOUSE_CACHE,
+                                          page_url=static_url_for(html_file, _WORKER_STATIC_SITE), watchdog=watchdog,
+                                          helper_driver_source=_WORKER_BROWSER_POOL.acquire_helpers if _WORKER_BROWSER_POOL else None)
+            telemetry.update(analyzer=analyzer, driver_start_s=round(time.monotonic() - driver_start, 3)) # Warm acquire, or a cold launch without a pool
+            analyzer.run_single_prompt_analysis()
+        if watchdog.expired_phase: return timeout_result()
         report_data = analyzer.get_prompt_report_data()
+        report_data["phase_durations_s"] = watchdog.phase_durations_s
         # Ensure status for easier aggregation later
         if "status" not in report_data:
              report_data["status"] = "SUCCESS"
         return report_data
     except WebDriverException as e_wd:
+        if watchdog.expired_phase: return timeout_result()
         error_msg = f"WebDriver error for prompt {prompt_id} in worker {worker_pid}: {e_wd}"
         print(error_msg)
+        if _WORKER_BROWSER_POOL: _WORKER_BROWSER_POOL.discard() # Likely crashed; next prompt gets a fresh Chrome
         return {"prompt_id": prompt_id, "status": "WEBDRIVER_ERROR", "error": str(e_wd),
                 "scores": {"overall": {"percentage_weighted":0}, "technical_quality": {"earned":0, "max":0}, "prompt_adherence": {"earned":0, "max":0}}}
     except Exception as e_prompt:
+        if watchdog.expired_phase: return timeout_result()
         error_msg = f"Error analyzing prompt {prompt_id} in worker {worker_pid}: {e_prompt}"
         print(error_msg)
         # import traceback # For more detailed debugging if needed
@@ -1296,84 +3016,33 @@ def process_single_prompt_wrapper(prompt_config_obj_tuple):
     finally:
         if analyzer:
             analyzer.close()
+        if _WORKER_BROWSER_POOL: _WORKER_BROWSER_POOL.release_helpers()
         print(f"[Worker PID: {worker_pid}] Finished prompt: {prompt_id}")
 
 
-def main():
-    if len(sys.argv) < 3:
-        print("Usage: python ui_benchmark_analyzer.py <path_to_master_prompts_config.json> <path_to_html_files_directory> [output_base_dir]")
-        dummy_master_config_path = Path("dummy_prompts_benchmark_config.json")
-        if not dummy_master_config_path.exists():
-            dummy_master_prompts = { "benchmark_run_name": "Dummy Run", "prompts": [
-                { "prompt_id": "example_prompt_001", "prompt_description": "A simple page.",
-                  "viewports_to_test": {"desktop": [1920, 1080]},
-                  "adherence_checks": [{"type": "text_content", "name": "Page Title Check", "selector": "title", "selector_type": "tag_name", "expected_text": "Test Page", "points": 5}]}]}
-            with open(dummy_master_config_path, "w", encoding="utf-8") as f: json.dump(dummy_master_prompts, f, indent=2)
-            print(f"Created dummy config: {dummy_master_config_path}. Ensure 'example_prompt_001.html' exists in 'html_tests'.")
-            print(f"Run: python {sys.argv[0]} {dummy_master_config_path} ./html_tests")
-        sys.exit(1)
-
-    master_config_path = Path(sys.argv[1])
-    html_dir_path = Path(sys.argv[2]) # This is effectively {challengename}/{modelname}/
-    output_base_dir_arg = Path(sys.argv[3] if len(sys.argv) > 3 else "ui_benchmark_master_runs")
-
-    if not master_config_path.is_file(): print(f"Master config not found: {master_config_path}"); sys.exit(1)
-    if not html_dir_path.is_dir(): print(f"HTML directory not found: {html_dir_path}"); sys.exit(1)
-    try:
-        with open(master_config_path, 'r', encoding='utf-8') as f: master_config = json.load(f)
-    except Exception as e: print(f"Error loading master config: {e}"); sys.exit(1)
-
-
-    all_prompts_results = []
-
-    run_folder_name_prefix = html_dir_path.name # Should be modelname
-    if not run_folder_name_prefix or run_folder_name_prefix in ['.', '..']:
-        run_folder_name_prefix = "unknown_model_run"
-
-    run_timestamp = time.strftime('%Y%m%d-%H%M%S')
-    # This creates a directory for the current model's run, e.g., ui_benchmark_master_runs/modelname_timestamp/
-    current_run_output_dir = output_base_dir_arg / f"{run_folder_name_prefix}_{run_timestamp}"
-    current_run_output_dir.mkdir(parents=True, exist_ok=True)
-
-    prompts_to_process_configs = master_config.get("prompts", [])
-
-    # Prepare arguments for the worker function
+def plan_model_prompts(prompt_configs, html_dir_path, current_run_output_dir, run_timestamp, previous_reports=None):
+    # Worker task tuples for the prompts that need analysis, plus the reports carried over unchanged from earlier runs
     # Paths are converted to strings as a safeguard for pickling with ProcessPoolExecutor,
     # though Path objects are generally picklable in modern Python.
-    tasks_for_workers = []
-    for prompt_config_obj in prompts_to_process_configs:
+    tasks_for_workers, reused_results = [], []
+    for prompt_config_obj in prompt_configs:
+        prompt_id = prompt_config_obj.get("prompt_id")
+        html_file = Path(html_dir_path) / f"{prompt_id}.html"
+        if previous_reports and prompt_id in previous_reports and html_file.is_file():
+            reused_report = reuse_previous_prompt_report(previous_reports[prompt_id], compute_prompt_fingerprint(html_file, prompt_config_obj),
+                                                         current_run_output_dir, run_timestamp)
+            if reused_report:
+                reused_results.append(reused_report)
+                continue
         tasks_for_workers.append(
             (prompt_config_obj, str(html_dir_path), str(current_run_output_dir), run_timestamp)
         )
+    return tasks_for_workers, reused_results
 
-    print(f"Starting analysis for model: {run_folder_name_prefix}")
-    print(f"Processing {len(tasks_for_workers)} prompts using up to {PROMPT_WORKERS_COUNT} parallel workers.")
-
-    with ProcessPoolExecutor(max_workers=PROMPT_WORKERS_COUNT) as executor:
-        # Use a dictionary to map futures to prompt_ids for better error reporting if needed
-        future_to_prompt_id = {}
-        for task_args_tuple in tasks_for_workers:
-            prompt_config_obj = task_args_tuple[0]
-            prompt_id = prompt_config_obj.get("prompt_id", "UNKNOWN_PROMPT_IN_CONFIG")
-            future = executor.submit(process_single_prompt_wrapper, task_args_tuple)
-            future_to_prompt_id[future] = prompt_id
-
-        for future in as_completed(future_to_prompt_id):
-            prompt_id_for_future = future_to_prompt_id[future]
-            try:
-                result = future.result()
-                all_prompts_results.append(result)
-            except Exception as e_exec: # Should ideally be caught by worker, but this is a fallback
-                print(f"CRITICAL EXCEPTION from worker for prompt {prompt_id_for_future}: {e_exec}")
-                all_prompts_results.append({
-                    "prompt_id": prompt_id_for_future, "status": "EXECUTOR_ERROR", "error": str(e_exec),
-                    "scores": {"overall": {"percentage_weighted":0}, "technical_quality": {"earned":0, "max":0}, "prompt_adherence": {"earned":0, "max":0}}
-                })
-
-    # --- Aggregation and Master Report ---
+def build_model_summary(model_name, master_config_path, master_config, html_dir_path, run_timestamp, all_prompts_results):
     master_summary = {
-        "benchmark_run_name": run_folder_name_prefix, # This is the model name
-        "benchmark_config_file": str(master_config_path.name),
+        "benchmark_run_name": model_name, # This is the model name
+        "benchmark_config_file": Path(master_config_path).name if master_config_path else None,
         "html_source_directory": str(html_dir_path),
         "overall_run_timestamp_for_this_model": run_timestamp, # Clarify this is for the model
         "total_prompts_configured": len(master_config.get("prompts", [])),
@@ -1411,7 +3080,10 @@ def main():
             "technical_quality_earned": tq_earned, "technical_quality_max": tq_max,
             "prompt_adherence_earned": adh_earned, "prompt_adherence_max": adh_max,
             "overall_weighted_percentage": overall_weighted_perc,
-            "report_directory": res.get("output_directory_for_this_prompt") # This comes from analyzer.get_prompt_report_data()
+            "report_directory": res.get("output_directory_for_this_prompt"), # This comes from analyzer.get_prompt_report_data()
+            "reused_from": res.get("reused_from"),
+            "admission_wait_s": res.get("admission_wait_s"),
+            "attempts": res.get("attempts") or len(res.get("analysis_attempts") or []) or None # Standalone runs only have the history
         })
 
         # Only include fully successful analyses in aggregate scores that depend on max points being reliable
@@ -1444,11 +3116,14 @@ def main():
         (agg_adh_perc_score * WEIGHT_PROMPT_ADHERENCE), 2
     )
 
+    return master_summary
+
+def write_model_summary(current_run_output_dir, master_summary):
     master_report_path = current_run_output_dir / "MASTER_BENCHMARK_SUMMARY.json"
     with open(master_report_path, "w", encoding='utf-8') as f: json.dump(master_summary, f, indent=2)
 
     # Correct final printout for clarity
-    print(f"\n\n{'='*20} MODEL BENCHMARK SUMMARY ({run_folder_name_prefix}) {'='*20}")
+    print(f"\n\n{'='*20} MODEL BENCHMARK SUMMARY ({master_summary['benchmark_run_name']}) {'='*20}")
     print(f"Model: {master_summary['benchmark_run_name']}")
     print(f"Total Configured Prompts for this model: {master_summary['total_prompts_configured']}, Analyzed Successfully: {master_summary['prompts_analyzed_successfully']}")
     print(f"Agg. TQ Earned: {master_summary['aggregate_scores']['total_tq_earned']:.2f}, Agg. TQ Max: {master_summary['aggregate_scores']['total_tq_max']:.2f}")
@@ -1457,6 +3132,154 @@ def main():
     print(f"Overall Weighted Score (from Totals): {master_summary['aggregate_scores']['overall_weighted_score_from_totals']:.2f}%")
     print(f"Master summary: {master_report_path}")
     print(f"Individual reports in subdirectories within: {current_run_output_dir}")
+    return master_report_path
+
+class RunProfile:
+    # Aggregates the timings of every prompt analyzed in a run into RUN_PROFILE.json: which checks, phases and
+    # adherence check types dominate, how long browsers took to start, peak memory, and how long jobs queued (for a
+    # worker, and for a Lighthouse service slot).
+    # Carried-over (incremental/resumed) prompts have no timings and are not counted.
+    def __init__(self):
+        self.started = time.time()
+        self.samples = collections.defaultdict(lambda: collections.defaultdict(list)) # group -> label -> [seconds or MB]
+        self.prompt_durations = []
+
+    def add(self, model_name, result):
+        timings = result.get("timings") or {}
+        if result.get("duration_s") is not None: self.prompt_durations.append((result["duration_s"], model_name, result.get("prompt_id"), result.get("status")))
+        for label, seconds in timings.get("checks_s", {}).items():
+            self.samples["checks_s"][":".join(label.split(":")[:2])].append(seconds) # adherence:<type>:<name> -> adherence:<type>
+        for phase, seconds in timings.get("phases_s", {}).items(): self.samples["phases_s"][phase].append(seconds)
+        for proc, mb in timings.get("peak_rss_mb", {}).items():
+            if mb is not None: self.samples["peak_rss_mb"][proc].append(mb)
+        if timings.get("driver_start_s") is not None: self.samples["startup_s"]["driver_start_s"].append(timings["driver_start_s"])
+        for seconds in timings.get("lighthouse_queue_waits_s", []): self.samples["scheduling_s"]["lighthouse_queue_wait_s"].append(seconds) # Per audit
+        for key in ("queue_wait_s", "admission_wait_s", "duration_s"):
+            if result.get(key) is not None: self.samples["scheduling_s"][key].append(result[key])
+
+    @staticmethod
+    def _stats(values):
+        ordered = sorted(values)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {"count": len(ordered), "total": round(sum(ordered), 2), "mean": round(sum(ordered) / len(ordered), 3),
+                "p50": pick(0.5), "p95": pick(0.95), "max": ordered[-1]}
+
+    def write(self, path):
+        profile = {"generated": time.strftime('%Y-%m-%dT%H:%M:%S'), "analyzer_version": ANALYZER_VERSION,
+                   "wall_clock_s": round(time.time() - self.started, 2), "prompts_profiled": len(self.prompt_durations)}
+        for group, by_label in self.samples.items(): # Largest total first so the dominant costs lead each section
+            profile[group] = dict(sorted(((label, self._stats(v)) for label, v in by_label.items()), key=lambda kv: kv[1]["total"], reverse=True))
+        profile["slowest_prompts"] = [{"model": m, "prompt_id": pid, "status": st, "duration_s": d} for d, m, pid, st in sorted(self.prompt_durations, reverse=True)[:10]]
+        with open(path, "w", encoding='utf-8') as f: json.dump(profile, f, indent=2)
+        return path
+
+def analyze_model(master_config, html_dir, output_base_dir, executor=None, model_name=None, run_timestamp=None,
+                  lighthouse_cache=None, incremental=False, chrome_env=None, static_site=None):
+    # Library entry point: analyzes every prompt of one model and writes its MASTER_BENCHMARK_SUMMARY.json.
+    # master_config is a parsed config dict or a path to one. Pass an executor (e.g. a ProcessPoolExecutor started with
+    # init_prompt_worker) to share workers, browsers and the Lighthouse service across models; without one a pool is
+    # started and torn down here. Raises instead of exiting; returns the summary, its path and the per-prompt results.
+    master_config_path = None
+    if not isinstance(master_config, dict):
+        master_config_path = Path(master_config)
+        if not master_config_path.is_file(): raise FileNotFoundError(f"Master config not found: {master_config_path}")
+        try:
+            with open(master_config_path, 'r', encoding='utf-8') as f: master_config = json.load(f)
+        except json.JSONDecodeError as e: raise ValueError(f"Error loading master config: {e}") from e
+    html_dir_path = Path(html_dir) # This is effectively {challengename}/{modelname}/
+    output_base_dir_path = Path(output_base_dir)
+    if not html_dir_path.is_dir(): raise FileNotFoundError(f"HTML directory not found: {html_dir_path}")
+
+    run_folder_name_prefix = model_name or html_dir_path.name # Should be modelname
+    if not run_folder_name_prefix or run_folder_name_prefix in ['.', '..']:
+        run_folder_name_prefix = "unknown_model_run"
+
+    run_timestamp = run_timestamp or time.strftime('%Y%m%d-%H%M%S')
+    # This creates a directory for the current model's run, e.g., ui_benchmark_master_runs/modelname_timestamp/
+    current_run_output_dir = output_base_dir_path / f"{run_folder_name_prefix}_{run_timestamp}"
+    current_run_output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Prepare arguments for the worker function
+    previous_reports = find_previous_prompt_reports(output_base_dir_path, run_folder_name_prefix, current_run_output_dir) if incremental else {}
+    tasks_for_workers, all_prompts_results = plan_model_prompts(master_config.get("prompts", []), html_dir_path, current_run_output_dir, run_timestamp, previous_reports)
+
+    print(f"Starting analysis for model: {run_folder_name_prefix}")
+    if incremental: print(f"Incremental: reused {len(all_prompts_results)} unchanged prompt report(s) from earlier runs.")
+
+    own_static_server, lh_manager, lh_service, own_executor = None, None, None, None
+    profile = RunProfile()
+    try:
+        if executor is None:
+            if chrome_env is None:
+                chrome_env = resolve_chrome_environment()
+                print(f"ChromeDriver: {chrome_env['chromedriver_path']} ({chrome_env['chromedriver_version']})")
+                print(f"Chrome: {chrome_env['chrome_binary'] or 'auto-detected by ChromeDriver'} ({chrome_env['chrome_version'] or 'version unknown'})")
+            # Reuse the orchestrator's server when running under it; otherwise serve this model's directory for the run
+            static_site = static_site or static_site_from_env()
+            if not static_site:
+                own_static_server = StaticSiteServer(html_dir_path); own_static_server.start()
+                static_site = (str(own_static_server.root_dir), own_static_server.base_url)
+            print(f"Serving pages from {static_site[0]} at {static_site[1]}")
+            lh_manager, lh_service = start_lighthouse_service(chrome_env, PROMPT_WORKERS_COUNT)
+            executor = own_executor = ProcessPoolExecutor(max_workers=PROMPT_WORKERS_COUNT, initializer=init_prompt_worker,
+                                                          initargs=(BROWSER_RECYCLE_AFTER_PROMPTS, chrome_env, lh_service, lighthouse_cache, static_site))
+            print(f"Processing {len(tasks_for_workers)} prompts using up to {PROMPT_WORKERS_COUNT} parallel workers.")
+        else: print(f"Processing {len(tasks_for_workers)} prompts on the shared executor.")
+
+        # Use a dictionary to map futures to prompt_ids for better error reporting if needed
+        future_to_prompt_id = {}
+        for task_args_tuple in tasks_for_workers:
+            prompt_config_obj = task_args_tuple[0]
+            prompt_id = prompt_config_obj.get("prompt_id", "UNKNOWN_PROMPT_IN_CONFIG")
+            future = executor.submit(process_single_prompt_wrapper, task_args_tuple)
+            future_to_prompt_id[future] = prompt_id
+
+        for future in as_completed(future_to_prompt_id):
+            prompt_id_for_future = future_to_prompt_id[future]
+            try:
+                result = future.result()
+                all_prompts_results.append(result); profile.add(run_folder_name_prefix, result)
+            except Exception as e_exec: # Should ideally be caught by worker, but this is a fallback
+                print(f"CRITICAL EXCEPTION from worker for prompt {prompt_id_for_future}: {e_exec}")
+                all_prompts_results.append(failed_prompt_result(prompt_id_for_future, "EXECUTOR_ERROR", str(e_exec)))
+    finally:
+        if own_executor: own_executor.shutdown()
+        stop_lighthouse_service(lh_manager, lh_service)
+        if own_static_server: own_static_server.stop()
+
+    master_summary = build_model_summary(run_folder_name_prefix, master_config_path, master_config, html_dir_path, run_timestamp, all_prompts_results)
+    summary_path = write_model_summary(current_run_output_dir, master_summary)
+    print(f"Run profile: {profile.write(current_run_output_dir / 'RUN_PROFILE.json')}")
+    return {"model": run_folder_name_prefix, "run_timestamp": run_timestamp, "output_directory": current_run_output_dir,
+            "summary": master_summary, "summary_path": summary_path, "prompt_results": all_prompts_results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze one model's generated HTML pages against a master prompts config.")
+    parser.add_argument("master_config", nargs="?", help="Path to master prompts config JSON.")
+    parser.add_argument("html_dir", nargs="?", help="Directory with <prompt_id>.html files (e.g. {challenge}/{model}/).")
+    parser.add_argument("output_base_dir", nargs="?", default="ui_benchmark_master_runs", help="Base directory for results.")
+    parser.add_argument("--no-lh-cache", action="store_true", help="Always run Lighthouse instead of reusing cached reports.")
+    parser.add_argument("--incremental", action="store_true", help="Reuse reports from earlier runs of this model whose page, prompt config and analyzer version are unchanged.")
+    args = parser.parse_args()
+
+    if not args.master_config or not args.html_dir:
+        print("Usage: python ui_benchmark_analyzer.py <path_to_master_prompts_config.json> <path_to_html_files_directory> [output_base_dir] [--no-lh-cache] [--incremental]")
+        dummy_master_config_path = Path("dummy_prompts_benchmark_config.json")
+        if not dummy_master_config_path.exists():
+            dummy_master_prompts = { "benchmark_run_name": "Dummy Run", "prompts": [
+                { "prompt_id": "example_prompt_001", "prompt_description": "A simple page.",
+                  "viewports_to_test": {"desktop": [1920, 1080]},
+                  "adherence_checks": [{"type": "text_content", "name": "Page Title Check", "selector": "title", "selector_type": "tag_name", "expected_text": "Test Page", "points": 5}]}]}
+            with open(dummy_master_config_path, "w", encoding="utf-8") as f: json.dump(dummy_master_prompts, f, indent=2)
+            print(f"Created dummy config: {dummy_master_config_path}. Ensure 'example_prompt_001.html' exists in 'html_tests'.")
+            print(f"Run: python {sys.argv[0]} {dummy_master_config_path} ./html_tests")
+        sys.exit(1)
+
+    try:
+        analyze_model(Path(args.master_config), Path(args.html_dir), Path(args.output_base_dir),
+                      lighthouse_cache=None if args.no_lh_cache else LighthouseResultCache(), incremental=args.incremental)
+    except (FileNotFoundError, ValueError, RuntimeError) as e: print(f"FATAL: {e}"); sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file